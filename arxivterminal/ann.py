@@ -0,0 +1,318 @@
+import logging
+import os
+import pickle
+import uuid
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from joblib import dump, load
+
+from arxivterminal.constants import DEFAULT_NPROBE
+
+# Number of vectors sampled to train the coarse quantizer
+KMEANS_SAMPLE_SIZE = 50000
+
+# Number of rows scored against the centroids at a time when assigning lists
+ASSIGN_BATCH_SIZE = 65536
+
+
+def ann_index_path(model_path: Union[str, Path]) -> Path:
+    """Return the path of the ANN index kept next to a model file"""
+    return Path(model_path).with_suffix(".ivf.joblib")
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, n_clusters: int, n_iter: int = 10, seed: int = 0
+) -> np.ndarray:
+    """
+    Cluster unit vectors by cosine similarity.
+
+    Parameters
+    ----------
+    vectors : np.ndarray
+        The normalized vectors to cluster, one per row.
+    n_clusters : int
+        The number of clusters.
+    n_iter : int, optional
+        The number of Lloyd iterations, by default 10.
+    seed : int, optional
+        Seed for the initial centroids, by default 0.
+
+    Returns
+    -------
+    np.ndarray
+        The normalized centroids, one per row.
+    """
+    rng = np.random.default_rng(seed)
+    # Normalize, so vectors stored as int8 with per-row scales cluster alike
+    vectors = vectors.astype(np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+
+        # Restart empty clusters from random points
+        empty = np.flatnonzero(np.bincount(labels, minlength=n_clusters) == 0)
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty))]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+
+    return centroids
+
+
+class IvfIndex:
+    def __init__(
+        self,
+        model_version: Optional[str],
+        centroids: np.ndarray,
+        assignments: np.ndarray,
+        order: Optional[np.ndarray] = None,
+        offsets: Optional[np.ndarray] = None,
+    ):
+        """
+        Initialize an inverted file index over rows of an embedding store.
+
+        Every stored vector is assigned to its nearest centroid. A query only scores
+        the rows assigned to its `nprobe` nearest centroids instead of every row.
+
+        Parameters
+        ----------
+        model_version : str, optional
+            Version of the LSA model which produced the indexed vectors.
+        centroids : np.ndarray
+            The normalized centroids of the inverted lists, one per row.
+        assignments : np.ndarray
+            The inverted list of every row of the embedding store.
+        order : np.ndarray, optional
+            The rows grouped by inverted list, computed from `assignments` if None.
+        offsets : np.ndarray, optional
+            The start of every inverted list in `order`, followed by its length.
+        """
+        self.model_version = model_version
+        self.centroids = centroids.astype(np.float32, copy=False)
+        self.assignments = assignments.astype(np.int32, copy=False)
+        if order is None or offsets is None:
+            self._build_lists()
+        else:
+            self.order = order
+            self.offsets = offsets
+
+    def _build_lists(self):
+        """Group the row numbers by inverted list for lookups"""
+        self.order = np.argsort(self.assignments, kind="stable")
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @classmethod
+    def build(
+        cls,
+        model_version: Optional[str],
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        seed: int = 0,
+    ) -> "IvfIndex":
+        """
+        Train the coarse quantizer on a sample of the vectors and index all of them.
+
+        Parameters
+        ----------
+        model_version : str, optional
+            Version of the LSA model which produced the vectors.
+        vectors : np.ndarray
+            The document vectors, one per row of the embedding store. Rows only need
+            to be normalized up to a positive scale.
+        n_lists : int, optional
+            The number of inverted lists. If None, the square root of the number of
+            vectors is used.
+        seed : int, optional
+            Seed for sampling and clustering, by default 0.
+
+        Returns
+        -------
+        IvfIndex
+            The index over every row of `vectors`.
+        """
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(vectors)))
+        n_lists = max(1, min(n_lists, len(vectors)))
+
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > KMEANS_SAMPLE_SIZE:
+            sample = vectors[
+                rng.choice(len(vectors), KMEANS_SAMPLE_SIZE, replace=False)
+            ]
+
+        centroids = spherical_kmeans(sample, n_lists, seed=seed)
+        index = cls(model_version, centroids, np.empty(0, dtype=np.int32))
+        index.add(np.arange(len(vectors)), vectors)
+        logging.info(f"Built ANN index of {n_lists} lists over {len(vectors)} vectors")
+        return index
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional["IvfIndex"]:
+        """
+        Load an index from disk.
+
+        The arrays are memory-mapped rather than read, so loading does not grow with
+        the number of indexed rows.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the index file.
+
+        Returns
+        -------
+        Optional[IvfIndex]
+            The loaded index, or None if no index exists at the path or it cannot be
+            read.
+        """
+        try:
+            data = load(path, mmap_mode="r")
+            return cls(
+                data["model_version"],
+                data["centroids"],
+                data["assignments"],
+                data.get("order"),
+                data.get("offsets"),
+            )
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, KeyError, ValueError, pickle.UnpicklingError) as e:
+            # Searches fall back to exact scoring until the index is saved again
+            logging.warning(f"Ignoring unreadable ANN index {path}: {e}")
+            return None
+
+    def save(self, path: Union[str, Path]):
+        """
+        Save the index to disk.
+
+        The index is written to a temporary file which is then atomically renamed
+        over `path`, so readers see either the old or the new index.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the index file.
+        """
+        path = Path(path)
+        staging = path.with_name(f"{path.name}.{uuid.uuid4().hex[:12]}")
+        try:
+            dump(
+                {
+                    "model_version": self.model_version,
+                    "centroids": self.centroids,
+                    "assignments": self.assignments,
+                    "order": self.order,
+                    "offsets": self.offsets,
+                },
+                staging,
+            )
+            os.replace(staging, path)
+        finally:
+            staging.unlink(missing_ok=True)
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Return the nearest inverted list of every vector"""
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), ASSIGN_BATCH_SIZE):
+            end = start + ASSIGN_BATCH_SIZE
+            scores = vectors[start:end].astype(np.float32) @ self.centroids.T
+            labels[start:end] = np.argmax(scores, axis=1)
+        return labels
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """
+        Insert or reassign rows of the embedding store.
+
+        Parameters
+        ----------
+        rows : np.ndarray
+            The embedding store rows of the vectors. Rows past the end of the index
+            are appended and existing rows are moved to their new nearest list.
+        vectors : np.ndarray
+            The normalized document vectors, one per row.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return
+
+        size = max(len(self.assignments), int(rows.max()) + 1)
+        if size > len(self.assignments) or not self.assignments.flags.writeable:
+            # Also copies memory-mapped assignments before modifying them
+            assignments = np.zeros(size, dtype=np.int32)
+            assignments[: len(self.assignments)] = self.assignments
+            self.assignments = assignments
+
+        self.assignments[rows] = self.assign(vectors)
+        self._build_lists()
+
+    def candidates(self, query: np.ndarray, nprobe: int = DEFAULT_NPROBE) -> np.ndarray:
+        """
+        Return the rows in the `nprobe` inverted lists nearest to a query.
+
+        Parameters
+        ----------
+        query : np.ndarray
+            The normalized query vector.
+        nprobe : int, optional
+            The number of inverted lists to scan, by default DEFAULT_NPROBE.
+
+        Returns
+        -------
+        np.ndarray
+            The candidate rows of the embedding store.
+        """
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        scores = self.centroids @ query.astype(np.float32)
+        lists = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        starts, ends = self.offsets[lists], self.offsets[lists + 1]
+        return np.concatenate([self.order[s:e] for s, e in zip(starts, ends)])
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        query: np.ndarray,
+        limit: int,
+        nprobe: int = DEFAULT_NPROBE,
+        scales: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the approximate nearest rows to a query.
+
+        Parameters
+        ----------
+        vectors : np.ndarray
+            The vectors of the embedding store the index was built over.
+        query : np.ndarray
+            The normalized query vector.
+        limit : int
+            The maximum number of rows to return.
+        nprobe : int, optional
+            The number of inverted lists to scan, by default DEFAULT_NPROBE.
+        scales : np.ndarray, optional
+            The scale of every row of `vectors` stored as int8.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            The rows and their cosine similarities, most similar first.
+        """
+        rows = self.candidates(query, nprobe)
+        if len(rows) == 0:
+            return rows, np.empty(0)
+
+        scores = vectors[rows].astype(np.float32) @ query.astype(np.float32)
+        if scales is not None:
+            scores *= scales[rows]
+        if limit < len(rows):
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores)
+        return rows[order], scores[order]
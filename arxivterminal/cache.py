@@ -0,0 +1,303 @@
+"""
+Cache of query vectors and search results for the LSA model.
+
+Entries are kept in a small in-memory LRU for the life of the process and in an
+SQLite file next to the model, so a search repeated in a new process skips embedding
+and scoring. Query vectors are keyed by the model version and results also by the
+corpus version of the database, so a refit or newly saved papers make earlier
+entries unreachable, and they are deleted on the next write.
+"""
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Generic, Hashable, List, Optional, Tuple, TypeVar, Union
+
+import numpy as np
+
+# Number of query vectors and of result lists kept in memory
+MEMORY_CACHE_SIZE = 256
+
+# Number of query vectors and of result lists kept on disk
+DISK_CACHE_SIZE = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_vectors (
+    model_version TEXT NOT NULL,
+    query TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    accessed INTEGER NOT NULL,
+    PRIMARY KEY (model_version, query)
+);
+
+CREATE TABLE IF NOT EXISTS search_results (
+    model_version TEXT NOT NULL,
+    corpus_version INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    entry_ids TEXT NOT NULL,
+    accessed INTEGER NOT NULL,
+    PRIMARY KEY (model_version, corpus_version, key)
+);
+"""
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def search_cache_path(model_path: Union[str, Path]) -> Path:
+    """Return the path of the search cache kept next to a model file"""
+    return Path(model_path).with_suffix(".cache.db")
+
+
+class LruCache(Generic[K, V]):
+    def __init__(self, max_size: int):
+        """
+        Initialize a mapping which evicts the least recently used entry when full.
+
+        Parameters
+        ----------
+        max_size : int
+            The maximum number of entries kept.
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[K, V]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        """Return the value of a key and mark it as recently used, or None"""
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: K, value: V):
+        """Insert or replace a value, evicting the least recently used if full"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class SearchCache:
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]],
+        memory_size: int = MEMORY_CACHE_SIZE,
+        disk_size: int = DISK_CACHE_SIZE,
+    ):
+        """
+        Initialize a two-level cache of query vectors and search results.
+
+        Parameters
+        ----------
+        path : Union[str, Path], optional
+            Path to the SQLite file of the disk cache. If None, entries are only kept
+            in memory.
+        memory_size : int, optional
+            The number of vectors and of results kept in memory, by default
+            MEMORY_CACHE_SIZE.
+        disk_size : int, optional
+            The number of vectors and of results kept on disk, by default
+            DISK_CACHE_SIZE.
+        """
+        self.path = path
+        self.disk_size = disk_size
+        self.vectors: LruCache[Tuple, np.ndarray] = LruCache(memory_size)
+        self.results: LruCache[Tuple, List[str]] = LruCache(memory_size)
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the disk cache on first use, or return None if it is disabled"""
+        if self.path is None:
+            return None
+        if self._conn is None:
+            self._conn = sqlite3.connect(str(self.path), timeout=1.0)
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _execute(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        """Run a statement on the disk cache, treating any failure as a miss"""
+        try:
+            conn = self._connect()
+            if conn is None:
+                return []
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logging.warning(f"Search cache at {self.path} is unavailable: {e}")
+            return []
+
+    def _prune(self, table: str, stale: str, params: Tuple):
+        """Delete the stale entries of a table and all but the most recent ones"""
+        self._execute(f"DELETE FROM {table} WHERE {stale}", params)
+        self._execute(
+            f"""
+            DELETE FROM {table} WHERE rowid IN (
+                SELECT rowid FROM {table} ORDER BY accessed DESC LIMIT -1 OFFSET ?
+            )
+        """,
+            (self.disk_size,),
+        )
+
+    def get_vector(
+        self, model_version: Optional[str], query: str
+    ) -> Optional[np.ndarray]:
+        """
+        Return the cached embedding of a query.
+
+        Parameters
+        ----------
+        model_version : str, optional
+            Version of the model which embeds the query. Nothing is cached for
+            unversioned models.
+        query : str
+            The query text.
+
+        Returns
+        -------
+        Optional[np.ndarray]
+            The query vector, or None if it is not cached.
+        """
+        if model_version is None:
+            return None
+
+        key = (model_version, query)
+        vector = self.vectors.get(key)
+        if vector is None:
+            rows = self._execute(
+                "SELECT vector FROM query_vectors WHERE model_version = ? AND query = ?",
+                key,
+            )
+            if not rows:
+                return None
+            vector = np.frombuffer(rows[0][0], dtype=np.float64)
+            self.vectors.put(key, vector)
+            self._execute(
+                """
+                UPDATE query_vectors SET accessed = ?
+                WHERE model_version = ? AND query = ?
+            """,
+                (time.time_ns(), *key),
+            )
+        return vector
+
+    def put_vector(self, model_version: Optional[str], query: str, vector: np.ndarray):
+        """
+        Cache the embedding of a query.
+
+        Parameters
+        ----------
+        model_version : str, optional
+            Version of the model which embedded the query.
+        query : str
+            The query text.
+        vector : np.ndarray
+            The query vector.
+        """
+        if model_version is None:
+            return
+
+        vector = np.asarray(vector, dtype=np.float64)
+        self.vectors.put((model_version, query), vector)
+        self._execute(
+            "INSERT OR REPLACE INTO query_vectors VALUES (?, ?, ?, ?)",
+            (model_version, query, vector.tobytes(), time.time_ns()),
+        )
+        self._prune("query_vectors", "model_version != ?", (model_version,))
+
+    def get_results(
+        self, model_version: Optional[str], corpus_version: int, key: Tuple
+    ) -> Optional[List[str]]:
+        """
+        Return the cached entry ids of a search.
+
+        Parameters
+        ----------
+        model_version : str, optional
+            Version of the model which ran the search. Nothing is cached for
+            unversioned models.
+        corpus_version : int
+            Version of the papers searched, see `ArxivDatabase.get_corpus_version`.
+        key : Tuple
+            The query and every other parameter which changes the results.
+
+        Returns
+        -------
+        Optional[List[str]]
+            The entry ids of the results in order, or None if they are not cached.
+        """
+        if model_version is None:
+            return None
+
+        disk_key = (model_version, corpus_version, json.dumps(key))
+        entry_ids = self.results.get(disk_key)
+        if entry_ids is None:
+            rows = self._execute(
+                """
+                SELECT entry_ids FROM search_results
+                WHERE model_version = ? AND corpus_version = ? AND key = ?
+            """,
+                disk_key,
+            )
+            if not rows:
+                return None
+            entry_ids = json.loads(rows[0][0])
+            self.results.put(disk_key, entry_ids)
+            self._execute(
+                """
+                UPDATE search_results SET accessed = ?
+                WHERE model_version = ? AND corpus_version = ? AND key = ?
+            """,
+                (time.time_ns(), *disk_key),
+            )
+        return entry_ids
+
+    def put_results(
+        self,
+        model_version: Optional[str],
+        corpus_version: int,
+        key: Tuple,
+        entry_ids: List[str],
+    ):
+        """
+        Cache the entry ids of a search.
+
+        Parameters
+        ----------
+        model_version : str, optional
+            Version of the model which ran the search.
+        corpus_version : int
+            Version of the papers searched.
+        key : Tuple
+            The query and every other parameter which changes the results.
+        entry_ids : List[str]
+            The entry ids of the results in order.
+        """
+        if model_version is None:
+            return
+
+        disk_key = (model_version, corpus_version, json.dumps(key))
+        self.results.put(disk_key, list(entry_ids))
+        self._execute(
+            "INSERT OR REPLACE INTO search_results VALUES (?, ?, ?, ?, ?)",
+            (*disk_key, json.dumps(entry_ids), time.time_ns()),
+        )
+        self._prune(
+            "search_results",
+            "model_version != ? OR corpus_version != ?",
+            (model_version, corpus_version),
+        )
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -1,14 +1,21 @@
 import logging
 import sys
+from collections import Counter
 from datetime import datetime, timedelta
 
 import click
 
-from arxivterminal.constants import DATABASE_PATH, LOG_PATH, MODEL_PATH
+from arxivterminal.constants import DATABASE_PATH, DEFAULT_NPROBE, LOG_PATH, MODEL_PATH
 from arxivterminal.db import ArxivDatabase
-from arxivterminal.fetch import download_papers
-from arxivterminal.ml import LsaDocumentSearch
-from arxivterminal.output import ExitAppException, print_papers, print_stats
+from arxivterminal.output import (
+    ExitAppException,
+    browse_papers,
+    print_papers,
+    print_stats,
+)
+
+# The arxiv client and the scikit-learn stack are slow to import, so they are imported
+# inside the commands which need them to keep the startup of other commands fast.
 
 
 @click.group()
@@ -29,16 +36,71 @@ def cli():
     default="cs.AI,cs.LG",  # AI and Machine Learning categories
     help="Comma-separated list of categories to fetch papers.",
 )
-def fetch(num_days, categories):
+@click.option(
+    "--refit-threshold",
+    default=0.1,
+    help="Vocabulary drift which triggers a refit of the experimental model.",
+)
+@click.option(
+    "--split-categories",
+    is_flag=True,
+    help="Query each category separately instead of in one combined query.",
+)
+@click.option(
+    "--max-workers",
+    default=4,
+    help="Number of categories fetched concurrently with --split-categories.",
+)
+@click.option("--page-size", default=500, help="Number of results per API request.")
+@click.option("--delay", default=3.0, help="Seconds between API requests.")
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Stop at the newest papers seen by previous fetches of each category.",
+)
+@click.option(
+    "--overlap-hours",
+    default=24,
+    help="Hours before the previous high-water mark re-fetched by --incremental.",
+)
+def fetch(
+    num_days,
+    categories,
+    refit_threshold,
+    split_categories,
+    max_workers,
+    page_size,
+    delay,
+    incremental,
+    overlap_hours,
+):
     """
     Fetch papers from the specified categories and store them in the database.
     """
+    from arxivterminal.fetch import save_fetched_papers
+    from arxivterminal.ml import LsaDocumentSearch
+
     categories = categories.split(",")
     db = ArxivDatabase(DATABASE_PATH)
-    for category in categories:
-        papers = download_papers(category, num_days=num_days)
-        db.save_papers(papers)
-        logging.info(f"Fetched papers from {category}")
+    lsa = LsaDocumentSearch(MODEL_PATH)
+
+    save_fetched_papers(
+        db,
+        categories,
+        num_days=num_days,
+        incremental=incremental,
+        overlap=timedelta(hours=overlap_hours),
+        on_saved=lambda saved: lsa.update_embeddings(
+            db, saved, refit_threshold=refit_threshold, save=False
+        ),
+        combine_categories=not split_categories,
+        max_workers=max_workers,
+        page_size=page_size,
+        delay=delay,
+    )
+    # Each batch is only embedded in memory, so the embedding store, ANN index and
+    # neighbour lists are written once, when the fetch succeeds
+    lsa.flush_embeddings(db)
 
 
 @click.command()
@@ -51,29 +113,43 @@ def delete_all():
     logging.info("Deleted all papers from the database")
 
 
+def filter_options(command):
+    """
+    Add the --category and --author filter options to a command.
+    """
+    command = click.option(
+        "--author", default=None, help="Only include papers by this author."
+    )(command)
+    command = click.option(
+        "--category", default=None, help="Only include papers in this category."
+    )(command)
+    return command
+
+
 @click.command()
 @click.option("--days-ago", default=7, help="Number of days ago to fetch papers.")
-def show(days_ago):
+@filter_options
+def show(days_ago, category, author):
     """
     Show papers fetched from the specified number of days ago.
     """
     published_after = datetime.now() - timedelta(days=days_ago)
     db = ArxivDatabase(DATABASE_PATH)
-    papers = db.get_papers(published_after)
 
     try:
-        print_papers(papers)
+        browse_papers(db, published_after, category=category, author=author)
     except ExitAppException:
         sys.exit(0)
 
 
 @click.command()
-def stats():
+@filter_options
+def stats(category, author):
     """
     Show statistics of the papers stored in the database.
     """
     db = ArxivDatabase(DATABASE_PATH)
-    stats = db.get_stats()
+    stats = db.get_stats(category=category, author=author)
     print_stats(stats)
     print(f"Log path: {LOG_PATH}")
     print(f"Data path: {DATABASE_PATH}")
@@ -90,26 +166,101 @@ def stats():
 @click.option(
     "-l", "--limit", default=10, help="The maximum number of results to return"
 )
-def search(query, experimental, limit, force):
+@click.option(
+    "--nprobe",
+    default=DEFAULT_NPROBE,
+    help="Index lists scanned by experimental search, trading speed for recall",
+)
+@filter_options
+def search(query, experimental, limit, force, nprobe, category, author):
     """
     Search papers in the database based on a query.
     """
     db = ArxivDatabase(DATABASE_PATH)
+    lsa = None
 
     if experimental:
+        from arxivterminal.ml import LsaDocumentSearch
+
         # TODO: Try better approaches :)
         lsa = LsaDocumentSearch(MODEL_PATH)
-        search_results = lsa.search(db, query, limit=limit, force_refresh=force)
+        search_results = lsa.search(
+            db,
+            query,
+            limit=limit,
+            force_refresh=force,
+            category=category,
+            author=author,
+            nprobe=nprobe,
+        )
     else:
-        search_results = db.search_papers(query)[:limit]
+        search_results = db.search_papers(
+            query, limit=limit, category=category, author=author
+        )
 
     try:
-        print_papers(search_results, show_dates=(not experimental))
+        print_papers(search_results, show_dates=False, db=db, lsa=lsa)
     except ExitAppException:
         sys.exit(0)
 
 
-for cmd in [delete_all, fetch, search, show, stats]:
+@click.command()
+@click.argument("ids", nargs=-1)
+@click.option(
+    "--query", default=None, help="Download the papers matching a database search."
+)
+@click.option(
+    "--unviewed-days",
+    type=int,
+    default=None,
+    help="Download the unviewed papers published in this many past days.",
+)
+@click.option(
+    "-l", "--limit", default=10, help="The maximum number of papers found by --query."
+)
+@click.option("--output-dir", default="./arxiv_papers", help="Where PDFs are saved.")
+@click.option("--max-workers", default=4, help="Number of concurrent downloads.")
+@click.option("--delay", default=1.0, help="Seconds between download requests.")
+def download(ids, query, unviewed_days, limit, output_dir, max_workers, delay):
+    """
+    Download the PDFs of papers given by id, by a search or unviewed recently.
+    """
+    from arxivterminal.download import download_papers
+
+    if sum([bool(ids), query is not None, unviewed_days is not None]) != 1:
+        raise click.UsageError("Give either ids, --query or --unviewed-days.")
+
+    db = ArxivDatabase(DATABASE_PATH)
+    if query is not None:
+        entry_ids = [p.entry_id for p in db.search_papers(query, limit=limit)]
+    elif unviewed_days is not None:
+        published_after = datetime.now() - timedelta(days=unviewed_days)
+        entry_ids = [
+            entry_id
+            for entry_id, viewed in db.iter_papers(
+                published_after, columns=["entry_id", "viewed"]
+            )
+            if not viewed
+        ]
+    else:
+        entry_ids = list(ids)
+
+    results = download_papers(
+        entry_ids, paper_dir=output_dir, max_workers=max_workers, delay=delay
+    )
+    statuses = Counter(r.status for r in results)
+    logging.info(
+        f"Downloaded {statuses['downloaded']} papers to {output_dir}, "
+        f"{statuses['exists']} already present, {statuses['failed']} failed"
+    )
+    for result in results:
+        if result.status == "failed":
+            logging.info(f"Failed to download {result.entry_id}: {result.error}")
+    if statuses["failed"]:
+        sys.exit(1)
+
+
+for cmd in [delete_all, download, fetch, search, show, stats]:
     cli.add_command(cmd)
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 from appdirs import user_data_dir, user_log_dir
@@ -7,4 +8,23 @@ DATABASE_PATH = Path(user_data_dir(APP_NAME)) / "papers.db"
 MODEL_PATH = Path(user_data_dir(APP_NAME)) / "model.joblib"
 LOG_PATH = Path(user_log_dir(APP_NAME)) / f"{APP_NAME}.log"
 
-__all__ = ["APP_NAME", "DATABASE_PATH", "MODEL_PATH", "LOG_PATH"]
+# Overridable to point fetches at a local stand-in, see benchmarks/arxiv_server.py
+ARXIV_API_URL = os.environ.get(
+    "ARXIVTERMINAL_API_URL", "http://export.arxiv.org/api/query"
+)
+ARXIV_PDF_URL = os.environ.get("ARXIVTERMINAL_PDF_URL", "https://arxiv.org/pdf")
+
+# Number of inverted lists probed per query unless asked otherwise. Higher values
+# raise recall at the cost of latency. Kept here so the CLI can use it without
+# importing numpy
+DEFAULT_NPROBE = 32
+
+__all__ = [
+    "APP_NAME",
+    "DATABASE_PATH",
+    "MODEL_PATH",
+    "LOG_PATH",
+    "ARXIV_API_URL",
+    "ARXIV_PDF_URL",
+    "DEFAULT_NPROBE",
+]
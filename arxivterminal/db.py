@@ -1,9 +1,300 @@
+import calendar
 import logging
 import sqlite3
-from datetime import datetime
-from typing import List, Optional, Tuple
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from arxivterminal.models import ArxivPaper, ArxivStats
+from arxivterminal.models import (
+    LIST_SEPARATOR,
+    ArxivStats,
+    CorpusFingerprint,
+    FetchCheckpoint,
+    FetchState,
+    Paper,
+    PaperHeader,
+    PaperRecord,
+)
+
+# Connection settings. WAL lets a fetch write while another process reads, and the busy
+# timeout makes concurrent writers wait for each other instead of failing.
+BUSY_TIMEOUT_SECONDS = 30.0
+CACHED_STATEMENTS = 256
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # 64 MiB
+    "mmap_size": 268435456,  # 256 MiB
+    "temp_store": "MEMORY",
+}
+
+# Columns of the papers table in the order expected by convert_to_paper
+PAPER_COLUMNS = (
+    "entry_id",
+    "updated",
+    "published",
+    "title",
+    "summary",
+    "authors",
+    "categories",
+    "viewed",
+)
+
+# Number of bound parameters used per query when looking up rows by id
+MAX_PARAMETERS = 500
+
+# Schema changes applied in order on top of the base papers table. The index of each
+# script plus one is stored in PRAGMA user_version once it has been applied.
+MIGRATIONS = [
+    # Full-text index over title, summary and authors kept in sync by triggers. The
+    # index references papers by rowid, so papers_fts must be rebuilt after a VACUUM.
+    """
+    CREATE VIRTUAL TABLE papers_fts USING fts5(
+        title, summary, authors, content='papers', content_rowid='rowid'
+    );
+
+    CREATE TRIGGER papers_fts_insert AFTER INSERT ON papers BEGIN
+        INSERT INTO papers_fts(rowid, title, summary, authors)
+        VALUES (new.rowid, new.title, new.summary, new.authors);
+    END;
+
+    CREATE TRIGGER papers_fts_delete AFTER DELETE ON papers BEGIN
+        INSERT INTO papers_fts(papers_fts, rowid, title, summary, authors)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.authors);
+    END;
+
+    CREATE TRIGGER papers_fts_update AFTER UPDATE OF title, summary, authors ON papers
+    BEGIN
+        INSERT INTO papers_fts(papers_fts, rowid, title, summary, authors)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.authors);
+        INSERT INTO papers_fts(rowid, title, summary, authors)
+        VALUES (new.rowid, new.title, new.summary, new.authors);
+    END;
+
+    INSERT INTO papers_fts(papers_fts) VALUES ('rebuild');
+    """,
+    # Index backing keyset pagination over papers in publication order
+    """
+    CREATE INDEX papers_published ON papers(published, entry_id);
+    """,
+    # Authors and categories normalized into indexed join tables. The list columns
+    # switch from commas to the unit separator so that names containing commas
+    # round-trip, after the existing comma separated values are backfilled.
+    """
+    CREATE TABLE paper_authors (
+        entry_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        author TEXT NOT NULL COLLATE NOCASE,
+        PRIMARY KEY (entry_id, position)
+    );
+    CREATE INDEX paper_authors_author ON paper_authors(author, entry_id);
+
+    CREATE TABLE paper_categories (
+        entry_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        PRIMARY KEY (entry_id, position)
+    );
+    CREATE INDEX paper_categories_category ON paper_categories(category, entry_id);
+
+    CREATE TRIGGER papers_lists_delete AFTER DELETE ON papers BEGIN
+        DELETE FROM paper_authors WHERE entry_id = old.entry_id;
+        DELETE FROM paper_categories WHERE entry_id = old.entry_id;
+    END;
+
+    WITH RECURSIVE split(entry_id, position, item, rest) AS (
+        SELECT entry_id, -1, NULL, authors || ',' FROM papers
+        UNION ALL
+        SELECT
+            entry_id,
+            position + 1,
+            substr(rest, 1, instr(rest, ',') - 1),
+            substr(rest, instr(rest, ',') + 1)
+        FROM split
+        WHERE rest != ''
+    )
+    INSERT INTO paper_authors(entry_id, position, author)
+    SELECT entry_id, position, item FROM split WHERE item != '';
+
+    WITH RECURSIVE split(entry_id, position, item, rest) AS (
+        SELECT entry_id, -1, NULL, categories || ',' FROM papers
+        UNION ALL
+        SELECT
+            entry_id,
+            position + 1,
+            substr(rest, 1, instr(rest, ',') - 1),
+            substr(rest, instr(rest, ',') + 1)
+        FROM split
+        WHERE rest != ''
+    )
+    INSERT INTO paper_categories(entry_id, position, category)
+    SELECT entry_id, position, item FROM split WHERE item != '';
+
+    UPDATE papers SET
+        authors = replace(authors, ',', char(31)),
+        categories = replace(categories, ',', char(31));
+    """,
+    # Integer epoch shadows of the ISO timestamps, with publication order indexed on
+    # the epoch instead of the string. Paper counts per publication date are kept in
+    # daily_counts by triggers so stats do not need to scan the papers table.
+    """
+    ALTER TABLE papers ADD COLUMN published_ts INTEGER
+        GENERATED ALWAYS AS (CAST(strftime('%s', published) AS INTEGER)) VIRTUAL;
+    ALTER TABLE papers ADD COLUMN updated_ts INTEGER
+        GENERATED ALWAYS AS (CAST(strftime('%s', updated) AS INTEGER)) VIRTUAL;
+
+    DROP INDEX papers_published;
+    CREATE INDEX papers_published_ts ON papers(published_ts, entry_id);
+    CREATE INDEX papers_updated_ts ON papers(updated_ts);
+
+    CREATE TABLE daily_counts (
+        date TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    ) WITHOUT ROWID;
+
+    INSERT INTO daily_counts(date, count)
+    SELECT DATE(published), COUNT(*) FROM papers GROUP BY DATE(published);
+
+    CREATE TRIGGER daily_counts_insert AFTER INSERT ON papers BEGIN
+        INSERT INTO daily_counts(date, count) VALUES (DATE(new.published), 1)
+        ON CONFLICT(date) DO UPDATE SET count = count + 1;
+    END;
+
+    CREATE TRIGGER daily_counts_delete AFTER DELETE ON papers BEGIN
+        UPDATE daily_counts SET count = count - 1 WHERE date = DATE(old.published);
+        DELETE FROM daily_counts WHERE date = DATE(old.published) AND count <= 0;
+    END;
+
+    CREATE TRIGGER daily_counts_update AFTER UPDATE OF published ON papers
+    WHEN DATE(old.published) IS NOT DATE(new.published)
+    BEGIN
+        UPDATE daily_counts SET count = count - 1 WHERE date = DATE(old.published);
+        DELETE FROM daily_counts WHERE date = DATE(old.published) AND count <= 0;
+        INSERT INTO daily_counts(date, count) VALUES (DATE(new.published), 1)
+        ON CONFLICT(date) DO UPDATE SET count = count + 1;
+    END;
+    """,
+    # Newest published and updated timestamps seen by fetches of each category
+    """
+    CREATE TABLE fetch_state (
+        category TEXT PRIMARY KEY,
+        published TIMESTAMP NOT NULL,
+        updated TIMESTAMP NOT NULL
+    );
+    """,
+    # Resumable positions of fetches which were interrupted before completing
+    """
+    CREATE TABLE fetch_checkpoints (
+        category TEXT PRIMARY KEY,
+        window_start TIMESTAMP NOT NULL,
+        offset INTEGER NOT NULL
+    );
+    """,
+    # Counter bumped whenever papers are written, so caches derived from the papers
+    # can tell they are stale
+    """
+    CREATE TABLE corpus_version (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        version INTEGER NOT NULL
+    );
+
+    INSERT INTO corpus_version(id, version) VALUES (0, 0);
+    """,
+    # Most similar papers of each paper under the LSA model named in neighbor_graph,
+    # so "search similar" is a lookup instead of a search
+    """
+    CREATE TABLE paper_neighbors (
+        entry_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        neighbor_id TEXT NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (entry_id, position)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE neighbor_graph (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        model_version TEXT
+    );
+
+    INSERT INTO neighbor_graph(id, model_version) VALUES (0, NULL);
+
+    CREATE TRIGGER paper_neighbors_delete AFTER DELETE ON papers BEGIN
+        DELETE FROM paper_neighbors WHERE entry_id = old.entry_id;
+    END;
+    """,
+    # Fetch checkpoints keyed by the exact query they were reached in, since an offset
+    # only applies to a repeat of the same query. Checkpoints by category are dropped.
+    """
+    DROP TABLE fetch_checkpoints;
+
+    CREATE TABLE fetch_checkpoints (
+        query TEXT PRIMARY KEY,
+        offset INTEGER NOT NULL
+    );
+    """,
+    # End of the date window of each checkpointed query. A query is never repeated
+    # once its window has passed, so its checkpoint can be dropped. Checkpoints saved
+    # before get an end in the past and are dropped by the next fetch.
+    """
+    ALTER TABLE fetch_checkpoints ADD COLUMN window_end_ts INTEGER NOT NULL DEFAULT 0;
+    """,
+]
+
+# Relative bm25 weights of the title, summary and authors columns
+FTS_WEIGHTS = (10.0, 1.0, 5.0)
+
+
+def to_epoch(timestamp: datetime) -> int:
+    """Return whole seconds since the epoch, treating naive datetimes as UTC like SQLite"""
+    return calendar.timegm(timestamp.utctimetuple())
+
+
+def chunked(items: Sequence, size: int) -> Iterator[Sequence]:
+    """Yield consecutive slices of at most `size` items"""
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
+def filter_clauses(
+    category: Optional[str] = None, author: Optional[str] = None, table: str = "papers"
+) -> Tuple[List[str], List[str]]:
+    """
+    Build SQL conditions restricting papers to a category and/or author.
+
+    Parameters
+    ----------
+    category : str, optional
+        Only include papers listed in this category, e.g. 'cs.CL'.
+    author : str, optional
+        Only include papers with this author, compared case-insensitively.
+    table : str, optional
+        The name or alias of the papers table in the query, by default "papers".
+
+    Returns
+    -------
+    Tuple[List[str], List[str]]
+        The conditions to be AND-ed into a WHERE clause and their parameters.
+    """
+    clauses = []
+    params = []
+    if category is not None:
+        clauses.append(
+            f"{table}.entry_id IN "
+            "(SELECT entry_id FROM paper_categories WHERE category = ?)"
+        )
+        params.append(category)
+    if author is not None:
+        clauses.append(
+            f"{table}.entry_id IN (SELECT entry_id FROM paper_authors WHERE author = ?)"
+        )
+        params.append(author)
+    return clauses, params
+
+
+def quote_fts_query(query: str) -> str:
+    """Return the query with every term quoted so it is matched literally by FTS5"""
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    return " ".join(terms)
 
 
 class ArxivDatabase:
@@ -17,12 +308,43 @@ class ArxivDatabase:
             Path to the database file.
         """
         self.database_path = database_path
+        self.conn = self.connect()
         self.create_database()
 
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open the connection shared by all methods of this database.
+
+        Returns
+        -------
+        sqlite3.Connection
+            A connection with WAL and the tuned PRAGMAs applied.
+        """
+        conn = sqlite3.connect(
+            self.database_path,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            cached_statements=CACHED_STATEMENTS,
+        )
+        for pragma, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        self.conn.close()
+
+    def __enter__(self) -> "ArxivDatabase":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
     def create_database(self):
         logging.info(f"Create database at {self.database_path}")
-        with sqlite3.connect(self.database_path) as conn:
-            cursor = conn.cursor()
+        with self.conn:
+            cursor = self.conn.cursor()
 
             # Create the papers table if it doesn't already exist
             cursor.execute(
@@ -39,12 +361,21 @@ class ArxivDatabase:
                 )
             """
             )
-            conn.commit()
+
+            # Apply any schema migrations the database has not seen yet. Each script
+            # and its version bump run in one transaction, so an interrupted
+            # migration is rolled back rather than left half applied.
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                logging.info(f"Apply database migration {number}")
+                cursor.executescript(
+                    f"BEGIN;\n{migration}\nPRAGMA user_version = {number};\nCOMMIT;"
+                )
 
     @staticmethod
-    def convert_to_paper(row: Tuple) -> ArxivPaper:
+    def convert_to_paper(row: Tuple) -> PaperRecord:
         """
-        Convert a database row to an ArxivPaper object.
+        Convert a database row to a PaperRecord object.
 
         Parameters
         ----------
@@ -53,103 +384,132 @@ class ArxivDatabase:
 
         Returns
         -------
-        ArxivPaper
-            An ArxivPaper object created from the given row.
+        PaperRecord
+            A PaperRecord object created from the given row.
         """
-        return ArxivPaper(
+        return PaperRecord(
             entry_id=row[0],
-            updated=datetime.fromisoformat(row[1]),
-            published=datetime.fromisoformat(row[2]),
+            updated=row[1],
+            published=row[2],
             title=row[3],
             summary=row[4],
-            authors=row[5].split(","),
-            categories=row[6].split(","),
+            authors=row[5],
+            categories=row[6],
             viewed=(row[7] == 1),
         )
 
-    def save_papers(self, papers: List[ArxivPaper]):
+    def save_papers(self, papers: List[Paper]) -> List[Paper]:
         """
-        Save a list of ArxivPaper objects to the database.
+        Save a list of papers to the database.
 
         Parameters
         ----------
-        papers : List[ArxivPaper]
-            A list of ArxivPaper objects to be saved in the database.
-        """
-        # Connect to the database
-        with sqlite3.connect(self.database_path) as conn:
-            cursor = conn.cursor()
-
-            # Fetch all existing paper IDs in a single query
-            cursor.execute("SELECT entry_id FROM papers")
-            existing_ids = set(row[0] for row in cursor.fetchall())
-
-            # Loop over the papers and insert or update them in the database
-            num_inserted = 0
-            num_updated = 0
-            for paper in papers:
-                if paper.entry_id in existing_ids:
-                    # If the paper already exists, update its information
-                    cursor.execute(
-                        """
-                        UPDATE papers SET
-                            updated=?,
-                            published=?,
-                            title=?,
-                            summary=?,
-                            authors=?,
-                            categories=?
-                        WHERE entry_id=?
-                    """,
-                        (
-                            paper.updated.isoformat(),
-                            paper.published.isoformat(),
-                            paper.title,
-                            paper.summary,
-                            ",".join(paper.authors),
-                            ",".join(paper.categories),
-                            paper.entry_id,
-                        ),
-                    )
-                    num_updated += 1
-                else:
-                    # If the paper doesn't exist, insert it into the database
-                    cursor.execute(
-                        """
-                        INSERT INTO papers (
-                            entry_id,
-                            updated,
-                            published,
-                            title,
-                            summary,
-                            authors,
-                            categories,
-                            viewed
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                        (
-                            paper.entry_id,
-                            paper.updated.isoformat(),
-                            paper.published.isoformat(),
-                            paper.title,
-                            paper.summary,
-                            ",".join(paper.authors),
-                            ",".join(paper.categories),
-                            0,
-                        ),
+        papers : List[Paper]
+            A list of ArxivPaper or PaperRecord objects to be saved in the database.
+
+        Returns
+        -------
+        List[Paper]
+            The papers which were inserted or updated.
+        """
+        # Deduplicate the batch, keeping the last copy of each paper
+        batch = {paper.entry_id: paper for paper in papers}
+        entry_ids = list(batch)
+
+        with self.conn:
+            cursor = self.conn.cursor()
+
+            # Look up the stored update time of only the papers in this batch
+            existing = {}
+            for chunk in chunked(entry_ids, MAX_PARAMETERS):
+                placeholders = ",".join("?" * len(chunk))
+                cursor.execute(
+                    f"SELECT entry_id, updated FROM papers WHERE entry_id IN ({placeholders})",
+                    chunk,
+                )
+                existing.update(cursor.fetchall())
+
+            # Only write papers which are new or whose update time has changed
+            saved = [
+                paper
+                for paper in batch.values()
+                if existing.get(paper.entry_id) != paper.updated.isoformat()
+            ]
+            num_updated = sum(1 for paper in saved if paper.entry_id in existing)
+            num_inserted = len(saved) - num_updated
+
+            cursor.executemany(
+                """
+                INSERT INTO papers (
+                    entry_id,
+                    updated,
+                    published,
+                    title,
+                    summary,
+                    authors,
+                    categories,
+                    viewed
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT(entry_id) DO UPDATE SET
+                    updated=excluded.updated,
+                    published=excluded.published,
+                    title=excluded.title,
+                    summary=excluded.summary,
+                    authors=excluded.authors,
+                    categories=excluded.categories
+                WHERE excluded.updated != papers.updated
+            """,
+                (
+                    (
+                        paper.entry_id,
+                        paper.updated.isoformat(),
+                        paper.published.isoformat(),
+                        paper.title,
+                        paper.summary,
+                        LIST_SEPARATOR.join(paper.authors),
+                        LIST_SEPARATOR.join(paper.categories),
                     )
-                    num_inserted += 1
+                    for paper in saved
+                ),
+            )
 
-            # Commit the changes to the database and close the connection
-            conn.commit()
+            # Replace the normalized author and category rows of the saved papers
+            for table, column, attribute in [
+                ("paper_authors", "author", "authors"),
+                ("paper_categories", "category", "categories"),
+            ]:
+                cursor.executemany(
+                    f"DELETE FROM {table} WHERE entry_id = ?",
+                    (
+                        (paper.entry_id,)
+                        for paper in saved
+                        if paper.entry_id in existing
+                    ),
+                )
+                cursor.executemany(
+                    f"INSERT INTO {table} (entry_id, position, {column}) VALUES (?, ?, ?)",
+                    (
+                        (paper.entry_id, position, value)
+                        for paper in saved
+                        for position, value in enumerate(getattr(paper, attribute))
+                    ),
+                )
+
+            if saved:
+                cursor.execute("UPDATE corpus_version SET version = version + 1")
 
         # Log the number of papers inserted and updated
         logging.info(f"Inserted {num_inserted} papers")
         logging.info(f"Updated {num_updated} papers")
 
+        return saved
+
     def get_papers(
-        self, published_after: Optional[datetime] = None
-    ) -> List[ArxivPaper]:
+        self,
+        published_after: Optional[datetime] = None,
+        category: Optional[str] = None,
+        author: Optional[str] = None,
+    ) -> List[PaperRecord]:
         """
         Retrieve papers from the database that were published after a specified date.
 
@@ -158,92 +518,368 @@ class ArxivDatabase:
         published_after : datetime, optional
             A datetime object representing the lower bound of the publication date for retrieved papers.
             If None, then no filters are applied and all papers are returned.
+        category : str, optional
+            Only return papers listed in this category.
+        author : str, optional
+            Only return papers with this author, compared case-insensitively.
 
         Returns
         -------
-        List[ArxivPaper]
-            A list of ArxivPaper objects that match the specified criteria.
+        List[PaperRecord]
+            A list of PaperRecord objects that match the specified criteria.
         """
-        # Connect to the database
-        with sqlite3.connect(self.database_path) as conn:
-            cursor = conn.cursor()
+        return list(self.iter_papers(published_after, category=category, author=author))
+
+    def iter_papers(
+        self,
+        published_after: Optional[datetime] = None,
+        columns: Optional[Sequence[str]] = None,
+        batch_size: int = 1000,
+        category: Optional[str] = None,
+        author: Optional[str] = None,
+    ) -> Iterator:
+        """
+        Stream papers published after a specified date in batches.
+
+        Papers are read with keyset pagination on the indexed (published_ts, entry_id),
+        so memory use is bounded by `batch_size` regardless of the size of the table.
 
-            if published_after is not None:
-                # Query the database for papers published after the specified date
+        Parameters
+        ----------
+        published_after : datetime, optional
+            A datetime object representing the lower bound of the publication date for retrieved papers.
+            If None, then no filters are applied and all papers are returned.
+        columns : Sequence[str], optional
+            The columns of the papers table to return. If None, PaperRecord objects are
+            yielded, otherwise tuples holding the requested columns in order.
+        batch_size : int, optional
+            The number of rows fetched per query, by default 1000.
+        category : str, optional
+            Only return papers listed in this category.
+        author : str, optional
+            Only return papers with this author, compared case-insensitively.
+
+        Yields
+        ------
+        Union[PaperRecord, Tuple]
+            The papers ordered by publication date.
+        """
+        selected = PAPER_COLUMNS if columns is None else tuple(columns)
+        unknown = set(selected) - set(PAPER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown paper columns: {sorted(unknown)}")
+
+        clauses, params = filter_clauses(category, author)
+        sql = f"""
+            SELECT {", ".join(selected)}, published_ts, entry_id
+            FROM papers
+            WHERE {" AND ".join(["(published_ts, entry_id) > (?, ?)"] + clauses)}
+            ORDER BY published_ts ASC, entry_id ASC
+            LIMIT ?
+        """
+        # Every stored entry id compares greater than "", so the first page starts at
+        # the lower bound inclusive
+        lower = -(2**63) if published_after is None else to_epoch(published_after)
+        last_key = (lower, "")
+
+        cursor = self.conn.cursor()
+        while True:
+            rows = cursor.execute(sql, (*last_key, *params, batch_size)).fetchall()
+            for row in rows:
+                if columns is None:
+                    yield self.convert_to_paper(row)
+                else:
+                    yield row[: len(selected)]
+
+            if len(rows) < batch_size:
+                break
+            last_key = rows[-1][-2:]
+
+    def get_papers_by_ids(self, entry_ids: List[str]) -> List[PaperRecord]:
+        """
+        Retrieve papers from the database by their entry ids.
+
+        Parameters
+        ----------
+        entry_ids : List[str]
+            The entry ids of the papers to retrieve.
+
+        Returns
+        -------
+        List[PaperRecord]
+            A list of PaperRecord objects in the same order as `entry_ids`. Ids which are
+            not present in the database are skipped.
+        """
+        papers_by_id = {}
+
+        with self.conn:
+            cursor = self.conn.cursor()
+
+            # Query in chunks to stay under SQLite's bound parameter limit
+            for chunk in chunked(entry_ids, MAX_PARAMETERS):
+                placeholders = ",".join("?" * len(chunk))
                 cursor.execute(
-                    """
+                    f"""
                     SELECT entry_id, updated, published, title, summary, authors, categories, viewed
                     FROM papers
-                    WHERE published >= ?
-                    ORDER BY published ASC
+                    WHERE entry_id IN ({placeholders})
                 """,
-                    (published_after.isoformat(),),
+                    chunk,
                 )
-            else:
-                # Query the database for papers published after the specified date
-                cursor.execute(
-                    """
-                    SELECT entry_id, updated, published, title, summary, authors, categories, viewed
-                    FROM papers
-                    ORDER BY published ASC
+                for row in cursor.fetchall():
+                    papers_by_id[row[0]] = self.convert_to_paper(row)
+
+        return [papers_by_id[i] for i in entry_ids if i in papers_by_id]
+
+    def get_entry_ids_updated_since(self, since: datetime) -> List[str]:
+        """
+        Retrieve the entry ids of the papers updated at or after a point in time.
+
+        Parameters
+        ----------
+        since : datetime
+            The earliest update time of the returned papers.
+
+        Returns
+        -------
+        List[str]
+            The entry ids ordered by update time.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.execute(
                 """
-                )
+                SELECT entry_id FROM papers
+                WHERE updated_ts >= ?
+                ORDER BY updated_ts ASC, entry_id ASC
+            """,
+                (to_epoch(since),),
+            )
+            return [row[0] for row in cursor.fetchall()]
 
-            # Parse the results into ArxivPaper objects
-            papers = []
-            for row in cursor.fetchall():
-                paper = self.convert_to_paper(row)
-                papers.append(paper)
+    def get_fetch_state(self, category: str) -> Optional[FetchState]:
+        """
+        Retrieve the newest timestamps seen by previous fetches of a category.
 
-        return papers
+        Parameters
+        ----------
+        category : str
+            The category that was fetched, e.g. 'cs.AI'.
+
+        Returns
+        -------
+        Optional[FetchState]
+            The high-water mark of the category, or None if it was never fetched.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "SELECT category, published, updated FROM fetch_state WHERE category = ?",
+                (category,),
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        return FetchState(category=row[0], published=row[1], updated=row[2])
+
+    def update_fetch_state(self, state: FetchState):
+        """
+        Advance the high-water mark of a category, never moving it backwards.
+
+        Parameters
+        ----------
+        state : FetchState
+            The newest timestamps of the papers returned by a completed fetch.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO fetch_state (category, published, updated) VALUES (?, ?, ?)
+                ON CONFLICT(category) DO UPDATE SET
+                    published=MAX(published, excluded.published),
+                    updated=MAX(updated, excluded.updated)
+            """,
+                (
+                    state.category,
+                    state.published.isoformat(),
+                    state.updated.isoformat(),
+                ),
+            )
+
+    def get_fetch_checkpoint(self, query: str) -> Optional[FetchCheckpoint]:
+        """
+        Retrieve the position reached by an interrupted run of an API query.
+
+        Parameters
+        ----------
+        query : str
+            The exact query that was run, see `fetch.fetch_query`.
+
+        Returns
+        -------
+        Optional[FetchCheckpoint]
+            The checkpoint, or None if the query was never interrupted.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                """
+                SELECT query, offset, window_end_ts FROM fetch_checkpoints
+                WHERE query = ?
+            """,
+                (query,),
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        return self.convert_to_checkpoint(row)
+
+    def get_fetch_checkpoints(self) -> List[FetchCheckpoint]:
+        """
+        Retrieve the positions reached by every interrupted query.
+
+        Returns
+        -------
+        List[FetchCheckpoint]
+            The checkpoints of all queries which were not run to completion.
+        """
+        cursor = self.conn.execute(
+            "SELECT query, offset, window_end_ts FROM fetch_checkpoints"
+        )
+        return [self.convert_to_checkpoint(row) for row in cursor]
+
+    @staticmethod
+    def convert_to_checkpoint(row: Tuple) -> FetchCheckpoint:
+        """Build a FetchCheckpoint from a row of the fetch_checkpoints table"""
+        query, offset, window_end = row
+        return FetchCheckpoint(
+            query=query,
+            offset=offset,
+            window_end=datetime.fromtimestamp(window_end, timezone.utc),
+        )
+
+    def save_fetch_checkpoints(self, checkpoints: List[FetchCheckpoint]):
+        """
+        Record the positions reached by in-progress fetches.
+
+        Parameters
+        ----------
+        checkpoints : List[FetchCheckpoint]
+            The checkpoints, whose papers must already be saved.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.executemany(
+                """
+                INSERT OR REPLACE INTO fetch_checkpoints (query, offset, window_end_ts)
+                VALUES (?, ?, ?)
+            """,
+                ((c.query, c.offset, to_epoch(c.window_end)) for c in checkpoints),
+            )
+
+    def delete_fetch_checkpoint(self, query: str):
+        """
+        Remove the checkpoint of a query once it has been run to completion.
+
+        Parameters
+        ----------
+        query : str
+            The query that was run.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.execute("DELETE FROM fetch_checkpoints WHERE query = ?", (query,))
+
+    def delete_expired_fetch_checkpoints(self, now: datetime):
+        """
+        Remove the checkpoints of queries whose date window has passed.
+
+        Parameters
+        ----------
+        now : datetime
+            The current time. Queries whose window ended before it are never run
+            again.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "DELETE FROM fetch_checkpoints WHERE window_end_ts < ?",
+                (to_epoch(now),),
+            )
 
     def delete_papers(self):
         """
         Delete all papers from the database.
         """
-        # Connect to the database
-        with sqlite3.connect(self.database_path) as conn:
-            cursor = conn.cursor()
+        with self.conn:
+            cursor = self.conn.cursor()
 
             # Execute a DELETE query to remove all records from the papers table
             cursor.execute("DELETE FROM papers")
-
-            # Commit the changes to the database and close the connection
-            conn.commit()
+            cursor.execute("UPDATE corpus_version SET version = version + 1")
 
         # Log the deletion of records
         logging.info("Deleted all papers from the database")
 
-    def search_papers(self, query: str) -> List[ArxivPaper]:
+    def search_papers(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        category: Optional[str] = None,
+        author: Optional[str] = None,
+    ) -> List[PaperRecord]:
         """
-        Search for papers in the database with a given query in their title or summary.
+        Search for papers in the database with a given query in their title, summary or
+        authors.
+
+        The query uses the SQLite FTS5 syntax, so multiple terms, "quoted phrases" and
+        prefix* queries are supported. Queries which are not valid FTS5 syntax are
+        searched as a sequence of literal terms instead.
 
         Parameters
         ----------
         query : str
             The search query.
+        limit : int, optional
+            The maximum number of papers to return. If None, all matches are returned.
+        category : str, optional
+            Only return papers listed in this category.
+        author : str, optional
+            Only return papers with this author, compared case-insensitively.
 
         Returns
         -------
-        List[ArxivPaper]
-            A list of ArxivPaper objects that match the search query.
+        List[PaperRecord]
+            A list of PaperRecord objects that match the search query, ordered by bm25
+            relevance.
         """
-        # Connect to the database
-        with sqlite3.connect(self.database_path) as conn:
-            cursor = conn.cursor()
+        with self.conn:
+            cursor = self.conn.cursor()
 
-            # Query the database for papers with the search phrase in the title or summary
-            cursor.execute(
-                """
-                SELECT entry_id, updated, published, title, summary, authors, categories, viewed
-                FROM papers
-                WHERE title LIKE ? OR summary LIKE ?
-                ORDER BY published ASC
-            """,
-                (f"%{query}%", f"%{query}%"),
-            )
+            clauses, filter_params = filter_clauses(category, author, table="p")
+            sql = f"""
+                SELECT p.entry_id, p.updated, p.published, p.title, p.summary, p.authors,
+                    p.categories, p.viewed
+                FROM papers_fts
+                JOIN papers p ON p.rowid = papers_fts.rowid
+                WHERE {" AND ".join(["papers_fts MATCH ?"] + clauses)}
+                ORDER BY bm25(papers_fts, ?, ?, ?)
+                LIMIT ?
+            """
+            params = (*filter_params, *FTS_WEIGHTS, -1 if limit is None else limit)
 
-            # Parse the results into ArxivPaper objects
+            # Query the full-text index, falling back to literal terms on syntax errors
+            try:
+                cursor.execute(sql, (query, *params))
+            except sqlite3.OperationalError:
+                if not query.split():
+                    return []
+                cursor.execute(sql, (quote_fts_query(query), *params))
+
+            # Parse the results into PaperRecord objects
             papers = []
             for row in cursor.fetchall():
                 paper = self.convert_to_paper(row)
@@ -251,51 +887,318 @@ class ArxivDatabase:
 
         return papers
 
-    def mark_paper_viewed(self, paper: ArxivPaper):
+    def mark_paper_viewed(self, paper: Paper):
         """
         Marks a paper as viewed
 
         Parameters
         ----------
-        paper: ArxivPaper
-            The ArxivPaper to be marked as viewed
+        paper: Paper
+            The paper to be marked as viewed
         """
-        with sqlite3.connect(self.database_path) as conn:
-            cursor = conn.cursor()
+        self.mark_papers_viewed([paper.entry_id])
 
-            # Update the 'viewed' column for the specified paper
-            cursor.execute(
+    def mark_papers_viewed(self, entry_ids: Iterable[str]):
+        """
+        Mark many papers as viewed in a single transaction.
+
+        Parameters
+        ----------
+        entry_ids : Iterable[str]
+            The entry ids of the papers which were viewed.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+
+            # Only touch rows which change, so unchanged papers are not rewritten
+            cursor.executemany(
                 """
                 UPDATE papers
                 SET viewed = 1
-                WHERE entry_id = ?
+                WHERE entry_id = ? AND viewed IS NOT 1
             """,
-                (paper.entry_id,),
+                ((entry_id,) for entry_id in entry_ids),
+            )
+
+    def get_paper_headers(
+        self,
+        published_after: Optional[datetime] = None,
+        before: Optional[str] = None,
+        limit: int = 20,
+        category: Optional[str] = None,
+        author: Optional[str] = None,
+    ) -> List[PaperHeader]:
+        """
+        Retrieve one page of papers without their abstracts, newest first.
+
+        Pages are read with keyset pagination on the indexed (published_ts, entry_id),
+        so any page costs the same to read however deep it is.
+
+        Parameters
+        ----------
+        published_after : datetime, optional
+            Only return papers published at or after this date. If None, all papers
+            are returned.
+        before : str, optional
+            The entry id of the last paper of the previous page. If None, the page
+            starts at the newest paper.
+        limit : int, optional
+            The maximum number of papers to return, by default 20.
+        category : str, optional
+            Only return papers listed in this category.
+        author : str, optional
+            Only return papers with this author, compared case-insensitively.
+
+        Returns
+        -------
+        List[PaperHeader]
+            The papers ordered by descending publication date.
+        """
+        clauses, filter_params = filter_clauses(category, author)
+        conditions = ["published_ts >= ?"]
+        params: List = [
+            -(2**63) if published_after is None else to_epoch(published_after)
+        ]
+        if before is not None:
+            conditions.append(
+                "(published_ts, entry_id) < "
+                "(SELECT published_ts, entry_id FROM papers WHERE entry_id = ?)"
             )
-            conn.commit()
+            params.append(before)
 
-    def get_stats(self) -> List[ArxivStats]:
+        cursor = self.conn.execute(
+            f"""
+            SELECT entry_id, published, title, viewed
+            FROM papers
+            WHERE {" AND ".join(conditions + clauses)}
+            ORDER BY published_ts DESC, entry_id DESC
+            LIMIT ?
+        """,
+            (*params, *filter_params, limit),
+        )
+        return [
+            PaperHeader(
+                entry_id, datetime.fromisoformat(published), title, bool(viewed)
+            )
+            for entry_id, published, title, viewed in cursor.fetchall()
+        ]
+
+    def get_corpus_fingerprint(self) -> CorpusFingerprint:
+        """
+        Summarize the papers cheaply enough to compare on every search.
+
+        Returns
+        -------
+        CorpusFingerprint
+            The number of papers and the most recent update time of any paper.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+
+            # Read the trigger-maintained counts and the index rather than the table
+            cursor.execute("SELECT COALESCE(SUM(count), 0) FROM daily_counts")
+            papers = cursor.fetchone()[0]
+            cursor.execute("SELECT MAX(updated_ts) FROM papers")
+            updated = cursor.fetchone()[0]
+
+        return CorpusFingerprint(
+            papers=papers,
+            updated=None
+            if updated is None
+            else datetime.fromtimestamp(updated, timezone.utc),
+        )
+
+    def get_corpus_version(self) -> int:
+        """
+        Return a counter which changes whenever papers are saved or deleted.
+
+        Returns
+        -------
+        int
+            The current version of the papers.
+        """
+        cursor = self.conn.execute("SELECT version FROM corpus_version")
+        return cursor.fetchone()[0]
+
+    def get_neighbor_version(self) -> Optional[str]:
+        """
+        Return the version of the LSA model the stored neighbour lists were built with.
+
+        Returns
+        -------
+        Optional[str]
+            The model version, or None if no lists were built yet.
+        """
+        cursor = self.conn.execute("SELECT model_version FROM neighbor_graph")
+        return cursor.fetchone()[0]
+
+    def reset_neighbors(self, model_version: Optional[str]):
+        """
+        Delete all neighbour lists, recording the model the new lists will come from.
+
+        Parameters
+        ----------
+        model_version : str, optional
+            The version of the model which computes the new lists.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.execute("DELETE FROM paper_neighbors")
+            cursor.execute(
+                "UPDATE neighbor_graph SET model_version = ?", (model_version,)
+            )
+
+    def save_neighbors(self, neighbors: Dict[str, List[Tuple[str, float]]]):
+        """
+        Replace the neighbour lists of some papers.
+
+        Parameters
+        ----------
+        neighbors : Dict[str, List[Tuple[str, float]]]
+            The entry ids and similarity scores of the neighbours of each paper,
+            most similar first.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.executemany(
+                "DELETE FROM paper_neighbors WHERE entry_id = ?",
+                [(entry_id,) for entry_id in neighbors],
+            )
+            cursor.executemany(
+                "INSERT INTO paper_neighbors VALUES (?, ?, ?, ?)",
+                [
+                    (entry_id, position, neighbor_id, score)
+                    for entry_id, items in neighbors.items()
+                    for position, (neighbor_id, score) in enumerate(items)
+                ],
+            )
+
+    def get_neighbors(self, entry_id: str, limit: int = 10) -> List[PaperRecord]:
+        """
+        Retrieve the stored most similar papers of a paper.
+
+        Parameters
+        ----------
+        entry_id : str
+            The entry id of the paper.
+        limit : int, optional
+            The maximum number of papers to return, by default 10.
+
+        Returns
+        -------
+        List[PaperRecord]
+            The neighbours most similar first, or an empty list if none are stored.
+        """
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                """
+                SELECT p.entry_id, p.updated, p.published, p.title, p.summary, p.authors,
+                    p.categories, p.viewed
+                FROM paper_neighbors n
+                JOIN papers p ON p.entry_id = n.neighbor_id
+                WHERE n.entry_id = ?
+                ORDER BY n.position
+                LIMIT ?
+            """,
+                (entry_id, limit),
+            )
+            return [self.convert_to_paper(row) for row in cursor.fetchall()]
+
+    def get_neighbor_lists(
+        self, entry_ids: List[str]
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Retrieve the stored neighbour ids and scores of some papers.
+
+        Parameters
+        ----------
+        entry_ids : List[str]
+            The entry ids of the papers.
+
+        Returns
+        -------
+        Dict[str, List[Tuple[str, float]]]
+            The neighbours of each paper which has any, most similar first.
+        """
+        neighbors: Dict[str, List[Tuple[str, float]]] = {}
+
+        with self.conn:
+            cursor = self.conn.cursor()
+            for chunk in chunked(entry_ids, MAX_PARAMETERS):
+                placeholders = ",".join("?" * len(chunk))
+                cursor.execute(
+                    f"""
+                    SELECT entry_id, neighbor_id, score FROM paper_neighbors
+                    WHERE entry_id IN ({placeholders})
+                    ORDER BY entry_id, position
+                """,
+                    chunk,
+                )
+                for entry_id, neighbor_id, score in cursor.fetchall():
+                    neighbors.setdefault(entry_id, []).append((neighbor_id, score))
+
+        return neighbors
+
+    def get_neighbor_thresholds(self) -> Dict[str, Tuple[float, int]]:
+        """
+        Summarize every stored neighbour list by its lowest score and its length.
+
+        Returns
+        -------
+        Dict[str, Tuple[float, int]]
+            The lowest neighbour score and the number of neighbours of each paper
+            which has a list.
+        """
+        cursor = self.conn.execute(
+            "SELECT entry_id, MIN(score), COUNT(*) FROM paper_neighbors GROUP BY entry_id"
+        )
+        return {entry_id: (score, count) for entry_id, score, count in cursor}
+
+    def get_stats(
+        self, category: Optional[str] = None, author: Optional[str] = None
+    ) -> List[ArxivStats]:
         """
         Retrieve the count of papers by publication date from the database.
 
+        Parameters
+        ----------
+        category : str, optional
+            Only count papers listed in this category.
+        author : str, optional
+            Only count papers with this author, compared case-insensitively.
+
         Returns
         -------
         List[ArxivStats]
             A list of ArxivStats objects representing the count of papers by publication date.
         """
-        # Connect to the database
-        with sqlite3.connect(self.database_path) as conn:
-            cursor = conn.cursor()
+        clauses, params = filter_clauses(category, author)
 
-            # Query the database for the count of papers by publish date
-            cursor.execute(
+        with self.conn:
+            cursor = self.conn.cursor()
+
+            if clauses:
+                # Count only the filtered papers by publish date
+                cursor.execute(
+                    f"""
+                    SELECT DATE(published) as date, COUNT(*) as count
+                    FROM papers
+                    WHERE {' AND '.join(clauses)}
+                    GROUP BY DATE(published)
+                    ORDER BY DATE(published) ASC
+                """,
+                    params,
+                )
+            else:
+                # Read the counts maintained by triggers on the papers table
+                cursor.execute(
+                    """
+                    SELECT date, count
+                    FROM daily_counts
+                    ORDER BY date ASC
                 """
-                SELECT DATE(published) as date, COUNT(*) as count
-                FROM papers
-                GROUP BY DATE(published)
-                ORDER BY DATE(published) ASC
-            """
-            )
+                )
 
             # Parse the results into ArxivStats objects
             stats = []
@@ -1,27 +1,155 @@
 import logging
+import os
+import shutil
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Union
 
-import arxiv
+from arxivterminal.constants import ARXIV_PDF_URL
+from arxivterminal.fetch import RateLimiter
+from arxivterminal.models import Paper
 
-from arxivterminal.models import ArxivPaper
+DEFAULT_PAPER_DIR = "./arxiv_papers"
 
+# arXiv throttles clients which download PDFs faster than about one per second
+PDF_REQUEST_INTERVAL = 1.0
 
-def download_paper(paper: ArxivPaper, paper_dir: str = "./arxiv_papers"):
+# Number of PDFs downloaded concurrently
+DOWNLOAD_WORKERS = 4
+
+# Attempts per PDF. A retry resumes from the bytes already written
+DOWNLOAD_ATTEMPTS = 3
+
+DOWNLOAD_TIMEOUT_SECONDS = 60
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+
+
+class DownloadResult(NamedTuple):
+    entry_id: str
+    path: Path
+    status: str  # "downloaded", "exists" or "failed"
+    error: Optional[str] = None
+
+
+def short_id(entry_id: str) -> str:
+    """Return the arXiv id of an entry id URL, e.g. 2301.00001v1 or hep-th/9901001v1"""
+    return entry_id.split("/abs/")[-1]
+
+
+def pdf_url(entry_id: str) -> str:
+    """Return the URL of the PDF of a paper, without asking the API for it"""
+    return f"{ARXIV_PDF_URL}/{short_id(entry_id)}"
+
+
+def pdf_path(entry_id: str, paper_dir: Union[str, Path] = DEFAULT_PAPER_DIR) -> Path:
+    """Return where the PDF of a paper is saved"""
+    return Path(paper_dir) / f"{short_id(entry_id).replace('/', '_')}.pdf"
+
+
+def download_pdf(
+    url: str,
+    path: Union[str, Path],
+    limiter: Optional[RateLimiter] = None,
+    timeout: float = DOWNLOAD_TIMEOUT_SECONDS,
+) -> int:
+    """
+    Download a file, resuming a partial download and renaming it into place when done.
+
+    The body is written to `<path>.part`. If that file exists, only the remaining
+    bytes are requested with a Range header. The file is renamed to `path` once its
+    size matches the size announced by the server, so `path` never holds a partial
+    download.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the file.
+    path : Union[str, Path]
+        Where the file is saved.
+    limiter : RateLimiter, optional
+        The limiter the request goes through, if any.
+    timeout : float, optional
+        Seconds to wait for the server, by default DOWNLOAD_TIMEOUT_SECONDS.
+
+    Returns
+    -------
+    int
+        The size of the file in bytes.
+
+    Raises
+    ------
+    IOError
+        If the download ended before the announced size was received.
+    """
+    path = Path(path)
+    partial = path.with_name(f"{path.name}.part")
+    offset = partial.stat().st_size if partial.exists() else 0
+
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
+    if limiter is not None:
+        limiter.acquire()
+
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code != 416:
+            raise
+        # The partial file already holds everything the server has
+        response = None
+
+    if response is not None:
+        with response:
+            if response.status == 206:
+                mode = "ab"
+            else:
+                # The server ignored the range, so start over
+                mode, offset = "wb", 0
+            length = response.headers.get("Content-Length")
+            expected = None if length is None else offset + int(length)
+
+            with open(partial, mode) as f:
+                shutil.copyfileobj(response, f, DOWNLOAD_CHUNK_SIZE)
+    else:
+        expected = offset
+
+    size = partial.stat().st_size
+    if expected is not None and size != expected:
+        raise IOError(f"Downloaded {size} of {expected} bytes from {url}")
+
+    os.replace(partial, path)
+    return size
+
+
+def download_paper(
+    paper: Paper,
+    paper_dir: str = DEFAULT_PAPER_DIR,
+    limiter: Optional[RateLimiter] = None,
+):
     """
     Downloads an Arxiv paper as PDF to the specified directory.
 
     Parameters
     ----------
-    paper: ArxivPaper
+    paper: Paper
         The paper to be downloaded.
     paper_dir: str
         The path where the paper will be saved. Defaults to ./arxiv_papers
         which means the PDFs will be stored relative to the current
         directory of the script.
+    limiter: RateLimiter, optional
+        The limiter the request goes through, if any.
+
+    Raises
+    ------
+    FileExistsError
+        If the paper was already downloaded. A partial download left behind by an
+        interrupted run is resumed instead.
     """
-    id = paper.entry_id.split("/")[-1]
-    file_name = f"{id}.pdf"
-    paper_location = Path(paper_dir) / file_name
+    paper_location = pdf_path(paper.entry_id, paper_dir)
 
     if paper_location.exists():
         logging.info(f"Paper is already downloaded at {str(paper_location)}")
@@ -29,6 +157,71 @@ def download_paper(paper: ArxivPaper, paper_dir: str = "./arxiv_papers"):
     else:
         paper_location.parent.mkdir(parents=True, exist_ok=True)
 
-    result = next(arxiv.Search(id_list=[id]).results())
-    result.download_pdf(dirpath=paper_dir, filename=file_name)
+    download_pdf(pdf_url(paper.entry_id), paper_location, limiter)
     logging.info(f"Saved paper to {str(paper_location)}")
+
+
+def download_papers(
+    entry_ids: Iterable[str],
+    paper_dir: str = DEFAULT_PAPER_DIR,
+    max_workers: int = DOWNLOAD_WORKERS,
+    delay: float = PDF_REQUEST_INTERVAL,
+    attempts: int = DOWNLOAD_ATTEMPTS,
+) -> List[DownloadResult]:
+    """
+    Download the PDFs of many papers concurrently.
+
+    The downloads share one rate limiter, so `max_workers` only overlaps the
+    transfers while requests still start at most once every `delay` seconds. A
+    failed download is retried from where it stopped, and papers already downloaded
+    are skipped.
+
+    Parameters
+    ----------
+    entry_ids : Iterable[str]
+        The entry ids of the papers.
+    paper_dir : str, optional
+        The directory the PDFs are saved to, by default ./arxiv_papers.
+    max_workers : int, optional
+        The number of concurrent downloads, by default DOWNLOAD_WORKERS.
+    delay : float, optional
+        Seconds between requests, by default PDF_REQUEST_INTERVAL.
+    attempts : int, optional
+        The number of attempts per paper, by default DOWNLOAD_ATTEMPTS.
+
+    Returns
+    -------
+    List[DownloadResult]
+        The outcome for every paper, in the order given.
+    """
+    Path(paper_dir).mkdir(parents=True, exist_ok=True)
+    limiter = RateLimiter(delay)
+
+    def download(entry_id: str) -> DownloadResult:
+        path = pdf_path(entry_id, paper_dir)
+        if path.exists():
+            return DownloadResult(entry_id, path, "exists")
+
+        error = None
+        for attempt in range(attempts):
+            try:
+                download_pdf(pdf_url(entry_id), path, limiter)
+                logging.info(f"Saved paper to {path}")
+                return DownloadResult(entry_id, path, "downloaded")
+            except urllib.error.HTTPError as e:
+                error = str(e)
+                if e.code < 500 and e.code != 429:
+                    # Retrying cannot help, e.g. for a paper without a PDF
+                    break
+                logging.warning(
+                    f"Attempt {attempt + 1} to download {entry_id} failed: {e}"
+                )
+            except (OSError, ValueError) as e:
+                error = str(e)
+                logging.warning(
+                    f"Attempt {attempt + 1} to download {entry_id} failed: {e}"
+                )
+        return DownloadResult(entry_id, path, "failed", error)
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        return list(executor.map(download, dict.fromkeys(entry_ids)))
@@ -1,31 +1,133 @@
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import List
+from queue import Full, Queue
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
 
-from arxiv import Search, SortCriterion, SortOrder
+from arxiv import (
+    Client,
+    HTTPError,
+    Search,
+    SortCriterion,
+    SortOrder,
+    UnexpectedEmptyPageError,
+)
 
-from arxivterminal.models import ArxivPaper
+from arxivterminal.constants import ARXIV_API_URL
+from arxivterminal.db import ArxivDatabase
+from arxivterminal.models import ArxivPaper, FetchCheckpoint, FetchState, Paper
 
+# arXiv asks API clients to make no more than one request every three seconds
+ARXIV_REQUEST_INTERVAL = 3.0
 
-def download_papers(
-    category: str, num_days: int, max_results: int = -1
-) -> List[ArxivPaper]:
+# Results requested per API call. arXiv serves up to 2000, but large pages are slow
+# to generate and more likely to time out
+ARXIV_PAGE_SIZE = 500
+
+# Retries of a failed API request, each of which waits its turn at the rate limiter
+ARXIV_RETRIES = 3
+
+# Format of the bounds of a submittedDate range query, in UTC
+ARXIV_DATE_FORMAT = "%Y%m%d%H%M"
+
+# Number of papers committed to the database at a time while fetching
+FETCH_BATCH_SIZE = 500
+
+# Number of downloaded papers buffered ahead of the database writes
+FETCH_QUEUE_SIZE = 2000
+
+
+class RateLimiter:
+    def __init__(self, interval: float = ARXIV_REQUEST_INTERVAL, burst: int = 1):
+        """
+        Initialize a token bucket shared by every thread issuing API requests.
+
+        Parameters
+        ----------
+        interval : float, optional
+            Seconds between requests on average, by default ARXIV_REQUEST_INTERVAL.
+        burst : int, optional
+            The number of requests which may be made back to back, by default 1.
+        """
+        self.interval = interval
+        self.burst = burst
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a request may be made.
+        """
+        if self.interval <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._refilled_at
+                self._tokens = min(self.burst, self._tokens + elapsed / self.interval)
+                self._refilled_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.interval
+
+            time.sleep(wait)
+
+
+class RateLimitedClient(Client):
+    query_url_format = f"{ARXIV_API_URL}?{{}}"
+
+    def __init__(
+        self, limiter: RateLimiter, num_retries: int = ARXIV_RETRIES, **kwargs
+    ):
+        """
+        Initialize an arXiv API client whose page requests go through a shared limiter.
+
+        Parameters
+        ----------
+        limiter : RateLimiter
+            The limiter shared with other clients.
+        num_retries : int, optional
+            The number of times a failed page request is retried, by default
+            ARXIV_RETRIES.
+        **kwargs
+            Passed to arxiv.Client, e.g. page_size and delay_seconds.
+        """
+        # arxiv.Client retries in a private recursion which would bypass the limiter,
+        # so it is built without retries and they are made in _parse_feed instead
+        super().__init__(num_retries=0, **kwargs)
+        self.limiter = limiter
+        self.retries = num_retries
+
+    def _parse_feed(self, url: str, first_page: bool = True):
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                return super()._parse_feed(url, first_page)
+            except (HTTPError, UnexpectedEmptyPageError) as e:
+                if attempt == self.retries:
+                    raise
+                logging.warning(f"Attempt {attempt + 1} to fetch {url} failed: {e}")
+
+
+def fetch_window(num_days: int) -> Tuple[datetime, datetime]:
     """
-    Download Arxiv papers from a specified category within the last `num_days`.
+    Return the UTC start and end of the window covering the last `num_days` days.
 
     Parameters
     ----------
-    category : str
-        The category to download papers from, e.g., 'cs.AI' for Artificial Intelligence.
     num_days : int
-        The number of days to look back for downloading papers.
-    max_results : int, optional, default=-1
-        The maximum number of results to return. If -1, return all results.
+        The number of days to look back, including today.
 
     Returns
     -------
-    List[ArxivPaper]
-        A list of ArxivPaper objects representing the downloaded papers.
+    Tuple[datetime, datetime]
+        The start of the first day and the end of today.
     """
     current_date = datetime.now(timezone.utc).date()
 
@@ -35,21 +137,117 @@ def download_papers(
     end_date = datetime.combine(current_date, datetime.max.time()).replace(
         tzinfo=timezone.utc
     )
+    return start_date, end_date
+
+
+def build_query(categories: List[str], start: datetime, end: datetime) -> str:
+    """
+    Build an API query for papers in any of `categories` submitted between two times.
+
+    Parameters
+    ----------
+    categories : List[str]
+        The categories to match, e.g. ['cs.AI', 'cs.LG'].
+    start : datetime
+        The earliest submission time, rounded down to the minute.
+    end : datetime
+        The latest submission time, rounded down to the minute.
+
+    Returns
+    -------
+    str
+        A query such as '(cat:cs.AI OR cat:cs.LG) AND submittedDate:[... TO ...]'.
+    """
+    query = " OR ".join(f"cat:{category}" for category in categories)
+    if len(categories) > 1:
+        query = f"({query})"
+
+    start = start.astimezone(timezone.utc).strftime(ARXIV_DATE_FORMAT)
+    end = end.astimezone(timezone.utc).strftime(ARXIV_DATE_FORMAT)
+    return f"{query} AND submittedDate:[{start} TO {end}]"
+
+
+def fetch_query(
+    categories: List[str], num_days: int, stop_before: Optional[datetime] = None
+) -> Tuple[str, datetime, datetime]:
+    """
+    Build the API query of a fetch and the bounds of its date window.
+
+    Parameters
+    ----------
+    categories : List[str]
+        The categories to match.
+    num_days : int
+        The number of days to look back.
+    stop_before : datetime, optional
+        Start the window at this time instead, if it is more recent.
+
+    Returns
+    -------
+    Tuple[str, datetime, datetime]
+        The query and the start and end of its window.
+    """
+    start_date, end_date = fetch_window(num_days)
+    if stop_before is not None and stop_before > start_date:
+        start_date = stop_before
+    return build_query(categories, start_date, end_date), start_date, end_date
+
+
+def download_papers(
+    categories: Union[str, List[str]],
+    num_days: int,
+    max_results: int = -1,
+    client: Optional[Client] = None,
+    stop_before: Optional[datetime] = None,
+    offset: int = 0,
+) -> Iterator[ArxivPaper]:
+    """
+    Download Arxiv papers from the specified categories within the last `num_days`.
+
+    The date window is part of the query, so the API returns only papers inside it
+    and a single query covers all categories. Papers are yielded as each page of
+    results arrives, newest first.
+
+    Parameters
+    ----------
+    categories : Union[str, List[str]]
+        The category or categories to download papers from, e.g., 'cs.AI' for
+        Artificial Intelligence.
+    num_days : int
+        The number of days to look back for downloading papers.
+    max_results : int, optional, default=-1
+        The maximum number of results to return. If -1, return all results.
+    client : arxiv.Client, optional
+        The client used to query the API, which sets the page size and delay. If
+        None, a default client is used.
+    stop_before : datetime, optional
+        Only download papers published from this time on, if it is more recent than
+        the start of the `num_days` window.
+    offset : int, optional
+        The number of leading results to skip, used to resume a fetch, by default 0.
+
+    Yields
+    ------
+    ArxivPaper
+        The downloaded papers.
+    """
+    if isinstance(categories, str):
+        categories = [categories]
+
+    query, start_date, end_date = fetch_query(categories, num_days, stop_before)
     logging.info(f"Query from {start_date} to {end_date}")
 
     search = Search(
-        query=f"cat:{category}",
+        query=query,
+        max_results=max_results if max_results > 0 else float("inf"),
         sort_by=SortCriterion.SubmittedDate,
         sort_order=SortOrder.Descending,
     )
+    client = RateLimitedClient(RateLimiter()) if client is None else client
 
-    papers = []
-
-    for i, result in enumerate(search.results()):
-        if max_results > 0 and i >= max_results:
-            logging.info(f"Reached max results {max_results}")
-            break
+    num_papers = 0
 
+    for result in client.results(search, offset=offset):
         paper = ArxivPaper(
             entry_id=result.entry_id,
             updated=result.updated,
@@ -60,12 +258,286 @@ def download_papers(
             categories=result.categories,
             viewed=False,
         )
-        if paper.published >= start_date and paper.published <= end_date:
-            papers.append(paper)
-        elif paper.published < start_date:
-            logging.info(f"Reached start date {start_date}")
+        # The query has minute precision, so papers at the edges may fall outside
+        if paper.published > end_date:
+            continue
+        if paper.published < start_date:
             break
+        num_papers += 1
+        yield paper
+
+    logging.info(f"Found {num_papers} papers in {', '.join(categories)}")
+
+
+class FetchBatch(NamedTuple):
+    papers: List[ArxivPaper]
+    checkpoints: List[FetchCheckpoint]
+    completed: List[str]
+    high_water_marks: List[FetchState]
+    completed_queries: List[str]
+
 
-    logging.info(f"Found {len(papers)} papers")
+class _QueueItem(NamedTuple):
+    categories: List[str]
+    query: str
+    offset: int
+    paper: Optional[ArxivPaper]
+    error: Optional[BaseException]
+
+
+def _download_to_queue(
+    queue: Queue,
+    stop: threading.Event,
+    categories: List[str],
+    query: str,
+    offset: int,
+    **kwargs,
+):
+    """Run download_papers, passing each paper and finally a sentinel to the queue"""
+
+    def put(item: _QueueItem):
+        # Give up waiting for space once the consumer has stopped
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    try:
+        for paper in download_papers(categories, offset=offset, **kwargs):
+            offset += 1
+            put(_QueueItem(categories, query, offset, paper, None))
+            if stop.is_set():
+                return
+        put(_QueueItem(categories, query, offset, None, None))
+    except Exception as e:
+        put(_QueueItem(categories, query, offset, None, e))
+
+
+def fetch_papers(
+    categories: List[str],
+    num_days: int,
+    max_workers: int = 4,
+    limiter: Optional[RateLimiter] = None,
+    stop_before: Optional[Dict[str, datetime]] = None,
+    offsets: Optional[Dict[str, int]] = None,
+    batch_size: int = FETCH_BATCH_SIZE,
+    queue_size: int = FETCH_QUEUE_SIZE,
+    combine_categories: bool = True,
+    page_size: int = ARXIV_PAGE_SIZE,
+    delay: float = ARXIV_REQUEST_INTERVAL,
+) -> Iterator[FetchBatch]:
+    """
+    Download papers from several categories, yielding them in batches.
+
+    By default all categories are fetched with one query, which returns each
+    cross-listed paper once and needs the fewest pages. Otherwise every category is
+    paged through on its own thread, with all requests sharing one rate limiter so
+    the combined request rate stays within arXiv's policy. Downloads feed a bounded
+    queue, so memory use does not grow with the number of papers fetched. Papers
+    cross-listed in several categories are yielded once.
+
+    Parameters
+    ----------
+    categories : List[str]
+        The categories to download papers from.
+    num_days : int
+        The number of days to look back for downloading papers.
+    max_workers : int, optional
+        The maximum number of categories fetched at once, by default 4.
+    limiter : RateLimiter, optional
+        The limiter shared by all requests. If None, a new one is created.
+    stop_before : Dict[str, datetime], optional
+        Per category times before which paging stops, see `download_papers`. A
+        combined query stops at the earliest of them.
+    offsets : Dict[str, int], optional
+        The number of leading results to skip when resuming a fetch, keyed by the
+        exact query they were reached in, see `fetch_query`. A query which differs
+        in any way, e.g. in its categories, starts from the beginning.
+    batch_size : int, optional
+        The maximum number of papers per batch, by default FETCH_BATCH_SIZE.
+    queue_size : int, optional
+        The maximum number of papers buffered between the threads and the caller, by
+        default FETCH_QUEUE_SIZE.
+    combine_categories : bool, optional
+        If True, OR the categories into a single query, by default True.
+    page_size : int, optional
+        The number of results per API request, by default ARXIV_PAGE_SIZE.
+    delay : float, optional
+        Seconds between API requests, by default ARXIV_REQUEST_INTERVAL. Ignored if
+        a limiter is passed.
+
+    Yields
+    ------
+    FetchBatch
+        The next papers, the offset reached by each query with papers in the batch,
+        the categories which completed, their high-water marks and the queries
+        which completed.
+
+    Raises
+    ------
+    Exception
+        The first error raised while downloading a category, after the papers
+        received before it have been yielded.
+    """
+    limiter = RateLimiter(interval=delay) if limiter is None else limiter
+    stop_before = {} if stop_before is None else stop_before
+    offsets = {} if offsets is None else offsets
+
+    # Sorted so the same categories always make the same query
+    groups = [sorted(categories)] if combine_categories else [[c] for c in categories]
+
+    queue: Queue = Queue(maxsize=queue_size)
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    # End of the date window of each query, after which its checkpoint is stale
+    window_ends: Dict[str, datetime] = {}
+    for group in groups:
+        group_stop_before = [stop_before.get(category) for category in group]
+        group_stop = None if None in group_stop_before else min(group_stop_before)
+        query, _, end_date = fetch_query(group, num_days, group_stop)
+        window_ends[query] = end_date
+        offset = offsets.get(query, 0)
+        if offset:
+            logging.info(f"Resuming {query} at offset {offset}")
+        executor.submit(
+            _download_to_queue,
+            queue,
+            stop,
+            group,
+            query,
+            offset,
+            num_days=num_days,
+            client=RateLimitedClient(
+                limiter, page_size=page_size, delay_seconds=limiter.interval
+            ),
+            stop_before=group_stop,
+        )
+
+    # Update time of every paper yielded so far, to drop cross-listed duplicates
+    seen: Dict[str, datetime] = {}
+    marks: Dict[str, FetchState] = {}
+    papers: List[ArxivPaper] = []
+    checkpoints: Dict[str, FetchCheckpoint] = {}
+    completed: List[str] = []
+    completed_queries: List[str] = []
+    remaining = len(groups)
+
+    try:
+        while remaining > 0:
+            item = queue.get()
+
+            if item.paper is not None:
+                paper = item.paper
+                if paper.entry_id not in seen or paper.updated > seen[paper.entry_id]:
+                    seen[paper.entry_id] = paper.updated
+                    papers.append(paper)
+
+                checkpoints[item.query] = FetchCheckpoint(
+                    query=item.query,
+                    offset=item.offset,
+                    window_end=window_ends[item.query],
+                )
+                for category in item.categories:
+                    if category not in paper.categories:
+                        continue
+
+                    mark = marks.get(category)
+                    if mark is None:
+                        mark = marks[category] = FetchState(
+                            category=category,
+                            published=paper.published,
+                            updated=paper.updated,
+                        )
+                    mark.published = max(mark.published, paper.published)
+                    mark.updated = max(mark.updated, paper.updated)
+            else:
+                remaining -= 1
+                if item.error is not None:
+                    # Hand over what was received so far, then surface the error
+                    remaining = 0
+                else:
+                    completed.extend(item.categories)
+                    completed_queries.append(item.query)
+                    logging.info(f"Fetched papers from {', '.join(item.categories)}")
+
+            if len(papers) >= batch_size or item.paper is None:
+                yield FetchBatch(
+                    papers,
+                    list(checkpoints.values()),
+                    completed,
+                    [marks[c] for c in completed if c in marks],
+                    completed_queries,
+                )
+                papers, checkpoints, completed, completed_queries = [], {}, [], []
+                if item.error is not None:
+                    raise item.error
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+
+def save_fetched_papers(
+    db: ArxivDatabase,
+    categories: List[str],
+    num_days: int,
+    incremental: bool = False,
+    overlap: timedelta = timedelta(hours=24),
+    on_saved: Optional[Callable[[List[Paper]], None]] = None,
+    **kwargs,
+):
+    """
+    Fetch papers from several categories and save them to the database as they arrive.
+
+    Each batch is committed with a checkpoint of the position reached by every
+    query. If the fetch is interrupted, running it again the same day with the same
+    categories and options repeats the same queries, which resume from their
+    checkpoints instead of starting over.
+
+    Parameters
+    ----------
+    db : ArxivDatabase
+        The database the papers are saved to.
+    categories : List[str]
+        The categories to download papers from.
+    num_days : int
+        The number of days to look back for downloading papers.
+    incremental : bool, optional
+        If True, stop paging each category at the newest papers seen by previous
+        fetches, less `overlap`, by default False.
+    overlap : timedelta, optional
+        How far before the previous high-water mark incremental fetches re-fetch, to
+        pick up late updates, by default 24 hours.
+    on_saved : Callable[[List[Paper]], None], optional
+        Called with the papers inserted or updated by each batch.
+    **kwargs
+        Passed to `fetch_papers`, e.g. max_workers or batch_size.
+    """
+    stop_before = {}
+    for category in categories:
+        state = db.get_fetch_state(category)
+        if incremental and state is not None:
+            stop_before[category] = state.published - overlap
+
+    # Queries embed their date window, so those of past days are never made again
+    db.delete_expired_fetch_checkpoints(datetime.now(timezone.utc))
+    offsets = {c.query: c.offset for c in db.get_fetch_checkpoints()}
+
+    batches = fetch_papers(
+        categories,
+        num_days=num_days,
+        stop_before=stop_before,
+        offsets=offsets,
+        **kwargs,
+    )
+    for batch in batches:
+        saved = db.save_papers(batch.papers)
+        db.save_fetch_checkpoints(batch.checkpoints)
+        for state in batch.high_water_marks:
+            db.update_fetch_state(state)
+        for query in batch.completed_queries:
+            db.delete_fetch_checkpoint(query)
 
-    return papers
+        if on_saved is not None and saved:
+            on_saved(saved)
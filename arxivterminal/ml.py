@@ -1,23 +1,631 @@
+import json
 import logging
+import os
+import uuid
+from itertools import islice
 from pathlib import Path
-from typing import List, Optional, Tuple, Union
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 import numpy as np
 from joblib import dump, load
-from numpy import dot
-from numpy.linalg import norm
+from scipy.linalg import eigh
+from scipy.sparse import issparse
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.decomposition import TruncatedSVD
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import Normalizer
 
-from arxivterminal.db import ArxivDatabase
-from arxivterminal.models import ArxivPaper
+from arxivterminal.ann import DEFAULT_NPROBE, IvfIndex, ann_index_path
+from arxivterminal.cache import SearchCache, search_cache_path
+from arxivterminal.db import ArxivDatabase, chunked
+from arxivterminal.models import CorpusFingerprint, Paper
+from arxivterminal.refit import embeddings_path, is_refit_running, schedule_refit
 
+# Number of training abstracts kept to measure the out-of-vocabulary rate
+OOV_SAMPLE_SIZE = 2000
 
-def cosine_sim(a, b):
-    """Return cosine similarity"""
-    return dot(a, b.T) / (norm(a) * norm(b))
+# Number of abstracts embedded per call to the model when building the store
+EMBED_BATCH_SIZE = 1000
+
+# Number of abstracts read from the database at a time by out-of-core training
+STREAM_CHUNK_SIZE = 5000
+
+# Number of distinct terms counted while building an out-of-core vocabulary before
+# the rarest are pruned
+MAX_COUNTED_TERMS = 500000
+
+# Largest vocabulary for out-of-core training, whose SVD accumulates a dense
+# features x features matrix
+MAX_STREAMING_FEATURES = 10000
+
+# Number of TF-IDF rows multiplied at a time while accumulating the out-of-core SVD,
+# which bounds the sparse products held besides the features x features matrix
+GRAM_BATCH_SIZE = 500
+
+# Below this many documents exact search is fast enough and no ANN index is built
+ANN_MIN_DOCUMENTS = 20000
+
+# Block of queries and document vectors scored at a time by exact search, which
+# bounds the similarity matrix held in memory to their product
+QUERY_CHUNK_SIZE = 256
+VECTOR_CHUNK_SIZE = 65536
+
+# Encodings of stored document vectors. float16 halves and int8 quarters the size of
+# float32, at a small cost in precision
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+# Relative change in the number of papers since training after which a search
+# schedules a background refit
+REFIT_CORPUS_CHANGE = 0.2
+
+# Number of most similar papers stored per paper for "search similar"
+NEIGHBOR_COUNT = 20
+
+# Largest corpus whose neighbour lists are all computed as soon as a model is
+# trained. Above it, a list is computed the first time it is requested, and stored
+# lists are kept up to date as new papers are embedded
+NEIGHBOR_BUILD_MAX_DOCUMENTS = 20000
+
+
+class Document(NamedTuple):
+    entry_id: str
+    summary: str
+
+
+class ScoredPaper(NamedTuple):
+    paper: Paper
+    score: float
+
+
+def iter_documents(db: ArxivDatabase) -> Iterator[Document]:
+    """Stream the entry id and abstract of every paper in the database"""
+    for row in db.iter_papers(columns=Document._fields):
+        yield Document(*row)
+
+
+def iter_document_chunks(
+    db: ArxivDatabase, chunk_size: int = EMBED_BATCH_SIZE
+) -> Iterator[List[Document]]:
+    """Stream the documents of the database in lists of up to `chunk_size`"""
+    documents = iter_documents(db)
+    while True:
+        chunk = list(islice(documents, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def top_k(
+    queries: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    query_chunk_size: int = QUERY_CHUNK_SIZE,
+    vector_chunk_size: int = VECTOR_CHUNK_SIZE,
+    scales: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the k rows of `vectors` with the largest dot product with each query.
+
+    Similarities are computed one block of queries and vectors at a time, keeping
+    only the running top k of each query, so memory does not grow with the number of
+    vectors. For unit vectors the dot product is the cosine similarity. Vectors stored
+    as float16 or int8 are scored a block at a time without decoding the whole matrix.
+
+    Parameters
+    ----------
+    queries : np.ndarray
+        The query vectors, one per row.
+    vectors : np.ndarray
+        The document vectors, one per row, in any dtype of EMBEDDING_DTYPES.
+    k : int
+        The number of rows to return per query.
+    query_chunk_size : int, optional
+        The number of queries scored at a time, by default QUERY_CHUNK_SIZE.
+    vector_chunk_size : int, optional
+        The number of vectors scored at a time, by default VECTOR_CHUNK_SIZE.
+    scales : np.ndarray, optional
+        The scale of every row of int8 `vectors`, see `quantize`.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The rows and scores of shape (len(queries), min(k, len(vectors))), most
+        similar first.
+    """
+    k = min(k, len(vectors))
+    top_rows = np.empty((len(queries), k), dtype=np.int64)
+    top_scores = np.empty((len(queries), k))
+
+    for query_start in range(0, len(queries), query_chunk_size):
+        query_end = query_start + query_chunk_size
+        block = queries[query_start:query_end].astype(np.float32)
+        rows = np.empty((len(block), 0), dtype=np.int64)
+        scores = np.empty((len(block), 0))
+
+        for start in range(0, len(vectors), vector_chunk_size):
+            end = min(start + vector_chunk_size, len(vectors))
+            chunk_scores = block @ vectors[start:end].astype(np.float32).T
+            if scales is not None:
+                chunk_scores *= scales[start:end]
+            if chunk_scores.shape[1] > k:
+                # Reduce the chunk to its own top k before merging, so only small
+                # arrays are concatenated
+                keep = np.argpartition(-chunk_scores, k - 1, axis=1)[:, :k]
+                chunk_scores = np.take_along_axis(chunk_scores, keep, axis=1)
+                chunk_rows = keep + start
+            else:
+                chunk_rows = np.broadcast_to(
+                    np.arange(start, end), (len(block), end - start)
+                )
+            scores = np.hstack([scores, chunk_scores])
+            rows = np.hstack([rows, chunk_rows])
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+
+        order = np.argsort(-scores, axis=1)
+        top_rows[query_start:query_end] = np.take_along_axis(rows, order, axis=1)
+        top_scores[query_start:query_end] = np.take_along_axis(scores, order, axis=1)
+
+    return top_rows, top_scores
+
+
+def out_of_vocabulary_rate(vectorizer: TfidfVectorizer, abstracts: List[str]) -> float:
+    """Return the fraction of analyzed terms which are not in the vectorizer vocabulary"""
+    analyzer = vectorizer.build_analyzer()
+    total = 0
+    missing = 0
+    for abstract in abstracts:
+        terms = analyzer(abstract)
+        total += len(terms)
+        missing += sum(1 for t in terms if t not in vectorizer.vocabulary_)
+    return missing / total if total else 0.0
+
+
+def streaming_vocabulary(
+    chunks: Iterable[List[str]],
+    min_df: Union[float, int],
+    max_df: Union[float, int],
+    max_features: int,
+    **analyzer_params,
+) -> Tuple[List[str], np.ndarray]:
+    """
+    Select a TF-IDF vocabulary from chunks of abstracts without holding them all.
+
+    Document frequencies are counted document by document. Whenever more than
+    MAX_COUNTED_TERMS distinct terms are held, the rarest are dropped, which only
+    loses terms too rare to be among the `max_features` most frequent.
+
+    Parameters
+    ----------
+    chunks : Iterable[List[str]]
+        The abstracts, in chunks.
+    min_df : Union[float, int]
+        Minimum document frequency, as a count or a fraction of documents.
+    max_df : Union[float, int]
+        Maximum document frequency, as a count or a fraction of documents.
+    max_features : int
+        The number of most frequent terms kept.
+    **analyzer_params
+        Passed to CountVectorizer, e.g. stop_words or ngram_range.
+
+    Returns
+    -------
+    Tuple[List[str], np.ndarray]
+        The sorted vocabulary and the smoothed inverse document frequency of each
+        term, as TfidfVectorizer computes them.
+    """
+    analyzer = CountVectorizer(**analyzer_params).build_analyzer()
+    counts: Dict[str, int] = {}
+    num_documents = 0
+    prune_below = 1
+    for chunk in chunks:
+        # Counted document by document, as a vectorizer fitted on the chunk would
+        # hold a vocabulary and matrix many times the size of the counts
+        for abstract in chunk:
+            for term in set(analyzer(abstract)):
+                counts[term] = counts.get(term, 0) + 1
+            num_documents += 1
+
+            while len(counts) > MAX_COUNTED_TERMS:
+                prune_below += 1
+                counts = {t: c for t, c in counts.items() if c >= prune_below}
+
+    low = min_df if isinstance(min_df, int) else min_df * num_documents
+    high = max_df if isinstance(max_df, int) else max_df * num_documents
+    kept = [(c, t) for t, c in counts.items() if low <= c <= high]
+    kept = sorted(kept, reverse=True)[:max_features]
+
+    vocabulary = sorted(t for _, t in kept)
+    df = np.array([counts[t] for t in vocabulary], dtype=float)
+    idf = np.log((1 + num_documents) / (1 + df)) + 1
+    return vocabulary, idf
+
+
+class StreamingSVD(TransformerMixin, BaseEstimator):
+    def __init__(self, n_components: int = 64):
+        """
+        Initialize a truncated SVD which is fitted from chunks of rows.
+
+        The Gram matrix X^T X is summed over the chunks, so memory depends on the
+        number of features rather than documents. Its top eigenvectors are the right
+        singular vectors TruncatedSVD finds, and transform projects onto them alike.
+
+        Parameters
+        ----------
+        n_components : int, optional
+            The number of singular vectors kept, by default 64.
+        """
+        self.n_components = n_components
+
+    def fit(self, X, y=None):
+        return self.fit_chunks([X])
+
+    def fit_chunks(self, chunks: Iterable) -> "StreamingSVD":
+        """
+        Fit the singular vectors of the rows of all chunks stacked together.
+
+        Parameters
+        ----------
+        chunks : Iterable
+            Sparse or dense matrices sharing the same columns.
+
+        Returns
+        -------
+        StreamingSVD
+            The fitted estimator.
+        """
+        gram = None
+        for X in chunks:
+            if gram is None:
+                gram = np.zeros((X.shape[1], X.shape[1]))
+            if not issparse(X):
+                gram += X.T @ X
+                continue
+
+            # The products of a few rows stay sparse, and are added into the dense
+            # Gram matrix without materializing a dense copy of each
+            for start in range(0, X.shape[0], GRAM_BATCH_SIZE):
+                end = start + GRAM_BATCH_SIZE
+                rows = X[start:end]
+                product = (rows.T @ rows).tocoo()
+                gram[product.row, product.col] += product.data
+
+        # Only the top eigenpairs are computed, in place, which needs a fraction of
+        # the workspace of a full decomposition
+        n_features = len(gram)
+        eigenvalues, eigenvectors = eigh(
+            gram,
+            subset_by_index=[max(n_features - self.n_components, 0), n_features - 1],
+            driver="evr",
+            overwrite_a=True,
+            check_finite=False,
+        )
+        top = np.argsort(eigenvalues)[::-1]
+        self.components_ = eigenvectors[:, top].T
+        self.singular_values_ = np.sqrt(np.maximum(eigenvalues[top], 0))
+        return self
+
+    def transform(self, X):
+        return np.asarray(X @ self.components_.T)
+
+
+def quantize(
+    vectors: np.ndarray, dtype: str
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encode document vectors in a compact dtype.
+
+    Parameters
+    ----------
+    vectors : np.ndarray
+        The document vectors, one per row.
+    dtype : str
+        One of EMBEDDING_DTYPES. int8 rows are scaled so their largest component is
+        127, and the scale of every row is returned to decode them.
+
+    Returns
+    -------
+    Tuple[np.ndarray, Optional[np.ndarray]]
+        The encoded vectors and, for int8, the float32 scale of every row.
+    """
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(
+            f"Unknown embedding dtype {dtype}, use one of {EMBEDDING_DTYPES}"
+        )
+    if dtype != "int8":
+        return np.asarray(vectors, dtype=dtype), None
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1, initial=0) / 127
+    scales[scales == 0] = 1
+    encoded = np.round(vectors / scales[:, np.newaxis]).astype(np.int8)
+    return encoded, scales.astype(np.float32)
+
+
+class EmbeddingStore:
+    def __init__(
+        self,
+        model_version: Optional[str],
+        entry_ids: Union[List[str], np.ndarray],
+        vectors: np.ndarray,
+        dtype: str = "float32",
+        scales: Optional[np.ndarray] = None,
+    ):
+        """
+        Initialize a store of precomputed document vectors.
+
+        Parameters
+        ----------
+        model_version : str, optional
+            Version of the LSA model which produced the vectors.
+        entry_ids : Union[List[str], np.ndarray]
+            The entry ids of the embedded papers, one per row of `vectors`, or a
+            bytes array of the UTF-8 encoded ids as stored on disk.
+        vectors : np.ndarray
+            The normalized document vectors, encoded as `dtype` unless already.
+        dtype : str, optional
+            One of EMBEDDING_DTYPES, by default "float32".
+        scales : np.ndarray, optional
+            The row scales of vectors already encoded as int8.
+        """
+        self.model_version = model_version
+        self.dtype = dtype
+        self._entry_ids = entry_ids
+        self._row_index: Optional[Dict[str, int]] = None
+        # Tag of the files backing vectors opened by `allocate`, which `save` keeps
+        self._tag: Optional[str] = None
+
+        if vectors.dtype != np.dtype(dtype) or (dtype == "int8" and scales is None):
+            vectors, scales = quantize(vectors, dtype)
+        self.vectors = vectors
+        self.scales = scales
+
+    def __len__(self) -> int:
+        return len(self._entry_ids)
+
+    @property
+    def entry_ids(self) -> List[str]:
+        """The entry ids of every row, decoded on first use"""
+        if not isinstance(self._entry_ids, list):
+            self._entry_ids = [e.decode() for e in self._entry_ids.tolist()]
+        return self._entry_ids
+
+    @property
+    def row_index(self) -> Dict[str, int]:
+        """The row of every entry id, built on first use"""
+        if self._row_index is None:
+            self._row_index = {e: i for i, e in enumerate(self.entry_ids)}
+        return self._row_index
+
+    def entry_ids_at(self, rows: Iterable[int]) -> List[str]:
+        """Return the entry ids of some rows without decoding all of them"""
+        if isinstance(self._entry_ids, list):
+            return [self._entry_ids[i] for i in rows]
+        return [self._entry_ids[i].decode() for i in rows]
+
+    def select(
+        self, rows: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Return the encoded vectors and scales of some rows, or all if None"""
+        if rows is None:
+            return self.vectors, self.scales
+        return self.vectors[rows], None if self.scales is None else self.scales[rows]
+
+    def decode(self, rows: Union[int, List[int], np.ndarray]) -> np.ndarray:
+        """Return some rows as float32 vectors"""
+        vectors = self.vectors[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows][..., np.newaxis]
+        return vectors
+
+    @staticmethod
+    def _files(path: Path, tag: str) -> Dict[str, Path]:
+        return {
+            name: path.with_name(f"{path.stem}.{tag}.{name}.npy")
+            for name in ["vectors", "entry_ids", "scales"]
+        }
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional["EmbeddingStore"]:
+        """
+        Load an embedding store from disk.
+
+        The arrays are memory-mapped rather than read, so loading takes the same time
+        whatever the size of the store and processes share the pages.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the embedding store file.
+
+        Returns
+        -------
+        Optional[EmbeddingStore]
+            The loaded store, or None if no store exists at the path.
+        """
+        path = Path(path)
+        try:
+            meta = json.loads(path.read_text())
+            files = cls._files(path, meta["tag"])
+            return cls(
+                meta["model_version"],
+                np.load(files["entry_ids"], mmap_mode="r"),
+                np.load(files["vectors"], mmap_mode="r"),
+                meta["dtype"],
+                np.load(files["scales"]) if meta["dtype"] == "int8" else None,
+            )
+        except FileNotFoundError:
+            # Either no store was saved, or a concurrent save replaced it since the
+            # metadata was read
+            return None
+
+    @classmethod
+    def allocate(
+        cls,
+        path: Union[str, Path],
+        model_version: Optional[str],
+        num_rows: int,
+        dim: int,
+        dtype: str = "float32",
+    ) -> "EmbeddingStore":
+        """
+        Create an empty store whose arrays are memory-mapped files next to `path`.
+
+        Rows are filled in order with `append`, without holding the vectors in
+        memory, and `save` then publishes the files as they are.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the embedding store file.
+        model_version : str, optional
+            Version of the LSA model which produces the vectors.
+        num_rows : int
+            The number of rows to allocate.
+        dim : int
+            The dimension of the vectors.
+        dtype : str, optional
+            One of EMBEDDING_DTYPES, by default "float32".
+
+        Returns
+        -------
+        EmbeddingStore
+            The store, holding no entry ids until rows are appended.
+        """
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(
+                f"Unknown embedding dtype {dtype}, use one of {EMBEDDING_DTYPES}"
+            )
+
+        tag = uuid.uuid4().hex[:12]
+        files = cls._files(Path(path), tag)
+        open_memmap = np.lib.format.open_memmap
+        vectors = open_memmap(
+            files["vectors"], mode="w+", dtype=dtype, shape=(num_rows, dim)
+        )
+        scales = None
+        if dtype == "int8":
+            scales = open_memmap(
+                files["scales"], mode="w+", dtype=np.float32, shape=(num_rows,)
+            )
+
+        store = cls(model_version, [], vectors, dtype, scales)
+        store._tag = tag
+        return store
+
+    def append(self, entry_ids: List[str], vectors: np.ndarray):
+        """
+        Encode vectors into the next allocated rows.
+
+        Parameters
+        ----------
+        entry_ids : List[str]
+            The entry ids of the papers, one per row of `vectors`.
+        vectors : np.ndarray
+            The normalized document vectors.
+        """
+        start = len(self)
+        end = start + len(entry_ids)
+        encoded, scales = quantize(vectors, self.dtype)
+        self.vectors[start:end] = encoded
+        if scales is not None:
+            self.scales[start:end] = scales
+        self.entry_ids.extend(entry_ids)
+        self._row_index = None
+
+    def upsert(self, entry_ids: List[str], vectors: np.ndarray):
+        """
+        Insert or replace the vectors for the given entry ids.
+
+        Parameters
+        ----------
+        entry_ids : List[str]
+            The entry ids of the papers, one per row of `vectors`.
+        vectors : np.ndarray
+            The normalized document vectors.
+        """
+        vectors, scales = quantize(vectors, self.dtype)
+        if self._tag is not None or not self.vectors.flags.writeable:
+            # Copy memory-mapped arrays before modifying them, as readers may map the
+            # same files
+            self.vectors = np.array(self.vectors)
+            self.scales = None if self.scales is None else np.array(self.scales)
+            self._tag = None
+
+        new_rows = []
+        for i, entry_id in enumerate(entry_ids):
+            row = self.row_index.get(entry_id)
+            if row is None:
+                self.row_index[entry_id] = len(self.entry_ids)
+                self.entry_ids.append(entry_id)
+                new_rows.append(i)
+            else:
+                self.vectors[row] = vectors[i]
+                if scales is not None:
+                    self.scales[row] = scales[i]
+
+        if new_rows:
+            self.vectors = np.vstack([self.vectors, vectors[new_rows]])
+            if scales is not None:
+                self.scales = np.concatenate([self.scales, scales[new_rows]])
+
+    def save(self, path: Union[str, Path]):
+        """
+        Save the embedding store to disk.
+
+        The arrays are written as .npy files named after a new tag, and then the
+        small metadata file at `path` is atomically replaced to point at them, so
+        readers see either the old or the new store. Files of older saves are then
+        removed.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to the embedding store file.
+        """
+        path = Path(path)
+        ids = self._entry_ids
+        if isinstance(ids, list):
+            ids = np.array([e.encode() for e in ids], dtype=bytes)
+
+        if self._tag is not None and len(self.vectors) == len(ids):
+            # The allocated arrays are complete, so only the entry ids are written
+            tag = self._tag
+            files = self._files(path, tag)
+            self.vectors.flush()
+            if self.scales is not None:
+                self.scales.flush()
+        else:
+            tag = uuid.uuid4().hex[:12]
+            files = self._files(path, tag)
+            np.save(files["vectors"], self.vectors[: len(ids)])
+            if self.scales is not None:
+                np.save(files["scales"], self.scales[: len(ids)])
+        np.save(files["entry_ids"], ids)
+
+        meta = {"model_version": self.model_version, "dtype": self.dtype, "tag": tag}
+        staging = path.with_name(f"{path.name}.{tag}")
+        staging.write_text(json.dumps(meta))
+        os.replace(staging, path)
+
+        for stale in path.parent.glob(f"{path.stem}.*.npy"):
+            if stale not in files.values():
+                try:
+                    stale.unlink(missing_ok=True)
+                except OSError:
+                    # Windows refuses to delete files another process has mapped
+                    pass
+
+    @classmethod
+    def remove(cls, path: Union[str, Path]):
+        """Delete a saved store and its arrays"""
+        path = Path(path)
+        for data in path.parent.glob(f"{path.stem}.*.npy"):
+            data.unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
 
 
 class LsaDocumentSearch:
@@ -31,16 +639,48 @@ class LsaDocumentSearch:
             Path to the pre-trained model file.
         """
         self.model_path = model_path
+        self.embeddings_path = embeddings_path(model_path)
+        self.ann_path = ann_index_path(model_path)
         self.is_trained = Path(model_path).exists()
+        self.model_version: Optional[str] = None
+        self.oov_rate: Optional[float] = None
+        self.fit_params: Dict = {}
+        self.out_of_core = False
+        self.fingerprint: Optional[CorpusFingerprint] = None
+        self._embeddings: Optional[EmbeddingStore] = None
+        self._ann: Optional[IvfIndex] = None
+        self._model_mtime: Optional[int] = None
+        # Entry ids embedded by update_embeddings but not yet written
+        self._unsaved: Dict[str, None] = {}
+        self._unsaved_version: Optional[str] = None
+        self._refit_needed = False
+        self.cache = SearchCache(search_cache_path(model_path))
+        self.model = None
 
         if self.is_trained:
-            self.model = load(self.model_path)
+            self._load_model()
+
+    def _load_model(self):
+        """Load the model bundle from disk"""
+        self._model_mtime = os.stat(self.model_path).st_mtime_ns
+        bundle = load(self.model_path)
+        if isinstance(bundle, dict):
+            self.model = bundle["pipeline"]
+            self.model_version = bundle["version"]
+            self.oov_rate = bundle.get("oov_rate")
+            self.fit_params = bundle.get("fit_params", {})
+            self.out_of_core = bundle.get("out_of_core", False)
+            fingerprint = bundle.get("fingerprint")
+            self.fingerprint = (
+                None if fingerprint is None else CorpusFingerprint(**fingerprint)
+            )
         else:
-            self.model = None
+            # Models saved before versioning was introduced are bare pipelines
+            self.model = bundle
 
     def fit(
         self,
-        papers: List[ArxivPaper],
+        papers: Iterable[Union[Paper, Document]],
         force_overwrite: bool = False,
         min_df: int = 5,
         max_df: Union[float, int] = 0.7,
@@ -48,14 +688,19 @@ class LsaDocumentSearch:
         max_features: Optional[int] = 3000,
         sublinear_tf: bool = True,
         embedding_dim: int = 64,
+        embedding_dtype: str = "float32",
+        fingerprint: Optional[CorpusFingerprint] = None,
     ):
         """
-        Train the LSA model on a list of ArxivPaper objects.
+        Train the LSA model on a list of papers.
+
+        The papers are consumed in a single pass, so they may be streamed from the
+        database with `iter_documents`.
 
         Parameters
         ----------
-        papers : List[ArxivPaper]
-            A list of ArxivPaper objects for training the model.
+        papers : Iterable[Union[Paper, Document]]
+            The papers for training the model.
         force_overwrite : bool, optional
             If True, overwrites the existing model if one exists, by default False.
         min_df : int, optional
@@ -70,12 +715,26 @@ class LsaDocumentSearch:
             If True, applies sublinear term frequency scaling, by default True.
         embedding_dim : int, optional
             The number of components for TruncatedSVD, by default 64.
+        embedding_dtype : str, optional
+            The encoding of the stored document vectors, one of EMBEDDING_DTYPES, by
+            default "float32".
+        fingerprint : CorpusFingerprint, optional
+            Summary of the database the papers were read from, saved with the model
+            so searches can detect when the corpus has drifted.
         """
         if self.is_trained and not force_overwrite:
             logging.info(f"Model already trained at {self.model_path}")
             return
 
-        abstracts = [p.summary for p in papers]
+        entry_ids = []
+        sample = []
+
+        def abstracts():
+            for paper in papers:
+                entry_ids.append(paper.entry_id)
+                if len(sample) < OOV_SAMPLE_SIZE:
+                    sample.append(paper.summary)
+                yield paper.summary
 
         vectorizer = TfidfVectorizer(
             min_df=min_df,
@@ -92,16 +751,683 @@ class LsaDocumentSearch:
 
         pipeline = Pipeline([("tfidf", vectorizer), ("svd", svd), ("norm", normalizer)])
 
-        pipeline.fit(abstracts)
+        # Fitting already produces the document vectors, so keep them for search
+        vectors = pipeline.fit_transform(abstracts())
+
+        self.out_of_core = False
+        self.fingerprint = fingerprint
+        self._save_model(
+            pipeline,
+            sample,
+            EmbeddingStore(None, entry_ids, vectors, embedding_dtype),
+            min_df=min_df,
+            max_df=max_df,
+            ngram_range=ngram_range,
+            max_features=max_features,
+            sublinear_tf=sublinear_tf,
+            embedding_dim=embedding_dim,
+            embedding_dtype=embedding_dtype,
+        )
+
+    def fit_out_of_core(
+        self,
+        db: ArxivDatabase,
+        force_overwrite: bool = False,
+        min_df: Union[float, int] = 5,
+        max_df: Union[float, int] = 0.7,
+        ngram_range: Tuple = (1, 2),
+        max_features: int = 3000,
+        sublinear_tf: bool = True,
+        embedding_dim: int = 64,
+        embedding_dtype: str = "float32",
+        chunk_size: int = STREAM_CHUNK_SIZE,
+    ):
+        """
+        Train the LSA model on every paper in the database, in bounded memory.
+
+        Abstracts are streamed from the database in chunks over three passes: the
+        first selects the vocabulary, the second accumulates the SVD of the TF-IDF
+        matrix and the third embeds the papers. Neither the abstracts nor the TF-IDF
+        matrix are ever held whole. The resulting pipeline is used like one trained by
+        `fit`.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            The database holding the papers for training the model.
+        force_overwrite : bool, optional
+            If True, overwrites the existing model if one exists, by default False.
+        min_df : Union[float, int], optional
+            Minimum document frequency of the vocabulary, by default 5.
+        max_df : Union[float, int], optional
+            Maximum document frequency of the vocabulary, by default 0.7.
+        ngram_range : Tuple, optional
+            N-gram range of the vocabulary, by default (1, 2).
+        max_features : int, optional
+            Size of the vocabulary, at most MAX_STREAMING_FEATURES, by default 3000.
+        sublinear_tf : bool, optional
+            If True, applies sublinear term frequency scaling, by default True.
+        embedding_dim : int, optional
+            The number of singular vectors kept, by default 64.
+        embedding_dtype : str, optional
+            The encoding of the stored document vectors, one of EMBEDDING_DTYPES, by
+            default "float32".
+        chunk_size : int, optional
+            The number of abstracts processed at a time, by default
+            STREAM_CHUNK_SIZE.
+        """
+        if self.is_trained and not force_overwrite:
+            logging.info(f"Model already trained at {self.model_path}")
+            return
+        if max_features is None or max_features > MAX_STREAMING_FEATURES:
+            raise ValueError(
+                f"max_features must be at most {MAX_STREAMING_FEATURES} out of core"
+            )
+
+        fingerprint = db.get_corpus_fingerprint()
+
+        def abstracts() -> Iterator[List[str]]:
+            for chunk in iter_document_chunks(db, chunk_size):
+                yield [d.summary for d in chunk]
+
+        vocabulary, idf = streaming_vocabulary(
+            abstracts(),
+            min_df=min_df,
+            max_df=max_df,
+            max_features=max_features,
+            stop_words="english",
+            ngram_range=ngram_range,
+        )
+        vectorizer = TfidfVectorizer(
+            vocabulary=vocabulary,
+            stop_words="english",
+            ngram_range=ngram_range,
+            sublinear_tf=sublinear_tf,
+        )
+        vectorizer.idf_ = idf
+        logging.info(f"Selected a vocabulary of {len(vocabulary)} terms")
+
+        svd = StreamingSVD(n_components=embedding_dim)
+        svd.fit_chunks(vectorizer.transform(chunk) for chunk in abstracts())
+
+        pipeline = Pipeline(
+            [("tfidf", vectorizer), ("svd", svd), ("norm", Normalizer())]
+        )
+
+        # The vectors are written straight to the files of the new store. Papers
+        # saved since the fingerprint was taken are left out, and are embedded like
+        # any paper missing from the store
+        store = EmbeddingStore.allocate(
+            self.embeddings_path,
+            None,
+            fingerprint.papers,
+            svd.components_.shape[0],
+            embedding_dtype,
+        )
+        for chunk in iter_document_chunks(db, chunk_size):
+            chunk = chunk[: fingerprint.papers - len(store)]
+            if not chunk:
+                break
+            store.append(
+                [d.entry_id for d in chunk],
+                pipeline.transform([d.summary for d in chunk]),
+            )
+        sample = [d.summary for d in islice(iter_documents(db), OOV_SAMPLE_SIZE)]
+
+        self.out_of_core = True
+        self.fingerprint = fingerprint
+        self._save_model(
+            pipeline,
+            sample,
+            store,
+            min_df=min_df,
+            max_df=max_df,
+            ngram_range=ngram_range,
+            max_features=max_features,
+            sublinear_tf=sublinear_tf,
+            embedding_dim=embedding_dim,
+            embedding_dtype=embedding_dtype,
+            chunk_size=chunk_size,
+        )
 
+    def _save_model(
+        self,
+        pipeline: Pipeline,
+        sample: List[str],
+        store: EmbeddingStore,
+        **fit_params,
+    ):
+        """Persist a newly trained pipeline with the vectors of the training papers"""
         self.model = pipeline
+        self.model_version = uuid.uuid4().hex
+        store.model_version = self.model_version
+        self.oov_rate = out_of_vocabulary_rate(pipeline.named_steps["tfidf"], sample)
+        self.fit_params = fit_params
         self.is_trained = True
-        dump(pipeline, self.model_path)
+        # Written next to the model and renamed over it, so concurrent readers load
+        # either the old or the new model
+        model_path = Path(self.model_path)
+        staging = model_path.with_name(f"{model_path.name}.{self.model_version[:12]}")
+        try:
+            dump(
+                {
+                    "pipeline": pipeline,
+                    "version": self.model_version,
+                    "oov_rate": self.oov_rate,
+                    "fit_params": self.fit_params,
+                    "out_of_core": self.out_of_core,
+                    "fingerprint": None
+                    if self.fingerprint is None
+                    else self.fingerprint.dict(),
+                },
+                staging,
+            )
+            os.replace(staging, model_path)
+        finally:
+            staging.unlink(missing_ok=True)
+        self._model_mtime = os.stat(self.model_path).st_mtime_ns
         logging.info(f"Trained and saved model to {self.model_path}")
 
+        self._embeddings = store
+        store.save(self.embeddings_path)
+        logging.info(f"Saved {len(store)} embeddings to {self.embeddings_path}")
+        self._index_embeddings(self._embeddings)
+
+    @property
+    def embedding_dtype(self) -> str:
+        """The encoding of the stored document vectors the model was trained with"""
+        return self.fit_params.get("embedding_dtype", "float32")
+
+    def refit(self, db: ArxivDatabase):
+        """
+        Retrain the model on the whole database the way it was last trained.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            The database holding the papers for training the model.
+        """
+        if self.out_of_core:
+            self.fit_out_of_core(db, force_overwrite=True, **self.fit_params)
+        else:
+            # Taken before reading the papers, so papers saved meanwhile count as drift
+            fingerprint = db.get_corpus_fingerprint()
+            self.fit(
+                iter_documents(db),
+                force_overwrite=True,
+                fingerprint=fingerprint,
+                **self.fit_params,
+            )
+
+    def has_drifted(self, db: ArxivDatabase) -> bool:
+        """
+        Check whether the database has changed enough since training to refit.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            The database searched with the model.
+
+        Returns
+        -------
+        bool
+            True if papers were saved since training and the number of papers changed
+            by more than REFIT_CORPUS_CHANGE relative to the training corpus.
+        """
+        if self.fingerprint is None:
+            return False
+
+        current = db.get_corpus_fingerprint()
+        if current.updated == self.fingerprint.updated:
+            return False
+        change = abs(current.papers - self.fingerprint.papers)
+        return change > REFIT_CORPUS_CHANGE * max(self.fingerprint.papers, 1)
+
+    def _reload_if_swapped(self) -> bool:
+        """Adopt a model which a background refit has swapped in since loading"""
+        if not self.is_trained or self._model_mtime is None:
+            return False
+        try:
+            mtime = os.stat(self.model_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._model_mtime:
+            return False
+
+        logging.info(f"Reloading the model swapped in at {self.model_path}")
+        self._load_model()
+        self._embeddings = None
+        self._ann = None
+        return True
+
+    def _refit_if_drifted(self, db: ArxivDatabase):
+        """Schedule a background refit if the corpus has drifted since training"""
+        if db.database_path == ":memory:" or not self.has_drifted(db):
+            return
+        if schedule_refit(db.database_path, self.model_path):
+            logging.info("Corpus drifted since training, refitting in the background")
+
+    def _load_embeddings(self) -> Optional[EmbeddingStore]:
+        """Return the persisted embedding store if it matches the current model"""
+        if self._embeddings is None:
+            self._embeddings = EmbeddingStore.load(self.embeddings_path)
+
+        store = self._embeddings
+        if store is None or store.model_version != self.model_version:
+            return None
+        return store
+
+    def _load_ann(self) -> Optional[IvfIndex]:
+        """Return the persisted ANN index if it matches the current model"""
+        if self._ann is None:
+            self._ann = IvfIndex.load(self.ann_path)
+
+        index = self._ann
+        if index is None or index.model_version != self.model_version:
+            return None
+        return index
+
+    def _index_embeddings(
+        self, store: EmbeddingStore, rows: Optional[List[int]] = None
+    ):
+        """
+        Build the ANN index over the store, or add the given rows to the existing one.
+
+        Nothing is indexed until the store holds ANN_MIN_DOCUMENTS vectors.
+        """
+        if len(store) < ANN_MIN_DOCUMENTS:
+            return
+
+        index = None if rows is None else self._load_ann()
+        if index is None:
+            index = IvfIndex.build(self.model_version, store.vectors)
+        else:
+            index.add(np.asarray(rows), store.vectors[rows])
+        self._ann = index
+        if not is_refit_running(self.model_path):
+            index.save(self.ann_path)
+
+    def get_embeddings(self, db: ArxivDatabase) -> EmbeddingStore:
+        """
+        Return the document vectors for the current model, computing them if needed.
+
+        The vectors are computed once per model version and persisted next to the
+        model, so subsequent searches only need to embed the query.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            An instance of the ArxivDatabase class used to build a missing store.
+
+        Returns
+        -------
+        EmbeddingStore
+            The embedding store matching the current model version.
+        """
+        store = self._load_embeddings()
+        if store is None:
+            logging.info("Embedding store is missing or stale, embedding all papers")
+            entry_ids = []
+            chunks = [np.empty((0, self.model["svd"].n_components))]
+            for batch in iter_document_chunks(db):
+                entry_ids.extend(d.entry_id for d in batch)
+                chunks.append(self.model.transform([d.summary for d in batch]))
+            store = EmbeddingStore(
+                self.model_version, entry_ids, np.vstack(chunks), self.embedding_dtype
+            )
+            self._embeddings = store
+            # Keep a store for the outgoing model off disk while a refit replaces it
+            if not is_refit_running(self.model_path):
+                store.save(self.embeddings_path)
+            self._index_embeddings(store)
+
+        return store
+
+    def update_embeddings(
+        self,
+        db: ArxivDatabase,
+        papers: List[Paper],
+        refit_threshold: float = 0.1,
+        save: bool = True,
+    ):
+        """
+        Embed newly saved papers and add them to the embedding store.
+
+        Only the given papers are embedded. The model is refit on the whole database
+        only when the out-of-vocabulary rate of the new abstracts exceeds the rate seen
+        at training time by more than `refit_threshold`. While a background refit is
+        running, nothing is written and the refit embeds the papers with its model.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            An instance of the ArxivDatabase class, used when a refit is needed.
+        papers : List[Paper]
+            The papers which were inserted or updated.
+        refit_threshold : float, optional
+            The allowed increase in out-of-vocabulary rate before refitting, by
+            default 0.1.
+        save : bool, optional
+            If False, the papers are only embedded in memory, and the store is written
+            or the model refit by the next call to `flush_embeddings`, by default True.
+        """
+        if not self.is_trained or not papers or self._refit_needed:
+            return
+        self._reload_if_swapped()
+
+        if self.oov_rate is not None and not is_refit_running(self.model_path):
+            drift = (
+                out_of_vocabulary_rate(
+                    self.model.named_steps["tfidf"], [p.summary for p in papers]
+                )
+                - self.oov_rate
+            )
+            if drift > refit_threshold:
+                logging.info(
+                    f"Vocabulary drift of {drift:.3f} exceeds threshold, refitting"
+                )
+                self._refit_needed = True
+                if save:
+                    self.flush_embeddings(db)
+                return
+
+        store = self._load_embeddings()
+        if store is None:
+            # The full store is rebuilt on the next search
+            return
+
+        if not self._unsaved:
+            self._unsaved_version = store.model_version
+        self._embed_papers(store, papers)
+        self._unsaved.update(dict.fromkeys(p.entry_id for p in papers))
+        if save:
+            self.flush_embeddings(db)
+
+    def flush_embeddings(self, db: ArxivDatabase):
+        """
+        Write the papers embedded by `update_embeddings` since the last write.
+
+        The store, ANN index and neighbour lists are written once for all of them,
+        along with any paper of the database the store lacks, e.g. saved by a fetch
+        which failed. If the vocabulary of the papers drifted, the model is refit
+        instead.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            An instance of the ArxivDatabase class.
+        """
+        entry_ids = list(self._unsaved)
+        self._unsaved.clear()
+        if self._refit_needed:
+            self._refit_needed = False
+            self.refit(db)
+            return
+        if not entry_ids:
+            return
+
+        if is_refit_running(self.model_path):
+            # The refit embeds the papers saved while it trains, so the store of the
+            # outgoing model is only updated in memory
+            logging.info(f"Leaving {len(entry_ids)} new papers to the running refit")
+            return
+        self._reload_if_swapped()
+        store = self._load_embeddings()
+        if store is None:
+            return
+        if store.model_version != self._unsaved_version:
+            # A refit swapped in its model meanwhile, so embed the papers with it
+            self._embed_entry_ids(db, store, entry_ids)
+
+        if len(store) < db.get_corpus_fingerprint().papers:
+            missing = self._missing_entry_ids(db, store)
+            self._embed_entry_ids(db, store, missing)
+            entry_ids.extend(missing)
+
+        rows = [store.row_index[e] for e in entry_ids if e in store.row_index]
+        self._save_embeddings(db, store, rows)
+        logging.info(f"Embedded {len(rows)} papers into {self.embeddings_path}")
+
+    def _embed_papers(self, store: EmbeddingStore, papers: List[Paper]):
+        """Add the vectors of some papers to the store, EMBED_BATCH_SIZE at a time"""
+        for batch in chunked(papers, EMBED_BATCH_SIZE):
+            store.upsert(
+                [p.entry_id for p in batch],
+                self.model.transform([p.summary for p in batch]),
+            )
+
+    def _embed_entry_ids(
+        self, db: ArxivDatabase, store: EmbeddingStore, entry_ids: List[str]
+    ):
+        """Read papers of the database by entry id and add their vectors to the store"""
+        for batch in chunked(entry_ids, EMBED_BATCH_SIZE):
+            self._embed_papers(store, db.get_papers_by_ids(list(batch)))
+
+    def _missing_entry_ids(self, db: ArxivDatabase, store: EmbeddingStore) -> List[str]:
+        """Return the entry ids of the papers of the database the store lacks"""
+        return [
+            entry_id
+            for (entry_id,) in db.iter_papers(columns=["entry_id"])
+            if entry_id not in store.row_index
+        ]
+
+    def _save_embeddings(
+        self,
+        db: ArxivDatabase,
+        store: EmbeddingStore,
+        rows: List[int],
+        neighbors: bool = True,
+    ):
+        """Persist the store and add the given rows to the ANN index and neighbours"""
+        store.save(self.embeddings_path)
+        self._index_embeddings(store, rows)
+        if neighbors and not self._sync_neighbors(db, store):
+            self._update_neighbors(db, store, np.array(rows))
+
+    def embed_missing(self, db: ArxivDatabase, neighbors: bool = True) -> int:
+        """
+        Embed the papers saved since the model was trained which its store lacks.
+
+        Papers missing from the store are embedded along with the papers updated since
+        the training snapshot, which may have been saved while the model was trained.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            An instance of the ArxivDatabase class.
+        neighbors : bool, optional
+            Whether to update the neighbour lists of the database, by default True.
+
+        Returns
+        -------
+        int
+            The number of papers embedded.
+        """
+        if not self.is_trained:
+            return 0
+        store = self.get_embeddings(db)
+
+        entry_ids = self._missing_entry_ids(db, store)
+        if self.fingerprint is not None and self.fingerprint.updated is not None:
+            entry_ids.extend(db.get_entry_ids_updated_since(self.fingerprint.updated))
+        entry_ids = list(dict.fromkeys(entry_ids))
+        if not entry_ids:
+            return 0
+
+        logging.info(f"Embedding {len(entry_ids)} papers saved since training")
+        self._embed_entry_ids(db, store, entry_ids)
+        rows = [store.row_index[e] for e in entry_ids if e in store.row_index]
+        self._save_embeddings(db, store, rows, neighbors)
+        return len(rows)
+
+    def _neighbors_of(
+        self, store: EmbeddingStore, rows: np.ndarray
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """Compute the NEIGHBOR_COUNT most similar papers of some rows of the store"""
+        top_rows, top_scores = top_k(
+            store.decode(rows), store.vectors, NEIGHBOR_COUNT + 1, scales=store.scales
+        )
+        neighbors = {}
+        for row, row_neighbors, scores in zip(rows, top_rows, top_scores):
+            # The paper itself is usually, but not always, the best match
+            keep = row_neighbors != row
+            ids = store.entry_ids_at(row_neighbors[keep][:NEIGHBOR_COUNT])
+            neighbors[store.entry_ids_at([row])[0]] = list(
+                zip(ids, scores[keep][:NEIGHBOR_COUNT].tolist())
+            )
+        return neighbors
+
+    def _update_neighbors(
+        self, db: ArxivDatabase, store: EmbeddingStore, rows: np.ndarray
+    ):
+        """
+        Store the neighbours of some rows and add them to the lists they now belong to.
+
+        The lists of the given rows are computed against the whole store. Every other
+        stored list is compared with the given rows and, where one of them scores
+        above its lowest neighbour, merged with them.
+        """
+        neighbors = {}
+        for start in range(0, len(rows), VECTOR_CHUNK_SIZE):
+            end = start + VECTOR_CHUNK_SIZE
+            neighbors.update(self._neighbors_of(store, rows[start:end]))
+
+        thresholds = db.get_neighbor_thresholds()
+        existing = [
+            e for e in thresholds if e not in neighbors and e in store.row_index
+        ]
+        if existing:
+            new_ids = store.entry_ids_at(rows)
+            new_vectors = store.decode(rows)
+            existing_rows = np.array([store.row_index[e] for e in existing])
+            lowest = np.array(
+                [
+                    score if count >= NEIGHBOR_COUNT else -np.inf
+                    for score, count in (thresholds[e] for e in existing)
+                ]
+            )
+
+            candidates: Dict[str, List[Tuple[str, float]]] = {}
+            for start in range(0, len(existing), VECTOR_CHUNK_SIZE):
+                end = start + VECTOR_CHUNK_SIZE
+                scores = store.decode(existing_rows[start:end]) @ new_vectors.T
+                above = scores > lowest[start:end, np.newaxis]
+                for i, j in zip(*np.nonzero(above)):
+                    candidates.setdefault(existing[start + i], []).append(
+                        (new_ids[j], float(scores[i, j]))
+                    )
+
+            current = db.get_neighbor_lists(list(candidates))
+            for entry_id, added in candidates.items():
+                merged = dict(current.get(entry_id, []))
+                merged.update(added)
+                ranked = sorted(merged.items(), key=lambda item: -item[1])
+                neighbors[entry_id] = ranked[:NEIGHBOR_COUNT]
+
+        db.save_neighbors(neighbors)
+
+    def _sync_neighbors(self, db: ArxivDatabase, store: EmbeddingStore) -> bool:
+        """
+        Discard neighbour lists computed with another model.
+
+        Returns True if the lists were reset, in which case they are all rebuilt when
+        the store holds at most NEIGHBOR_BUILD_MAX_DOCUMENTS papers.
+        """
+        if db.get_neighbor_version() == self.model_version:
+            return False
+
+        db.reset_neighbors(self.model_version)
+        if len(store) <= NEIGHBOR_BUILD_MAX_DOCUMENTS:
+            logging.info(f"Computing the neighbours of {len(store)} papers")
+            self._update_neighbors(db, store, np.arange(len(store)))
+        return True
+
+    def index_neighbors(self, db: ArxivDatabase):
+        """
+        Bring the stored neighbour lists of the database up to the current model.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            The database holding the papers and their neighbour lists.
+        """
+        if not self.is_trained:
+            return
+        self._sync_neighbors(db, self.get_embeddings(db))
+
+    def similar(self, db: ArxivDatabase, paper: Paper, limit: int = 10) -> List[Paper]:
+        """
+        Find the papers most similar to a paper of the database.
+
+        The neighbours are read from the lists stored in the database. A list which
+        is missing is computed from the stored vectors, without embedding anything,
+        and stored for the next time.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            An instance of the ArxivDatabase class.
+        paper : Paper
+            The paper to find neighbours of.
+        limit : int, optional
+            The maximum number of similar papers to return, by default 10.
+
+        Returns
+        -------
+        List[Paper]
+            A list of papers that are most similar to the paper, excluding itself.
+        """
+        if not self.is_trained:
+            self.refit(db)
+        else:
+            self._reload_if_swapped()
+            self._refit_if_drifted(db)
+
+        store = self.get_embeddings(db)
+        self._sync_neighbors(db, store)
+        if limit <= NEIGHBOR_COUNT:
+            neighbors = db.get_neighbors(paper.entry_id, limit)
+            if neighbors:
+                return neighbors
+
+        row = store.row_index.get(paper.entry_id)
+        if row is None or limit > NEIGHBOR_COUNT:
+            # Papers saved without a model are not embedded, so search their abstract
+            results = self.search(db, paper.summary, limit + 1)
+            return [p for p in results if p.entry_id != paper.entry_id][:limit]
+
+        db.save_neighbors(self._neighbors_of(store, np.array([row])))
+        return db.get_neighbors(paper.entry_id, limit)
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Return the vector of a query, embedding it only if it is not cached"""
+        vector = self.cache.get_vector(self.model_version, query)
+        if vector is None:
+            vector = self.model.transform([query])[0]
+            self.cache.put_vector(self.model_version, query, vector)
+        return vector
+
+    def _get_vectors(self, papers: List[Paper]) -> np.ndarray:
+        """Look up stored vectors for the papers, embedding only those not stored"""
+        store = self._load_embeddings()
+        if store is None:
+            return self.model.transform([p.summary for p in papers])
+
+        missing = [i for i, p in enumerate(papers) if p.entry_id not in store.row_index]
+        vectors = np.empty((len(papers), store.vectors.shape[1]), dtype=np.float32)
+        if missing:
+            vectors[missing] = self.model.transform(
+                [papers[i].summary for i in missing]
+            )
+        for i, paper in enumerate(papers):
+            row = store.row_index.get(paper.entry_id)
+            if row is not None:
+                vectors[i] = store.decode(row)
+        return vectors
+
     def find_match(
         self,
-        papers: List[ArxivPaper],
+        papers: List[Paper],
         query: str,
         limit: int = 10,
         force_refresh: bool = False,
@@ -111,8 +1437,8 @@ class LsaDocumentSearch:
 
         Parameters
         ----------
-        papers : List[ArxivPaper]
-            A list of ArxivPaper objects to search.
+        papers : List[Paper]
+            A list of papers to search.
         query : str
             The search query.
         limit : int, optional
@@ -122,32 +1448,58 @@ class LsaDocumentSearch:
 
         Returns
         -------
-        List[ArxivPaper]
-            A list of ArxivPaper objects that are most similar to the query.
+        List[Paper]
+            A list of papers that are most similar to the query.
         """
-        abstracts = [p.summary for p in papers]
-
         if force_refresh:
             self.fit(papers, force_overwrite=True)
 
-        reference = self.model.transform(abstracts)
-        lookup = self.model.transform([query])
-        sim = cosine_sim(lookup, reference)
+        # Both sides come out of the Normalizer, so dot products are cosine similarities
+        reference = self._get_vectors(papers)
+        lookup = self._embed_query(query)
 
-        vals = np.argsort(-sim)[0, :limit]
-        top_papers = [papers[i] for i in vals]
+        vals, _ = top_k(lookup[np.newaxis], reference, limit)
+        top_papers = [papers[i] for i in vals[0]]
         return top_papers
 
+    def _filter_rows(
+        self,
+        db: ArxivDatabase,
+        store: EmbeddingStore,
+        category: Optional[str],
+        author: Optional[str],
+    ) -> Optional[np.ndarray]:
+        """Return the store rows of the papers matching the filters, None if unfiltered"""
+        if category is None and author is None:
+            return None
+
+        matching = db.iter_papers(
+            columns=["entry_id"], category=category, author=author
+        )
+        return np.array(
+            [store.row_index[r[0]] for r in matching if r[0] in store.row_index],
+            dtype=int,
+        )
+
     def search(
         self,
         db: ArxivDatabase,
         query: str,
         limit: int = 10,
         force_refresh: bool = False,
+        category: Optional[str] = None,
+        author: Optional[str] = None,
+        nprobe: int = DEFAULT_NPROBE,
     ):
         """
         Search for similar papers in the database using the given query.
 
+        Unfiltered searches over large corpora use the ANN index, which only scores
+        the papers in the inverted lists nearest to the query. If the corpus has
+        drifted since training, a refit is started in the background and this search
+        is answered with the current model. Query vectors and results are cached per
+        model and corpus version, so repeated searches skip embedding and scoring.
+
         Parameters
         ----------
         db : ArxivDatabase
@@ -158,11 +1510,114 @@ class LsaDocumentSearch:
             The maximum number of similar papers to return, by default 10.
         force_refresh: bool, optional
             Forces a refresh of the trained model
+        category : str, optional
+            Only return papers listed in this category.
+        author : str, optional
+            Only return papers with this author, compared case-insensitively.
+        nprobe : int, optional
+            The number of inverted lists scanned by the ANN index. Higher values
+            trade latency for recall, by default DEFAULT_NPROBE.
 
         Returns
         -------
-        List[ArxivPaper]
-            A list of ArxivPaper objects that are most similar to the query.
+        List[Paper]
+            A list of papers that are most similar to the query.
         """
-        papers = db.get_papers()
-        return self.find_match(papers, query, limit=limit, force_refresh=force_refresh)
+        if force_refresh or not self.is_trained:
+            self.refit(db)
+        else:
+            self._reload_if_swapped()
+            self._refit_if_drifted(db)
+
+        corpus_version = db.get_corpus_version()
+        key = (query, limit, category, author, nprobe)
+        entry_ids = self.cache.get_results(self.model_version, corpus_version, key)
+        if entry_ids is not None:
+            return db.get_papers_by_ids(entry_ids)
+
+        store = self.get_embeddings(db)
+        lookup = self._embed_query(query)
+
+        index = self._load_ann() if category is None and author is None else None
+        if index is not None:
+            vals, _ = index.search(
+                store.vectors, lookup, limit, nprobe=nprobe, scales=store.scales
+            )
+        else:
+            # Restrict scoring to the papers matching the filters in the database
+            rows = self._filter_rows(db, store, category, author)
+            vectors, scales = store.select(rows)
+
+            # Stored vectors are unit normalized, so a dot product ranks by cosine
+            # similarity
+            vals, _ = top_k(lookup[np.newaxis], vectors, limit, scales=scales)
+            vals = vals[0] if rows is None else rows[vals[0]]
+
+        entry_ids = store.entry_ids_at(vals)
+        self.cache.put_results(self.model_version, corpus_version, key, entry_ids)
+        return db.get_papers_by_ids(entry_ids)
+
+    def search_many(
+        self,
+        db: ArxivDatabase,
+        queries: List[str],
+        k: int = 10,
+        category: Optional[str] = None,
+        author: Optional[str] = None,
+    ) -> List[List[ScoredPaper]]:
+        """
+        Search for the papers most similar to each of many queries.
+
+        All queries are embedded in one call and scored exactly against the stored
+        vectors in bounded blocks, see `top_k`, which amortizes the per-query overhead
+        of `search` over large batches.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            An instance of the ArxivDatabase class.
+        queries : List[str]
+            The search queries.
+        k : int, optional
+            The maximum number of similar papers to return per query, by default 10.
+        category : str, optional
+            Only return papers listed in this category.
+        author : str, optional
+            Only return papers with this author, compared case-insensitively.
+
+        Returns
+        -------
+        List[List[ScoredPaper]]
+            For every query, the most similar papers and their cosine similarities,
+            most similar first.
+        """
+        if not self.is_trained:
+            self.refit(db)
+        else:
+            self._reload_if_swapped()
+            self._refit_if_drifted(db)
+        if not queries:
+            return []
+
+        store = self.get_embeddings(db)
+        rows = self._filter_rows(db, store, category, author)
+        vectors, scales = store.select(rows)
+
+        top_rows, top_scores = top_k(
+            self.model.transform(queries), vectors, k, scales=scales
+        )
+        if rows is not None:
+            top_rows = rows[top_rows]
+
+        # Hydrate every distinct paper once, however many queries it matched
+        unique_rows = np.unique(top_rows)
+        entry_ids = dict(zip(unique_rows, store.entry_ids_at(unique_rows)))
+        papers = {p.entry_id: p for p in db.get_papers_by_ids(list(entry_ids.values()))}
+        return [
+            [
+                ScoredPaper(papers[entry_ids[i]], float(score))
+                for i, score in zip(query_rows, query_scores)
+                if entry_ids[i] in papers
+            ]
+            for query_rows, query_scores in zip(top_rows, top_scores)
+        ]
@@ -1,14 +1,44 @@
 from datetime import datetime
-from typing import List
+from typing import List, NamedTuple, Optional, Union
 
 from pydantic import BaseModel
 
+# Separator used to store author and category lists in a single column. The ASCII unit
+# separator cannot appear in names, unlike commas.
+LIST_SEPARATOR = "\x1f"
+
 
 class ArxivStats(BaseModel):
     date: str
     count: int
 
 
+class FetchState(BaseModel):
+    category: str
+    published: datetime
+    updated: datetime
+
+
+class FetchCheckpoint(BaseModel):
+    query: str
+    offset: int
+    window_end: datetime
+
+
+class CorpusFingerprint(BaseModel):
+    papers: int
+    updated: Optional[datetime]
+
+
+class PaperHeader(NamedTuple):
+    """The fields of a paper listed by the browser, read without its abstract"""
+
+    entry_id: str
+    published: datetime
+    title: str
+    viewed: bool
+
+
 class ArxivPaper(BaseModel):
     entry_id: str
     updated: datetime
@@ -18,3 +48,74 @@ class ArxivPaper(BaseModel):
     authors: List[str]
     categories: List[str]
     viewed: bool
+
+
+class PaperRecord:
+    """
+    A paper read back from the local database.
+
+    Rows written by `ArxivDatabase` are trusted, so they skip pydantic validation and
+    their timestamps and lists are only decoded the first time they are accessed.
+    """
+
+    __slots__ = (
+        "entry_id",
+        "title",
+        "summary",
+        "viewed",
+        "_updated",
+        "_published",
+        "_authors",
+        "_categories",
+    )
+
+    def __init__(
+        self,
+        entry_id: str,
+        updated: Union[str, datetime],
+        published: Union[str, datetime],
+        title: str,
+        summary: str,
+        authors: Union[str, List[str]],
+        categories: Union[str, List[str]],
+        viewed: bool,
+    ):
+        self.entry_id = entry_id
+        self.title = title
+        self.summary = summary
+        self.viewed = viewed
+        self._updated = updated
+        self._published = published
+        self._authors = authors
+        self._categories = categories
+
+    @property
+    def updated(self) -> datetime:
+        if isinstance(self._updated, str):
+            self._updated = datetime.fromisoformat(self._updated)
+        return self._updated
+
+    @property
+    def published(self) -> datetime:
+        if isinstance(self._published, str):
+            self._published = datetime.fromisoformat(self._published)
+        return self._published
+
+    @property
+    def authors(self) -> List[str]:
+        if isinstance(self._authors, str):
+            self._authors = self._authors.split(LIST_SEPARATOR)
+        return self._authors
+
+    @property
+    def categories(self) -> List[str]:
+        if isinstance(self._categories, str):
+            self._categories = self._categories.split(LIST_SEPARATOR)
+        return self._categories
+
+    def __repr__(self) -> str:
+        return f"PaperRecord(entry_id={self.entry_id!r}, title={self.title!r})"
+
+
+# Papers either arrive from the arXiv API or are read back from the database
+Paper = Union[ArxivPaper, PaperRecord]
@@ -1,107 +1,362 @@
-from typing import List
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional, Protocol, Sequence, Set, Tuple
 
 from termcolor import colored
 
 from arxivterminal.constants import DATABASE_PATH, MODEL_PATH
-from arxivterminal.db import ArxivDatabase, ArxivStats
-from arxivterminal.download import download_paper
-from arxivterminal.fetch import ArxivPaper
-from arxivterminal.ml import LsaDocumentSearch
+from arxivterminal.db import ArxivDatabase
+from arxivterminal.models import ArxivStats, Paper
+from arxivterminal.refit import stored_model_version
+
+if TYPE_CHECKING:
+    from arxivterminal.ml import LsaDocumentSearch
+
+
+# Number of papers listed per page by the interactive browser
+PAGE_SIZE = 20
+
+LIST_PROMPT = (
+    "\nEnter the line number to show the full abstract, 'n' for the next page, "
+    "'p' for the previous page, 'b' to go back, or 'q' to quit: "
+)
+PAPER_PROMPT = (
+    "Enter the line number to show the full abstract, 'b' to go back, "
+    "'d' to download, 's' to search similar, or 'q' to quit: "
+)
 
 
 class ExitAppException(Exception):
     pass
 
 
-def print_papers(papers: List[ArxivPaper], show_dates: bool = True):
-    """
-    Print a list of Arxiv papers and their publication date in a formatted manner.
+class ListedPaper(Protocol):
+    """The fields of a paper needed to list it, see `PaperHeader`"""
 
-    Parameters
-    ----------
-    papers : List[ArxivPaper]
-        A list of ArxivPaper objects to be printed.
-    show_dates: bool
-        If true, then the publish date of the paper is shown. Otherwise, date headers are
-        omitted.
-    """
-    current_date = None
-    total_papers = len(papers)
+    entry_id: str
+    published: datetime
+    title: str
+    viewed: bool
+
+
+class PaperPages(Protocol):
+    def page(self, number: int) -> Tuple[Sequence[ListedPaper], bool]:
+        """Return the papers of a page and whether a next page exists"""
+        ...
+
+    def hydrate(self, entry_id: str) -> Optional[Paper]:
+        """Return a listed paper with its abstract"""
+        ...
+
+
+class ListPages:
+    def __init__(self, papers: List[Paper], page_size: int = PAGE_SIZE):
+        """
+        Initialize pages over papers which are already loaded, in the order given.
 
-    def _format_categories(categories: List[str]) -> str:
-        joined = ",".join(categories)
-        return f"[{joined}]"
+        Parameters
+        ----------
+        papers : List[Paper]
+            The papers to list.
+        page_size : int, optional
+            The number of papers per page, by default PAGE_SIZE.
+        """
+        self.papers = papers
+        self.page_size = page_size
+        self._by_id = {p.entry_id: p for p in papers}
 
-    def _format_authors(authors: List[str], max_len: int):
-        author_list = ", ".join(authors[:max_len])
+    def page(self, number: int) -> Tuple[Sequence[ListedPaper], bool]:
+        start = number * self.page_size
+        end = start + self.page_size
+        return self.papers[start:end], end < len(self.papers)
 
-        if len(authors) > max_len:
-            author_list += ", et al."
+    def hydrate(self, entry_id: str) -> Optional[Paper]:
+        return self._by_id.get(entry_id)
 
-        return author_list
 
-    while True:
+class DatabasePages:
+    def __init__(
+        self,
+        db: ArxivDatabase,
+        published_after: Optional[datetime] = None,
+        category: Optional[str] = None,
+        author: Optional[str] = None,
+        page_size: int = PAGE_SIZE,
+    ):
+        """
+        Initialize pages over the papers of the database, newest first.
+
+        Only the titles of one page are read at a time, and the abstract of a paper
+        only when it is selected.
+
+        Parameters
+        ----------
+        db : ArxivDatabase
+            The database holding the papers.
+        published_after : datetime, optional
+            Only list papers published at or after this date.
+        category : str, optional
+            Only list papers in this category.
+        author : str, optional
+            Only list papers with this author.
+        page_size : int, optional
+            The number of papers per page, by default PAGE_SIZE.
+        """
+        self.db = db
+        self.published_after = published_after
+        self.category = category
+        self.author = author
+        self.page_size = page_size
+        # The entry id each page starts after, for every page reached so far
+        self._starts: List[Optional[str]] = [None]
+
+    def page(self, number: int) -> Tuple[Sequence[ListedPaper], bool]:
+        # One extra row tells whether a next page exists
+        headers = self.db.get_paper_headers(
+            self.published_after,
+            before=self._starts[number],
+            limit=self.page_size + 1,
+            category=self.category,
+            author=self.author,
+        )
+        papers = headers[: self.page_size]
+        has_next = len(headers) > self.page_size
+        if has_next and len(self._starts) == number + 1:
+            self._starts.append(papers[-1].entry_id)
+
+        # List oldest first, so the newest paper is printed next to the prompt
+        return papers[::-1], has_next
+
+    def hydrate(self, entry_id: str) -> Optional[Paper]:
+        papers = self.db.get_papers_by_ids([entry_id])
+        return papers[0] if papers else None
+
+
+class PaperBrowser:
+    def __init__(
+        self,
+        pages: PaperPages,
+        db: ArxivDatabase,
+        show_dates: bool = True,
+        lsa: Optional["LsaDocumentSearch"] = None,
+    ):
+        """
+        Initialize an interactive, paginated browser of papers.
+
+        Papers opened in the browser are marked as viewed in memory and written to
+        the database in one transaction when the page changes or the browser exits.
+
+        Parameters
+        ----------
+        pages : PaperPages
+            The pages of papers to browse.
+        db : ArxivDatabase
+            The database used to record viewed papers and find similar ones.
+        show_dates : bool, optional
+            If true, papers are grouped under their publication date, by default True.
+        lsa : LsaDocumentSearch, optional
+            The model used to search similar papers. If None, the default model is
+            loaded on the first search and kept for the session.
+        """
+        self.pages = pages
+        self.db = db
+        self.show_dates = show_dates
+        self.lsa = lsa
+        self.viewed: Set[str] = set()
+        self._pending: Set[str] = set()
+
+    def flush(self):
+        """Write the papers viewed since the last flush to the database"""
+        if self._pending:
+            self.db.mark_papers_viewed(sorted(self._pending))
+            self._pending.clear()
+
+    def _print_page(self, papers: Sequence[ListedPaper], number: int, has_next: bool):
+        current_date = None
         for i, paper in enumerate(papers):
             paper_date = paper.published.date()
-            if (paper_date != current_date) and show_dates:
+            if (paper_date != current_date) and self.show_dates:
                 print(colored(f"\n{paper_date}", "cyan"))
                 print(colored("".join(["-"] * 10), "cyan"))
                 current_date = paper_date
-            inverted_line_number = total_papers - i
+            inverted_line_number = len(papers) - i
 
-            if paper.viewed:
+            if paper.viewed or paper.entry_id in self.viewed:
                 print(
                     f"{colored(inverted_line_number, 'green')}. {colored(paper.title, 'green')}"
                 )
             else:
                 print(f"{colored(inverted_line_number, 'yellow')}. {paper.title}")
 
-        # Get the line number from the user
-        user_input = input(
-            "\nEnter the line number to show the full abstract, 'b' to go back, or 'q' to quit: "
-        )
+        if number > 0 or has_next:
+            more = ", more with 'n'" if has_next else ""
+            print(colored(f"\nPage {number + 1}{more}", "cyan"))
 
-        while user_input.lower() != "b":
-            try:
-                line_number = int(user_input)
-                if 1 <= line_number <= total_papers:
-                    selected_index = total_papers - line_number
-                    selected_paper = papers[selected_index]
-                    print(f"\n{colored(selected_paper.title, 'yellow')}")
-                    print(f"{_format_authors(selected_paper.authors, 3)}")
-                    print(f"\n{colored(selected_paper.entry_id, 'blue')}")
-                    print(f"\n{colored('Abstract:', 'cyan')} {selected_paper.summary}")
-                    print(
-                        f"\nCategories: {_format_categories(selected_paper.categories)}\n"
-                    )
-                    db = ArxivDatabase(str(DATABASE_PATH))
-                    db.mark_paper_viewed(selected_paper)
-                    papers[selected_index].viewed = True
-                else:
-                    print("Invalid line number. Please try again.")
-            except ValueError:
-                if user_input.lower() == "q":
+    def _show_paper(self, paper: Paper):
+        print(f"\n{colored(paper.title, 'yellow')}")
+        print(f"{_format_authors(paper.authors, 3)}")
+        print(f"\n{colored(paper.entry_id, 'blue')}")
+        print(f"\n{colored('Abstract:', 'cyan')} {paper.summary}")
+        print(f"\nCategories: {_format_categories(paper.categories)}\n")
+
+        if paper.entry_id not in self.viewed:
+            self.viewed.add(paper.entry_id)
+            self._pending.add(paper.entry_id)
+
+    def _similar(self, paper: Paper) -> List[Paper]:
+        # Stored neighbours need neither the model nor a search, but are only used
+        # if they were computed with the current model
+        papers = []
+        if self.lsa is not None:
+            version = self.lsa.model_version
+        else:
+            version = stored_model_version(MODEL_PATH)
+        if version is not None and version == self.db.get_neighbor_version():
+            papers = self.db.get_neighbors(paper.entry_id)
+        if not papers:
+            if self.lsa is None:
+                from arxivterminal.ml import LsaDocumentSearch
+
+                self.lsa = LsaDocumentSearch(str(MODEL_PATH))
+            papers = self.lsa.similar(self.db, paper)
+        return papers
+
+    def run(self):
+        """
+        Browse the papers until the user goes back or quits.
+
+        Raises
+        ------
+        ExitAppException
+            If the user quits.
+        """
+        try:
+            self._browse()
+        finally:
+            self.flush()
+
+    def _browse(self):
+        number = 0
+        while True:
+            papers, has_next = self.pages.page(number)
+            self._print_page(papers, number, has_next)
+            selected = None
+            user_input = input(LIST_PROMPT)
+
+            while True:
+                choice = user_input.strip().lower()
+                if choice == "q":
                     raise ExitAppException
-                elif user_input.lower() == "d":
+                elif choice == "b":
+                    if selected is None:
+                        return
+                    break
+                elif choice in ("n", "p") and selected is None:
+                    step = 1 if choice == "n" else -1
+                    if (step == 1 and has_next) or (step == -1 and number > 0):
+                        self.flush()
+                        number += step
+                        break
+                    print("There is no such page.")
+                elif choice.isdigit():
+                    line_number = int(choice)
+                    if 1 <= line_number <= len(papers):
+                        listed = papers[len(papers) - line_number]
+                        selected = self.pages.hydrate(listed.entry_id)
+                        if selected is not None:
+                            self._show_paper(selected)
+                        else:
+                            print("The paper is no longer in the database.")
+                    else:
+                        print("Invalid line number. Please try again.")
+                elif choice == "d" and selected is not None:
+                    from arxivterminal.download import download_paper
+
                     try:
-                        download_paper(selected_paper)
+                        download_paper(selected)
                     except FileExistsError:
                         pass
-                    user_input = input(
-                        "Enter 'b' to go back, 'd' to download, 's' to search similar, or 'q' to quit: "
-                    )
-                    continue
-                elif user_input.lower() == "s":
-                    db = ArxivDatabase(str(DATABASE_PATH))
-                    lsa = LsaDocumentSearch(str(MODEL_PATH))
-                    search_results = lsa.search(db, selected_paper.summary)
-                    print_papers(search_results, show_dates=False)
-
-                print("Invalid input. Please try again.")
-
-            user_input = input(
-                "Enter the line number to show the full abstract, 'b' to go back, 'd' to download, 's' to search similar, or 'q' to quit: "  # noqa: E501
-            )
+                elif choice == "s" and selected is not None:
+                    PaperBrowser(
+                        ListPages(self._similar(selected)),
+                        self.db,
+                        show_dates=False,
+                        lsa=self.lsa,
+                    ).run()
+                    break
+                else:
+                    print("Invalid input. Please try again.")
+
+                user_input = input(LIST_PROMPT if selected is None else PAPER_PROMPT)
+
+
+def _format_categories(categories: List[str]) -> str:
+    joined = ",".join(categories)
+    return f"[{joined}]"
+
+
+def _format_authors(authors: List[str], max_len: int):
+    author_list = ", ".join(authors[:max_len])
+
+    if len(authors) > max_len:
+        author_list += ", et al."
+
+    return author_list
+
+
+def print_papers(
+    papers: List[Paper],
+    show_dates: bool = True,
+    db: Optional[ArxivDatabase] = None,
+    lsa: Optional["LsaDocumentSearch"] = None,
+):
+    """
+    Print a list of Arxiv papers and their publication date in a formatted manner.
+
+    Parameters
+    ----------
+    papers : List[Paper]
+        A list of papers to be printed, a page at a time.
+    show_dates: bool
+        If true, then the publish date of the paper is shown. Otherwise, date headers are
+        omitted.
+    db: ArxivDatabase, optional
+        The database used to record viewed papers and search similar ones. If None, the
+        default database is opened once for the whole session.
+    lsa: LsaDocumentSearch, optional
+        The model used to search similar papers. If None, the default model is loaded
+        on the first search and kept for the session, so its query cache is reused.
+    """
+    if db is None:
+        db = ArxivDatabase(str(DATABASE_PATH))
+
+    PaperBrowser(ListPages(papers), db, show_dates=show_dates, lsa=lsa).run()
+
+
+def browse_papers(
+    db: ArxivDatabase,
+    published_after: Optional[datetime] = None,
+    category: Optional[str] = None,
+    author: Optional[str] = None,
+    page_size: int = PAGE_SIZE,
+):
+    """
+    Browse the papers of the database a page at a time, newest first.
+
+    Parameters
+    ----------
+    db : ArxivDatabase
+        The database holding the papers.
+    published_after : datetime, optional
+        Only list papers published at or after this date.
+    category : str, optional
+        Only list papers in this category.
+    author : str, optional
+        Only list papers with this author, compared case-insensitively.
+    page_size : int, optional
+        The number of papers per page, by default PAGE_SIZE.
+    """
+    pages = DatabasePages(db, published_after, category, author, page_size)
+    PaperBrowser(pages, db).run()
 
 
 def print_stats(stats: List[ArxivStats]):
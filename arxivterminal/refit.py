@@ -0,0 +1,199 @@
+"""
+Retrain the LSA model in a background process and swap it in atomically.
+
+A search which finds the corpus has drifted from the one the model was trained on
+starts `python -m arxivterminal.refit <database> <model>` and carries on with the
+current model. The refit trains into temporary files next to the model and then
+renames them over the current ones, so readers never see a partly written file.
+"""
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+# A lock older than this is left over from a refit which died and is ignored
+REFIT_LOCK_TIMEOUT_SECONDS = 6 * 60 * 60
+
+
+def embeddings_path(model_path: Union[str, Path]) -> Path:
+    """Return the path of the embedding store kept next to a model file"""
+    return Path(model_path).with_suffix(".embeddings.json")
+
+
+def stored_model_version(model_path: Union[str, Path]) -> Optional[str]:
+    """
+    Read the model version of the embedding store without loading the model.
+
+    The store is saved right after its model is trained and swapped in before it by
+    a refit, so its version is the one derived data must match.
+
+    Parameters
+    ----------
+    model_path : Union[str, Path]
+        Path to the model file.
+
+    Returns
+    -------
+    Optional[str]
+        The version, or None if no store exists.
+    """
+    try:
+        return json.loads(embeddings_path(model_path).read_text())["model_version"]
+    except FileNotFoundError:
+        return None
+
+
+def refit_lock_path(model_path: Union[str, Path]) -> Path:
+    """Return the path of the lock held by a refit of a model"""
+    return Path(model_path).with_suffix(".refit.lock")
+
+
+def is_refit_running(model_path: Union[str, Path]) -> bool:
+    """
+    Check whether a refit of the model is in progress.
+
+    Parameters
+    ----------
+    model_path : Union[str, Path]
+        Path to the model file.
+
+    Returns
+    -------
+    bool
+        True if a lock younger than REFIT_LOCK_TIMEOUT_SECONDS exists.
+    """
+    try:
+        age = time.time() - refit_lock_path(model_path).stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return age < REFIT_LOCK_TIMEOUT_SECONDS
+
+
+def schedule_refit(
+    database_path: Union[str, Path], model_path: Union[str, Path]
+) -> bool:
+    """
+    Start a refit of the model in a detached process, unless one is running.
+
+    Parameters
+    ----------
+    database_path : Union[str, Path]
+        Path to the database holding the papers to train on.
+    model_path : Union[str, Path]
+        Path to the model file to replace.
+
+    Returns
+    -------
+    bool
+        True if a refit process was started.
+    """
+    if is_refit_running(model_path):
+        return False
+
+    subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "arxivterminal.refit",
+            str(database_path),
+            str(model_path),
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    logging.info(f"Started a background refit of {model_path}")
+    return True
+
+
+def acquire_lock(model_path: Union[str, Path]) -> bool:
+    """Create the refit lock, returning False if another refit holds it"""
+    lock_path = refit_lock_path(model_path)
+    if lock_path.exists() and not is_refit_running(model_path):
+        lock_path.unlink(missing_ok=True)
+
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as lock:
+        lock.write(str(os.getpid()))
+    return True
+
+
+def refit(database_path: Union[str, Path], model_path: Union[str, Path]):
+    """
+    Retrain the model on the database and atomically replace its files.
+
+    The new model is trained the way the current one was, into temporary files,
+    and the papers saved meanwhile are embedded with it. The embedding store and ANN
+    index are swapped in before the model, so a reader holding the old model finds a
+    newer store and reloads the model rather than rebuilding the store. The neighbour
+    lists of the papers are then rebuilt for the new model.
+
+    Parameters
+    ----------
+    database_path : Union[str, Path]
+        Path to the database holding the papers to train on.
+    model_path : Union[str, Path]
+        Path to the model file to replace.
+    """
+    from arxivterminal.db import ArxivDatabase
+    from arxivterminal.ml import EmbeddingStore, LsaDocumentSearch
+
+    model_path = Path(model_path)
+    if not acquire_lock(model_path):
+        logging.info(f"A refit of {model_path} is already running")
+        return
+
+    staging_path = model_path.with_name(f"{model_path.stem}.refit-{os.getpid()}.joblib")
+    current = LsaDocumentSearch(str(model_path))
+    staged = LsaDocumentSearch(str(staging_path))
+    staged.fit_params = current.fit_params
+    staged.out_of_core = current.out_of_core
+    try:
+        with ArxivDatabase(str(database_path)) as db:
+            staged.refit(db)
+            # Searches and fetches leave the papers saved while training to the refit
+            staged.embed_missing(db, neighbors=False)
+
+        # Saving the store writes new arrays and then renames its metadata over the
+        # current one
+        EmbeddingStore.load(staged.embeddings_path).save(current.embeddings_path)
+        for staged_file, final_file in [
+            (staged.ann_path, current.ann_path),
+            (staging_path, model_path),
+        ]:
+            if staged_file.exists():
+                os.replace(staged_file, final_file)
+        logging.info(f"Swapped in model version {staged.model_version}")
+    finally:
+        EmbeddingStore.remove(staged.embeddings_path)
+        for staged_file in [staging_path, staged.ann_path]:
+            staged_file.unlink(missing_ok=True)
+        refit_lock_path(model_path).unlink(missing_ok=True)
+
+    # Papers saved between the catch-up and releasing the lock were also left to the
+    # refit, so they are embedded with the new model once writers may save again
+    with ArxivDatabase(str(database_path)) as db:
+        swapped = LsaDocumentSearch(str(model_path))
+        swapped.embed_missing(db)
+        swapped.index_neighbors(db)
+
+
+def main():
+    from arxivterminal.constants import LOG_PATH
+
+    LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(level=logging.INFO, filename=LOG_PATH)
+    database_path, model_path = sys.argv[1:3]
+    refit(database_path, model_path)
+
+
+if __name__ == "__main__":
+    main()
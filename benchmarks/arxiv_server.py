@@ -0,0 +1,348 @@
+"""
+Local stand-in for the arXiv API which serves synthetic Atom feeds and PDFs.
+
+The server answers `/api/query` like export.arxiv.org, honouring `cat:` and
+`submittedDate:[... TO ...]` terms, `id_list`, `start` and `max_results`, and serves
+`/pdf/<id>` with support for `Range` requests. Latency, the largest page served,
+injected errors and 503 rate-limit responses are configurable, and every response is
+counted so benchmarks can report API calls and retries.
+
+Point the CLI at a running server through the environment:
+
+    python -m benchmarks.arxiv_server --port 8080 --num-papers 5000 --latency 0.2
+    ARXIVTERMINAL_API_URL=http://127.0.0.1:8080/api/query arxiv fetch --delay 0
+    ARXIVTERMINAL_PDF_URL=http://127.0.0.1:8080/pdf arxiv download --unviewed-days 1
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+CATEGORIES = ["cs.AI", "cs.LG", "cs.CL", "cs.CV", "stat.ML"]
+
+ARXIV_DATE_FORMAT = "%Y%m%d%H%M"
+ATOM_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+WORDS = (
+    "learning model neural network language agent graph reward policy data "
+    "training inference attention transformer robust optimal bound sample"
+).split()
+
+
+class SyntheticPaper(NamedTuple):
+    short_id: str
+    published: datetime
+    title: str
+    summary: str
+    authors: List[str]
+    categories: List[str]
+
+
+def make_papers(num_papers: int, num_days: int, seed: int = 0) -> List[SyntheticPaper]:
+    """Return papers spread evenly over the last `num_days`, newest first"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    spacing = timedelta(days=num_days) / max(num_papers, 1)
+
+    papers = []
+    for i in range(num_papers):
+        categories = [CATEGORIES[i % len(CATEGORIES)]]
+        if i % 3 == 0:
+            # Cross-list a third of the papers so combined queries see duplicates
+            categories.append(CATEGORIES[(i + 1) % len(CATEGORIES)])
+        papers.append(
+            SyntheticPaper(
+                short_id=f"2301.{i:05d}v1",
+                published=now - spacing * i,
+                title=" ".join(rng.choices(WORDS, k=8)).capitalize(),
+                summary=" ".join(rng.choices(WORDS, k=120)),
+                authors=[f"Author {rng.randrange(1000)}" for _ in range(3)],
+                categories=categories,
+            )
+        )
+    return papers
+
+
+class ArxivStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        num_papers: int = 1000,
+        num_days: int = 7,
+        latency: float = 0.0,
+        max_page_size: int = 2000,
+        error_rate: float = 0.0,
+        min_interval: float = 0.0,
+        pdf_size: int = 100000,
+        seed: int = 0,
+    ):
+        """
+        Initialize the server, bound to localhost. Use it as a context manager to
+        serve from a background thread.
+
+        Parameters
+        ----------
+        port : int, optional
+            The port to listen on. If 0, a free port is picked, by default 0.
+        num_papers : int, optional
+            The number of synthetic papers served, by default 1000.
+        num_days : int, optional
+            The number of days the papers are spread over, by default 7.
+        latency : float, optional
+            Seconds added to every response, by default 0.
+        max_page_size : int, optional
+            The most entries returned per API call whatever `max_results` asks for,
+            by default 2000 like arXiv.
+        error_rate : float, optional
+            The fraction of API calls answered with a 500 error, by default 0.
+        min_interval : float, optional
+            API calls arriving sooner than this many seconds after the previous one
+            are answered with 503, as arXiv does when rate limiting, by default 0.
+        pdf_size : int, optional
+            The size in bytes of every PDF served, by default 100000.
+        seed : int, optional
+            Seed for the synthetic papers and the injected errors, by default 0.
+        """
+        super().__init__(("127.0.0.1", port), StubRequestHandler)
+        self.papers = make_papers(num_papers, num_days, seed)
+        self.papers_by_id: Dict[str, SyntheticPaper] = {
+            p.short_id: p for p in self.papers
+        }
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.error_rate = error_rate
+        self.min_interval = min_interval
+        self.pdf_size = pdf_size
+
+        self.counts: Counter = Counter()
+        self._random = random.Random(seed)
+        self._last_request: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/api/query"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def admit(self) -> int:
+        """Count an API call and return the status it should be answered with"""
+        with self._lock:
+            self.counts["api_calls"] += 1
+            now = time.monotonic()
+            if (
+                self.min_interval > 0
+                and self._last_request is not None
+                and now - self._last_request < self.min_interval
+            ):
+                self.counts["throttled"] += 1
+                return 503
+            self._last_request = now
+
+            if self._random.random() < self.error_rate:
+                self.counts["errors"] += 1
+                return 500
+            return 200
+
+    def query(self, params: Dict[str, List[str]]) -> List[SyntheticPaper]:
+        """Return the papers matching an API query, before paging"""
+        id_list = params.get("id_list", [""])[0]
+        if id_list:
+            ids = id_list.split(",")
+            return [self.papers_by_id[i] for i in ids if i in self.papers_by_id]
+
+        search_query = params.get("search_query", [""])[0]
+        categories = set(re.findall(r"cat:([\w.\-]+)", search_query))
+        dates = re.search(r"submittedDate:\[(\d{12}) TO (\d{12})\]", search_query)
+
+        papers = self.papers
+        if categories:
+            papers = [p for p in papers if categories.intersection(p.categories)]
+        if dates:
+            start, end = (
+                datetime.strptime(d, ARXIV_DATE_FORMAT).replace(tzinfo=timezone.utc)
+                for d in dates.groups()
+            )
+            # The range is inclusive down to the minute
+            end += timedelta(minutes=1)
+            papers = [p for p in papers if start <= p.published < end]
+        return papers
+
+    def render_feed(self, papers: List[SyntheticPaper], total: int, start: int) -> str:
+        entries = "".join(self.render_entry(p) for p in papers)
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<feed xmlns="http://www.w3.org/2005/Atom" '
+            'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+            'xmlns:arxiv="http://arxiv.org/schemas/atom">'
+            "<title>ArXiv Query</title>"
+            f"<id>{self.api_url}</id>"
+            f"<updated>{datetime.now(timezone.utc):{ATOM_DATE_FORMAT}}</updated>"
+            f"<opensearch:totalResults>{total}</opensearch:totalResults>"
+            f"<opensearch:startIndex>{start}</opensearch:startIndex>"
+            f"<opensearch:itemsPerPage>{len(papers)}</opensearch:itemsPerPage>"
+            f"{entries}</feed>"
+        )
+
+    def render_entry(self, paper: SyntheticPaper) -> str:
+        published = paper.published.strftime(ATOM_DATE_FORMAT)
+        authors = "".join(
+            f"<author><name>{escape(a)}</name></author>" for a in paper.authors
+        )
+        categories = "".join(
+            f'<category term="{c}" scheme="http://arxiv.org/schemas/atom"/>'
+            for c in paper.categories
+        )
+        return (
+            "<entry>"
+            f"<id>http://arxiv.org/abs/{paper.short_id}</id>"
+            f"<updated>{published}</updated>"
+            f"<published>{published}</published>"
+            f"<title>{escape(paper.title)}</title>"
+            f"<summary>{escape(paper.summary)}</summary>"
+            f"{authors}"
+            f'<link href="http://arxiv.org/abs/{paper.short_id}" rel="alternate" '
+            'type="text/html"/>'
+            f'<link title="pdf" href="{self.url}/pdf/{paper.short_id}" '
+            'rel="related" type="application/pdf"/>'
+            f'<arxiv:primary_category term="{paper.categories[0]}" '
+            'scheme="http://arxiv.org/schemas/atom"/>'
+            f"{categories}</entry>"
+        )
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    server: ArxivStubServer
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        time.sleep(self.server.latency)
+
+        if url.path == "/api/query":
+            self.handle_query(parse_qs(url.query))
+        elif url.path.startswith("/pdf/"):
+            self.handle_pdf(url.path.split("/")[-1])
+        else:
+            self.send_error(404)
+
+    def handle_query(self, params: Dict[str, List[str]]):
+        status = self.server.admit()
+        if status != 200:
+            self.send_response(status)
+            if status == 503:
+                self.send_header("Retry-After", str(self.server.min_interval))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        papers = self.server.query(params)
+        start = int(params.get("start", ["0"])[0])
+        page_size = min(
+            int(params.get("max_results", ["10"])[0]), self.server.max_page_size
+        )
+        end = start + page_size
+        page = papers[start:end]
+        with self.server._lock:
+            self.server.counts["pages"] += 1
+            self.server.counts["papers"] += len(page)
+
+        body = self.server.render_feed(page, len(papers), start).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_pdf(self, short_id: str):
+        with self.server._lock:
+            self.server.counts["pdf_calls"] += 1
+        if short_id.removesuffix(".pdf") not in self.server.papers_by_id:
+            self.send_error(404)
+            return
+
+        body = b"%PDF-1.4\n" + b"0" * max(self.server.pdf_size - 9, 0)
+        total = len(body)
+        ranged = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if ranged and int(ranged.group(1)) >= total:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{total}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if ranged:
+            start = int(ranged.group(1))
+            body = body[start:]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{total - 1}/{total}")
+        else:
+            self.send_response(200)
+        with self.server._lock:
+            self.server.counts["pdf_bytes"] += len(body)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--num-papers", type=int, default=1000)
+    parser.add_argument("--num-days", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--max-page-size", type=int, default=2000)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--min-interval", type=float, default=0.0)
+    parser.add_argument("--pdf-size", type=int, default=100000)
+    args = parser.parse_args()
+
+    server = ArxivStubServer(
+        port=args.port,
+        num_papers=args.num_papers,
+        num_days=args.num_days,
+        latency=args.latency,
+        max_page_size=args.max_page_size,
+        error_rate=args.error_rate,
+        min_interval=args.min_interval,
+        pdf_size=args.pdf_size,
+    )
+    print(f"Serving {args.num_papers} papers at {server.api_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(dict(server.counts))
+
+
+if __name__ == "__main__":
+    main()
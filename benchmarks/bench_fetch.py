@@ -0,0 +1,162 @@
+"""
+Benchmark the fetch path against a local arXiv stand-in.
+
+Runs fetch_papers with several page sizes, with per-category and combined queries,
+with injected errors and with 503 rate limiting, then download_paper, download_papers
+with several worker counts and finally `arxiv fetch` end to end. Reports papers per
+second, API calls and retries.
+
+    python -m benchmarks.bench_fetch --num-papers 5000 --latency 0.05
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from arxivterminal import download
+from arxivterminal.fetch import RateLimitedClient, fetch_papers
+from benchmarks.arxiv_server import CATEGORIES, ArxivStubServer
+
+FETCH_CATEGORIES = CATEGORIES[:2]
+
+
+def report(name: str, server: ArxivStubServer, num_papers: int, elapsed: float):
+    counts = server.counts
+    retries = counts["api_calls"] - counts["pages"]
+    print(
+        f"{name:<32} {num_papers:>7} papers {num_papers / elapsed:>9.1f} papers/s "
+        f"{counts['api_calls']:>5} calls {retries:>4} retries "
+        f"({counts['errors']} errors, {counts['throttled']} throttled)"
+    )
+
+
+def bench_fetch_papers(name: str, args, delay: float = 0.0, **kwargs):
+    server_kwargs = {
+        key: kwargs.pop(key) for key in ["error_rate", "min_interval"] if key in kwargs
+    }
+    with ArxivStubServer(
+        num_papers=args.num_papers,
+        num_days=args.num_days,
+        latency=args.latency,
+        **server_kwargs,
+    ) as server:
+        RateLimitedClient.query_url_format = f"{server.api_url}?{{}}"
+
+        num_papers = 0
+        start = time.perf_counter()
+        try:
+            for batch in fetch_papers(
+                FETCH_CATEGORIES, num_days=args.num_days, delay=delay, **kwargs
+            ):
+                num_papers += len(batch.papers)
+        except Exception as e:
+            name = f"{name} (failed: {type(e).__name__})"
+        report(name, server, num_papers, time.perf_counter() - start)
+
+
+def bench_download_paper(args):
+    with ArxivStubServer(
+        num_papers=args.num_papers,
+        num_days=args.num_days,
+        latency=args.latency,
+        pdf_size=args.pdf_size,
+    ) as server:
+        RateLimitedClient.query_url_format = f"{server.api_url}?{{}}"
+        download.ARXIV_PDF_URL = f"{server.url}/pdf"
+
+        batches = fetch_papers(FETCH_CATEGORIES, num_days=args.num_days, delay=0)
+        papers = next(batches).papers[: args.num_downloads]
+        batches.close()
+        server.counts.clear()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            start = time.perf_counter()
+            for paper in papers:
+                download.download_paper(paper, paper_dir=tmpdir)
+            report("download_paper", server, len(papers), time.perf_counter() - start)
+
+        for max_workers in [1, 4, 8]:
+            server.counts.clear()
+            with tempfile.TemporaryDirectory() as tmpdir:
+                start = time.perf_counter()
+                download.download_papers(
+                    [p.entry_id for p in papers],
+                    paper_dir=tmpdir,
+                    max_workers=max_workers,
+                    delay=0,
+                )
+                report(
+                    f"download_papers, {max_workers} workers",
+                    server,
+                    len(papers),
+                    time.perf_counter() - start,
+                )
+
+
+def bench_cli_fetch(args):
+    with ArxivStubServer(
+        num_papers=args.num_papers, num_days=args.num_days, latency=args.latency
+    ) as server, tempfile.TemporaryDirectory() as tmpdir:
+        env = dict(
+            os.environ,
+            ARXIVTERMINAL_API_URL=server.api_url,
+            XDG_DATA_HOME=str(Path(tmpdir) / "data"),
+            XDG_CACHE_HOME=str(Path(tmpdir) / "cache"),
+        )
+        command = [
+            sys.executable,
+            "-c",
+            "from arxivterminal.cli import cli; cli()",
+            "fetch",
+            "--num-days",
+            str(args.num_days),
+            "--categories",
+            ",".join(FETCH_CATEGORIES),
+            "--delay",
+            "0",
+        ]
+
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, capture_output=True)
+        elapsed = time.perf_counter() - start
+        report("arxiv fetch", server, server.counts["papers"], elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-papers", type=int, default=5000)
+    parser.add_argument("--num-days", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--pdf-size", type=int, default=1000000)
+    parser.add_argument("--num-downloads", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--min-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    for page_size in [100, 500, 2000]:
+        bench_fetch_papers(
+            f"combined, page size {page_size}", args, page_size=page_size
+        )
+    bench_fetch_papers("per category", args, combine_categories=False)
+    bench_fetch_papers(
+        f"{args.error_rate:.0%} errors", args, error_rate=args.error_rate, page_size=100
+    )
+    bench_fetch_papers(
+        "rate limited, no delay", args, min_interval=args.min_interval, page_size=100
+    )
+    bench_fetch_papers(
+        "rate limited, with delay",
+        args,
+        delay=args.min_interval,
+        min_interval=args.min_interval,
+        page_size=100,
+    )
+    bench_download_paper(args)
+    bench_cli_fetch(args)
+
+
+if __name__ == "__main__":
+    main()
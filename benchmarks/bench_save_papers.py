@@ -0,0 +1,87 @@
+"""
+Benchmark ArxivDatabase.save_papers against a large existing table.
+
+Seeds a database with `--existing` rows and then times saving a batch of `--batch`
+papers, half of which are new and half updates to existing rows.
+
+    python -m benchmarks.bench_save_papers --existing 1000000 --batch 100000
+"""
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from arxivterminal.db import ArxivDatabase
+from arxivterminal.models import ArxivPaper, PaperRecord
+
+BASE_DATE = datetime(2020, 1, 1)
+
+
+def seed(db: ArxivDatabase, num_rows: int, chunk_size: int = 100000):
+    """Insert `num_rows` papers through save_papers, including their author rows"""
+    for start in range(0, num_rows, chunk_size):
+        end = min(start + chunk_size, num_rows)
+        db.save_papers(
+            [
+                PaperRecord(
+                    entry_id=f"http://arxiv.org/abs/{i}",
+                    updated=BASE_DATE,
+                    published=BASE_DATE + timedelta(minutes=i),
+                    title=f"Seed paper {i}",
+                    summary=f"Abstract of seed paper number {i} about learning.",
+                    authors=["Jane Doe", "John Smith"],
+                    categories=["cs.LG"],
+                    viewed=False,
+                )
+                for i in range(start, end)
+            ]
+        )
+
+
+def make_batch(num_existing: int, batch_size: int):
+    """Return papers updating the newest half of the seed rows plus new papers"""
+    updated = BASE_DATE + timedelta(days=1)
+    first_id = num_existing - batch_size // 2
+    return [
+        ArxivPaper(
+            entry_id=f"http://arxiv.org/abs/{i}",
+            updated=updated,
+            published=BASE_DATE + timedelta(minutes=i),
+            title=f"Batch paper {i}",
+            summary=f"Abstract of batch paper number {i} about learning.",
+            authors=["Jane Doe", "John Smith"],
+            categories=["cs.LG"],
+            viewed=False,
+        )
+        for i in range(first_id, first_id + batch_size)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--existing", type=int, default=1000000)
+    parser.add_argument("--batch", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ArxivDatabase(str(Path(tmpdir) / "bench.db")) as db:
+            start = time.perf_counter()
+            seed(db, args.existing)
+            print(f"Seeded {args.existing} rows in {time.perf_counter() - start:.2f}s")
+
+            papers = make_batch(args.existing, args.batch)
+
+            start = time.perf_counter()
+            saved = db.save_papers(papers)
+            elapsed = time.perf_counter() - start
+            print(f"Saved {len(saved)} of {len(papers)} papers in {elapsed:.2f}s")
+
+            start = time.perf_counter()
+            saved = db.save_papers(papers)
+            elapsed = time.perf_counter() - start
+            print(f"Re-saved unchanged batch ({len(saved)} writes) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Benchmark the database and LSA search paths on synthetic corpora.
+
+For every corpus size, a fresh process saves the generated papers and times
+save_papers, get_papers, search_papers, get_stats, LsaDocumentSearch.fit and
+fit_out_of_core, the per-query latency of find_match and search and the throughput
+of search_many, recording the peak RSS after each step. Results are written as JSON
+so runs can be compared across commits:
+
+    python -m benchmarks.bench_suite --sizes 10000 100000 --output new.json
+    python -m benchmarks.bench_suite --sizes 10000 100000 --baseline old.json
+"""
+import argparse
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, List
+
+STEPS = [
+    "save_papers",
+    "get_papers",
+    "search_papers",
+    "get_stats",
+    "fit",
+    "fit_out_of_core",
+    "find_match",
+    "search",
+    "search_many",
+]
+
+SAVE_BATCH_SIZE = 10000
+
+
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak / 1024 ** (2 if sys.platform == "darwin" else 1)
+
+
+def time_queries(run: Callable[[str], object], queries: List[str]) -> Dict[str, float]:
+    """Return latency statistics in milliseconds of running each query"""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        run(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+    }
+
+
+def run_size(
+    size: int, steps: List[str], num_queries: int, embedding_dtype: str = "float32"
+) -> Dict:
+    """Run the steps on a corpus of `size` papers, in the calling process"""
+    from arxivterminal.db import ArxivDatabase
+    from arxivterminal.ml import LsaDocumentSearch, iter_documents
+    from benchmarks.corpus import generate_papers, make_queries
+
+    queries = make_queries(num_queries)
+    results: Dict[str, Dict[str, float]] = {}
+
+    def record(step: str, **metrics: float):
+        results[step] = dict(metrics, peak_rss_mb=peak_rss_mb())
+        print(f"{size:>8} {step:<14} {metrics}", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ArxivDatabase(str(Path(tmpdir) / "bench.db")) as db:
+            # Saving is always needed to populate the database, but only timed on
+            # request. Generating the corpus is excluded from the timing.
+            elapsed = 0.0
+            papers = generate_papers(size)
+            while True:
+                batch = list(islice(papers, SAVE_BATCH_SIZE))
+                if not batch:
+                    break
+                start = time.perf_counter()
+                db.save_papers(batch)
+                elapsed += time.perf_counter() - start
+            if "save_papers" in steps:
+                record("save_papers", seconds=elapsed, papers_per_s=size / elapsed)
+
+            all_papers = None
+            if "get_papers" in steps or "find_match" in steps:
+                start = time.perf_counter()
+                all_papers = db.get_papers()
+                if "get_papers" in steps:
+                    record("get_papers", seconds=time.perf_counter() - start)
+
+            if "search_papers" in steps:
+                record(
+                    "search_papers",
+                    **time_queries(lambda q: db.search_papers(q, limit=10), queries),
+                )
+
+            if "get_stats" in steps:
+                start = time.perf_counter()
+                db.get_stats()
+                record("get_stats", seconds=time.perf_counter() - start)
+
+            if "fit_out_of_core" in steps:
+                # Run before the in-memory fit so the peak RSS is its own
+                lsa = LsaDocumentSearch(str(Path(tmpdir) / "streamed.joblib"))
+                start = time.perf_counter()
+                lsa.fit_out_of_core(
+                    db, force_overwrite=True, embedding_dtype=embedding_dtype
+                )
+                record("fit_out_of_core", seconds=time.perf_counter() - start)
+
+            lsa = LsaDocumentSearch(str(Path(tmpdir) / "model.joblib"))
+            if {"fit", "find_match", "search", "search_many"}.intersection(steps):
+                start = time.perf_counter()
+                lsa.fit(
+                    iter_documents(db),
+                    force_overwrite=True,
+                    embedding_dtype=embedding_dtype,
+                )
+                if "fit" in steps:
+                    record("fit", seconds=time.perf_counter() - start)
+
+            if "find_match" in steps:
+                record(
+                    "find_match",
+                    **time_queries(lambda q: lsa.find_match(all_papers, q), queries),
+                )
+
+            if "search" in steps:
+                record("search", **time_queries(lambda q: lsa.search(db, q), queries))
+
+            if "search_many" in steps:
+                start = time.perf_counter()
+                lsa.search_many(db, queries, k=10)
+                elapsed = time.perf_counter() - start
+                record(
+                    "search_many", seconds=elapsed, queries_per_s=len(queries) / elapsed
+                )
+
+    return {"size": size, "steps": results}
+
+
+def git_commit() -> str:
+    """Return the commit being benchmarked, if run from a git checkout"""
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    )
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+def find_regressions(run: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return a description of every metric which got worse beyond `tolerance`"""
+    previous = {r["size"]: r["steps"] for r in baseline["results"]}
+    regressions = []
+    for result in run["results"]:
+        for step, metrics in result["steps"].items():
+            before = previous.get(result["size"], {}).get(step, {})
+            for metric, value in metrics.items():
+                # Throughput regresses downwards, every other metric upwards
+                old = before.get(metric)
+                if not old:
+                    continue
+                change = (
+                    old / value - 1 if metric.endswith("_per_s") else value / old - 1
+                )
+                if change > tolerance:
+                    regressions.append(
+                        f"{result['size']} {step} {metric}: {old:.4g} -> {value:.4g}"
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument("--steps", nargs="+", choices=STEPS, default=STEPS)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument(
+        "--embedding-dtype",
+        choices=["float32", "float16", "int8"],
+        default="float32",
+        help="Encoding of the stored document vectors.",
+    )
+    parser.add_argument("--output", help="Write the results to this file.")
+    parser.add_argument("--baseline", help="Compare against a previous results file.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Relative slowdown reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    run = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "embedding_dtype": args.embedding_dtype,
+        "results": [],
+    }
+    for size in args.sizes:
+        # A fresh process per size keeps the peak RSS of each corpus separate
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+            result = executor.submit(
+                run_size, size, args.steps, args.queries, args.embedding_dtype
+            )
+            run["results"].append(result.result())
+
+    output = json.dumps(run, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = find_regressions(run, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
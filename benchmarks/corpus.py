@@ -0,0 +1,120 @@
+"""
+Generator of synthetic papers with arXiv-like abstracts for benchmarks.
+
+Abstracts are drawn from a Zipf-distributed vocabulary mixed with English function
+words, and every paper belongs to a topic which favours its own subset of terms, so
+TF-IDF and LSA see realistic term statistics and latent structure.
+"""
+from datetime import datetime, timedelta
+from itertools import islice, product
+from typing import Iterator, List
+
+import numpy as np
+
+from arxivterminal.models import ArxivPaper
+
+SYLLABLES = (
+    "ba be bi bo ca ce co da de di do fa fe fi ga ge go la le li lo ma me mi mo na "
+    "ne ni no pa pe"
+).split()
+
+FUNCTION_WORDS = (
+    "the of and a to in we is for that this on with by are an as our which from be "
+    "these can show results method propose"
+).split()
+
+CATEGORIES = ["cs.AI", "cs.LG", "cs.CL", "cs.CV", "cs.IR", "cs.RO", "stat.ML"]
+
+VOCABULARY_SIZE = 20000
+NUM_TOPICS = 50
+TOPIC_SIZE = 200
+ABSTRACT_WORDS = (120, 250)
+BASE_DATE = datetime(2021, 1, 1)
+
+
+def make_vocabulary(size: int = VOCABULARY_SIZE) -> List[str]:
+    """Return `size` distinct pronounceable words"""
+    words = ("".join(s) for s in product(SYLLABLES, repeat=3))
+    return list(islice(words, size))
+
+
+def zipf_weights(size: int, exponent: float = 1.1) -> np.ndarray:
+    """Return normalized Zipf probabilities for ranks 1..size"""
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate_papers(
+    num_papers: int, seed: int = 0, num_days: int = 1000
+) -> Iterator[ArxivPaper]:
+    """
+    Yield synthetic papers published evenly over `num_days` from BASE_DATE.
+
+    Parameters
+    ----------
+    num_papers : int
+        The number of papers to generate.
+    seed : int, optional
+        Seed of the generator, so runs are comparable, by default 0.
+    num_days : int, optional
+        The number of days the publication dates span, by default 1000.
+
+    Yields
+    ------
+    ArxivPaper
+        The generated papers, oldest first.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(make_vocabulary())
+    weights = zipf_weights(len(vocabulary))
+    topics = [
+        rng.choice(len(vocabulary), TOPIC_SIZE, replace=False)
+        for _ in range(NUM_TOPICS)
+    ]
+    topic_weights = zipf_weights(TOPIC_SIZE)
+    function_words = np.array(FUNCTION_WORDS)
+    spacing = timedelta(days=num_days) / max(num_papers, 1)
+
+    for i in range(num_papers):
+        topic = topics[i % NUM_TOPICS]
+        length = rng.integers(*ABSTRACT_WORDS)
+
+        # Roughly 55% topical terms, 30% background terms and 15% function words
+        source = rng.random(length)
+        words = np.where(
+            source < 0.55,
+            vocabulary[topic[rng.choice(TOPIC_SIZE, length, p=topic_weights)]],
+            np.where(
+                source < 0.85,
+                vocabulary[rng.choice(len(vocabulary), length, p=weights)],
+                function_words[rng.integers(len(function_words), size=length)],
+            ),
+        )
+        title = vocabulary[topic[rng.choice(TOPIC_SIZE, 8, p=topic_weights)]]
+        published = BASE_DATE + spacing * i
+
+        yield ArxivPaper(
+            entry_id=f"http://arxiv.org/abs/{i:08d}v1",
+            updated=published,
+            published=published,
+            title=" ".join(title).capitalize(),
+            summary=" ".join(words) + ".",
+            authors=[f"Author {a}" for a in rng.integers(50000, size=3)],
+            categories=list(
+                dict.fromkeys(
+                    CATEGORIES[c] for c in (i % len(CATEGORIES), rng.integers(7))
+                )
+            ),
+            viewed=False,
+        )
+
+
+def make_queries(num_queries: int, seed: int = 1) -> List[str]:
+    """Return short queries of topical and background terms"""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(make_vocabulary())
+    weights = zipf_weights(len(vocabulary))
+    return [
+        " ".join(vocabulary[rng.choice(len(vocabulary), 2, p=weights)])
+        for _ in range(num_queries)
+    ]
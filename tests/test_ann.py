@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from arxivterminal.ann import IvfIndex, spherical_kmeans
+
+
+@pytest.fixture
+def vectors():
+    # Unit vectors scattered around a few directions, like clustered abstracts
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 16))
+    points = centers[rng.integers(20, size=5000)] + 0.5 * rng.normal(size=(5000, 16))
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+def test_spherical_kmeans_returns_unit_centroids(vectors):
+    centroids = spherical_kmeans(vectors, 10)
+
+    assert centroids.shape == (10, 16)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1, atol=1e-5)
+
+
+def test_ivf_index_recall(vectors):
+    index = IvfIndex.build("v1", vectors, n_lists=50)
+    queries = vectors[:20]
+
+    recalls = []
+    for query in queries:
+        rows, scores = index.search(vectors, query, limit=10, nprobe=10)
+        exact = np.argsort(-(vectors @ query))[:10]
+        recalls.append(len(set(rows) & set(exact)) / 10)
+        assert rows[0] == np.argmax(vectors @ query)
+        assert np.all(np.diff(scores) <= 0)
+
+    assert np.mean(recalls) >= 0.9
+
+    # Probing every list is an exact search
+    rows, _ = index.search(vectors, queries[0], limit=10, nprobe=50)
+    assert list(rows) == list(np.argsort(-(vectors @ queries[0]))[:10])
+
+
+def test_ivf_index_incremental_add(tmp_path, vectors):
+    index = IvfIndex.build("v1", vectors[:4000], n_lists=20)
+    index.add(np.arange(4000, 5000), vectors[4000:])
+    index.save(tmp_path / "index.joblib")
+
+    loaded = IvfIndex.load(tmp_path / "index.joblib")
+    assert loaded.model_version == "v1"
+    assert len(loaded.assignments) == 5000
+
+    rows, _ = loaded.search(vectors, vectors[4500], limit=1, nprobe=20)
+    assert list(rows) == [4500]
+
+
+def test_ivf_index_load_missing(tmp_path):
+    assert IvfIndex.load(tmp_path / "missing.joblib") is None
+
+
+def test_ivf_index_load_keeps_saved_lists(tmp_path, vectors, monkeypatch):
+    index = IvfIndex.build("v1", vectors, n_lists=20)
+    index.save(tmp_path / "index.joblib")
+    assert [p.name for p in tmp_path.iterdir()] == ["index.joblib"]
+
+    # The grouped rows are read back rather than sorted again
+    monkeypatch.setattr(IvfIndex, "_build_lists", lambda self: pytest.fail("sorted"))
+    loaded = IvfIndex.load(tmp_path / "index.joblib")
+    assert np.array_equal(loaded.order, index.order)
+    assert np.array_equal(loaded.offsets, index.offsets)
+
+
+def test_ivf_index_load_partial_file(tmp_path, vectors):
+    IvfIndex.build("v1", vectors, n_lists=20).save(tmp_path / "index.joblib")
+    data = (tmp_path / "index.joblib").read_bytes()
+    (tmp_path / "index.joblib").write_bytes(data[: len(data) // 2])
+
+    assert IvfIndex.load(tmp_path / "index.joblib") is None
@@ -0,0 +1,51 @@
+import numpy as np
+
+from arxivterminal.cache import LruCache, SearchCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LruCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert len(cache) == 2
+
+
+def test_search_cache_persists_across_instances(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = SearchCache(path)
+    cache.put_vector("v1", "query", np.array([0.6, 0.8]))
+    cache.put_results("v1", 3, ("query", 10), ["a", "b"])
+    cache.close()
+
+    cache = SearchCache(path)
+    np.testing.assert_array_equal(cache.get_vector("v1", "query"), [0.6, 0.8])
+    assert cache.get_results("v1", 3, ("query", 10)) == ["a", "b"]
+    assert cache.get_results("v1", 3, ("query", 5)) is None
+
+
+def test_search_cache_invalidated_by_versions(tmp_path):
+    cache = SearchCache(tmp_path / "cache.db")
+    cache.put_vector("v1", "query", np.array([1.0]))
+    cache.put_results("v1", 3, ("query", 10), ["a"])
+
+    # Newly saved papers change the results but not the query vector
+    assert cache.get_results("v1", 4, ("query", 10)) is None
+    assert cache.get_vector("v1", "query") is not None
+
+    # Writing for a new model deletes the entries of the old one from disk
+    cache.put_vector("v2", "query", np.array([2.0]))
+    cache.put_results("v2", 4, ("query", 10), ["b"])
+    fresh = SearchCache(tmp_path / "cache.db")
+    assert fresh.get_vector("v1", "query") is None
+    assert fresh.get_results("v1", 3, ("query", 10)) is None
+
+
+def test_search_cache_skips_unversioned_models():
+    cache = SearchCache(None)
+    cache.put_results(None, 0, ("query", 10), ["a"])
+    assert cache.get_results(None, 0, ("query", 10)) is None
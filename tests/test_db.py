@@ -1,15 +1,17 @@
-from datetime import datetime, timedelta
+import sqlite3
+from datetime import datetime, timedelta, timezone
 
 import pytest
 
-from arxivterminal.db import ArxivDatabase
-from arxivterminal.models import ArxivPaper
+from arxivterminal.db import MIGRATIONS, ArxivDatabase
+from arxivterminal.models import ArxivPaper, FetchCheckpoint, FetchState, PaperRecord
 
 
 @pytest.fixture
 def test_db(tmp_path):
     db_path = tmp_path / "test.db"
-    return ArxivDatabase(str(db_path))
+    with ArxivDatabase(str(db_path)) as db:
+        yield db
 
 
 @pytest.fixture
@@ -53,6 +55,240 @@ def test_save_and_get_papers(test_db, test_papers):
         assert paper.viewed == test_papers[idx].viewed
 
 
+def test_save_papers_only_writes_changes(test_db, test_papers):
+    assert len(test_db.save_papers(test_papers)) == 2
+
+    # Unchanged papers are skipped, and duplicates within a batch are saved once
+    assert test_db.save_papers(test_papers + test_papers) == []
+
+    test_papers[1].title = "Revised Paper 1"
+    test_papers[1].updated += timedelta(hours=1)
+    saved = test_db.save_papers(test_papers)
+    assert [p.entry_id for p in saved] == ["1"]
+    assert test_db.get_papers_by_ids(["1"])[0].title == "Revised Paper 1"
+
+
+def test_iter_papers_in_batches(test_db, test_papers):
+    test_db.save_papers(test_papers)
+
+    papers = list(test_db.iter_papers(batch_size=1))
+    assert [p.entry_id for p in papers] == ["2", "1"]
+
+    rows = list(test_db.iter_papers(columns=["entry_id", "summary"], batch_size=1))
+    assert rows == [
+        ("2", "This is another test paper."),
+        ("1", "This is a test paper."),
+    ]
+
+    recent = test_db.iter_papers(published_after=datetime.now() - timedelta(days=1.5))
+    assert [p.entry_id for p in recent] == ["1"]
+
+    with pytest.raises(ValueError):
+        list(test_db.iter_papers(columns=["entry_id", "secret"]))
+
+
+def test_convert_to_paper_decodes_lazily():
+    row = (
+        "1",
+        "2023-01-02T00:00:00",
+        "2023-01-01T00:00:00",
+        "T",
+        "S",
+        "A\x1fB",
+        "cs",
+        1,
+    )
+    paper = ArxivDatabase.convert_to_paper(row)
+
+    assert isinstance(paper, PaperRecord)
+    assert paper._published == "2023-01-01T00:00:00"
+    assert paper.published == datetime(2023, 1, 1)
+    assert paper.authors == ["A", "B"]
+    assert paper.viewed is True
+
+    paper.viewed = False
+    assert paper.viewed is False
+
+
+def test_filter_by_category_and_author(test_db, test_papers):
+    test_papers[1].authors = ["Doe, Jane"]
+    test_db.save_papers(test_papers)
+
+    assert [p.entry_id for p in test_db.get_papers(category="cs.CL")] == ["2"]
+    assert [p.entry_id for p in test_db.get_papers(author="doe, jane")] == ["1"]
+    assert test_db.get_papers(category="cs.CL", author="Doe, Jane") == []
+    assert test_db.get_papers_by_ids(["1"])[0].authors == ["Doe, Jane"]
+
+    assert [p.entry_id for p in test_db.search_papers("test", category="cs.CL")] == [
+        "2"
+    ]
+    assert [s.count for s in test_db.get_stats(author="John Doe")] == [1]
+
+
+def test_migration_backfills_lists(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            """
+            CREATE TABLE papers (
+                entry_id TEXT PRIMARY KEY,
+                updated TIMESTAMP,
+                published TIMESTAMP,
+                title TEXT,
+                summary TEXT,
+                authors TEXT,
+                categories TEXT,
+                viewed BOOLEAN DEFAULT 0
+            )
+        """
+        )
+        conn.execute(
+            "INSERT INTO papers VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            ("1", "2023-01-01", "2023-01-01", "T", "S", "A,B", "cs.AI,cs.CL"),
+        )
+
+    with ArxivDatabase(db_path) as db:
+        paper = db.get_papers()[0]
+        assert paper.authors == ["A", "B"]
+        assert paper.categories == ["cs.AI", "cs.CL"]
+        assert len(db.get_papers(category="cs.CL", author="b")) == 1
+
+
+def test_failed_migration_is_rolled_back(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    ArxivDatabase(db_path).close()
+
+    migrations = MIGRATIONS + ["CREATE TABLE partial (id INTEGER); SELECT missing();"]
+    monkeypatch.setattr("arxivterminal.db.MIGRATIONS", migrations)
+    with pytest.raises(sqlite3.OperationalError):
+        ArxivDatabase(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE name = 'partial'")
+        assert tables.fetchall() == []
+
+
+def test_daily_counts_follow_changes(test_db, test_papers):
+    test_db.save_papers(test_papers)
+    dates = [s.date for s in test_db.get_stats()]
+
+    # Moving a paper onto the other paper's date merges the two counts
+    test_papers[1].published = test_papers[0].published
+    test_papers[1].updated += timedelta(hours=1)
+    test_db.save_papers(test_papers)
+    stats = test_db.get_stats()
+    assert [(s.date, s.count) for s in stats] == [(dates[0], 2)]
+    assert stats == test_db.get_stats(category="cs.AI")
+
+    test_db.delete_papers()
+    assert test_db.get_stats() == []
+
+
+def test_fetch_state_keeps_high_water_mark(test_db, test_papers):
+    assert test_db.get_fetch_state("cs.AI") is None
+
+    newer, older = test_papers[1], test_papers[0]
+    test_db.update_fetch_state(
+        FetchState(category="cs.AI", published=newer.published, updated=newer.updated)
+    )
+    assert test_db.get_fetch_state("cs.AI").published == newer.published
+    assert test_db.get_fetch_state("cs.LG") is None
+
+    # Older papers never move the mark backwards
+    test_db.update_fetch_state(
+        FetchState(category="cs.AI", published=older.published, updated=older.updated)
+    )
+    assert test_db.get_fetch_state("cs.AI").published == newer.published
+
+
+def test_fetch_checkpoints(test_db):
+    query = "cat:cs.AI AND submittedDate:[202301010000 TO 202301012359]"
+    window_end = datetime(2023, 1, 1, 23, 59, 59, tzinfo=timezone.utc)
+    checkpoint = FetchCheckpoint(query=query, offset=100, window_end=window_end)
+    test_db.save_fetch_checkpoints([checkpoint])
+
+    assert test_db.get_fetch_checkpoint(query).offset == 100
+    assert test_db.get_fetch_checkpoints() == [checkpoint]
+
+    test_db.delete_fetch_checkpoint(query)
+    assert test_db.get_fetch_checkpoint(query) is None
+
+
+def test_delete_expired_fetch_checkpoints(test_db):
+    window_end = datetime(2023, 1, 1, 23, 59, 59, tzinfo=timezone.utc)
+    test_db.save_fetch_checkpoints(
+        [
+            FetchCheckpoint(query="past", offset=10, window_end=window_end),
+            FetchCheckpoint(
+                query="current",
+                offset=20,
+                window_end=window_end + timedelta(days=1),
+            ),
+        ]
+    )
+
+    test_db.delete_expired_fetch_checkpoints(window_end + timedelta(seconds=1))
+    assert [c.query for c in test_db.get_fetch_checkpoints()] == ["current"]
+
+
+def test_corpus_fingerprint(test_db, test_papers):
+    empty = test_db.get_corpus_fingerprint()
+    assert empty.papers == 0
+    assert empty.updated is None
+
+    test_db.save_papers(test_papers)
+    fingerprint = test_db.get_corpus_fingerprint()
+    assert fingerprint.papers == 2
+    assert fingerprint.updated.replace(tzinfo=None) == max(
+        p.updated for p in test_papers
+    ).replace(microsecond=0)
+
+
+def test_get_entry_ids_updated_since(test_db, test_papers):
+    test_db.save_papers(test_papers)
+    later = test_papers[0].copy(update={"updated": datetime(2100, 1, 1)})
+    test_db.save_papers([later])
+
+    assert test_db.get_entry_ids_updated_since(datetime(2100, 1, 1)) == ["2"]
+    assert test_db.get_entry_ids_updated_since(datetime(2000, 1, 1)) == ["1", "2"]
+
+
+def test_corpus_version_changes_on_writes(test_db, test_papers):
+    version = test_db.get_corpus_version()
+    test_db.save_papers(test_papers)
+    saved = test_db.get_corpus_version()
+    assert saved != version
+
+    # Saving unchanged papers leaves the version alone
+    test_db.save_papers(test_papers)
+    assert test_db.get_corpus_version() == saved
+
+    test_db.delete_papers()
+    assert test_db.get_corpus_version() != saved
+
+
+def test_get_paper_headers_pages_newest_first(test_db, test_papers):
+    test_db.save_papers(test_papers)
+
+    first = test_db.get_paper_headers(limit=1)
+    assert [h.entry_id for h in first] == ["1"]
+    assert first[0].title == "Test Paper 1"
+    assert first[0].published == test_papers[1].published
+
+    second = test_db.get_paper_headers(before="1", limit=1)
+    assert [h.entry_id for h in second] == ["2"]
+    assert test_db.get_paper_headers(before="2") == []
+    assert test_db.get_paper_headers(category="cs.CL")[0].entry_id == "2"
+
+
+def test_mark_papers_viewed(test_db, test_papers):
+    test_db.save_papers(test_papers)
+    test_db.mark_papers_viewed(["1", "2", "missing"])
+
+    assert all(h.viewed for h in test_db.get_paper_headers())
+
+
 def test_delete_papers(test_db, test_papers):
     test_db.save_papers(test_papers)
     test_db.delete_papers()
@@ -73,3 +309,66 @@ def test_get_stats(test_db, test_papers):
     assert len(stats) == 2
     assert stats[0].count == 1
     assert stats[1].count == 1
+
+
+def test_search_papers_ranks_by_relevance(test_db, test_papers):
+    test_db.save_papers(test_papers)
+    search_result = test_db.search_papers("another OR test", limit=1)
+    assert [p.entry_id for p in search_result] == ["2"]
+
+
+def test_search_papers_phrase_and_prefix(test_db, test_papers):
+    test_db.save_papers(test_papers)
+    assert [p.entry_id for p in test_db.search_papers('"another test"')] == ["2"]
+    assert len(test_db.search_papers("anoth*")) == 1
+    assert len(test_db.search_papers("Doe")) == 2
+    assert len(test_db.search_papers("test-paper")) == 2
+
+
+def test_search_papers_follows_updates(test_db, test_papers):
+    test_db.save_papers(test_papers)
+    test_papers[0].summary = "A rewritten abstract."
+    test_papers[0].updated += timedelta(hours=1)
+    test_db.save_papers(test_papers)
+    assert test_db.search_papers("another") == []
+    assert len(test_db.search_papers("rewritten")) == 1
+
+    test_db.delete_papers()
+    assert test_db.search_papers("paper") == []
+
+
+def test_connection_pragmas(test_db):
+    assert test_db.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert test_db.conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+
+def test_read_during_write(test_db, test_papers):
+    test_db.save_papers(test_papers[:1])
+
+    # A second connection can read while the first one holds a write transaction
+    with ArxivDatabase(test_db.database_path) as reader:
+        with test_db.conn:
+            test_db.conn.execute("UPDATE papers SET viewed = 1")
+            assert reader.get_papers()[0].viewed is False
+        assert reader.get_papers()[0].viewed is True
+
+
+def test_neighbors(test_db, test_papers):
+    test_db.save_papers(test_papers)
+    first, second = (p.entry_id for p in test_papers)
+    assert test_db.get_neighbor_version() is None
+
+    test_db.reset_neighbors("v1")
+    test_db.save_neighbors({first: [(second, 0.5)], second: [(first, 0.5)]})
+    assert test_db.get_neighbor_version() == "v1"
+    assert [p.entry_id for p in test_db.get_neighbors(first)] == [second]
+    assert test_db.get_neighbor_lists([first]) == {first: [(second, 0.5)]}
+    assert test_db.get_neighbor_thresholds() == {first: (0.5, 1), second: (0.5, 1)}
+
+    # Deleting a paper drops its list, and lists only return papers which exist
+    test_db.conn.execute("DELETE FROM papers WHERE entry_id = ?", (first,))
+    assert test_db.get_neighbor_lists([first, second]) == {second: [(first, 0.5)]}
+    assert test_db.get_neighbors(second) == []
+
+    test_db.reset_neighbors("v2")
+    assert test_db.get_neighbor_thresholds() == {}
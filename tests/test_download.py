@@ -2,11 +2,14 @@ import shutil
 import tempfile
 from datetime import datetime
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
 
+from arxivterminal import download
 from arxivterminal.download import download_paper
 from arxivterminal.models import ArxivPaper
+from benchmarks.arxiv_server import ArxivStubServer
 
 
 def test_download_paper_exception():
@@ -37,3 +40,52 @@ def test_download_paper_exception():
 
         # Clean up the temporary directory
         shutil.rmtree(tmpdir)
+
+
+@pytest.fixture
+def pdf_server(monkeypatch):
+    with ArxivStubServer(num_papers=10, pdf_size=50000) as server:
+        monkeypatch.setattr(download, "ARXIV_PDF_URL", f"{server.url}/pdf")
+        yield server
+
+
+def test_pdf_path_of_old_style_ids():
+    entry_id = "http://arxiv.org/abs/hep-th/9901001v1"
+    assert download.pdf_url(entry_id).endswith("/pdf/hep-th/9901001v1")
+    assert download.pdf_path(entry_id, "papers") == Path("papers/hep-th_9901001v1.pdf")
+
+
+def test_download_papers_concurrently(tmp_path, pdf_server):
+    entry_ids = [f"http://arxiv.org/abs/{p.short_id}" for p in pdf_server.papers[:5]]
+
+    results = download.download_papers(entry_ids, paper_dir=tmp_path, delay=0)
+
+    assert [r.status for r in results] == ["downloaded"] * 5
+    assert all(r.path.stat().st_size == 50000 for r in results)
+    assert not list(tmp_path.glob("*.part"))
+
+    # Papers already downloaded are not requested again
+    results = download.download_papers(entry_ids, paper_dir=tmp_path, delay=0)
+    assert [r.status for r in results] == ["exists"] * 5
+    assert pdf_server.counts["pdf_calls"] == 5
+
+
+def test_download_resumes_partial_file(tmp_path, pdf_server):
+    entry_id = f"http://arxiv.org/abs/{pdf_server.papers[0].short_id}"
+    path = download.pdf_path(entry_id, tmp_path)
+    path.with_name(f"{path.name}.part").write_bytes(b"%PDF-1.4\n" + b"0" * 991)
+
+    download.download_paper(SimpleNamespace(entry_id=entry_id), paper_dir=tmp_path)
+
+    assert path.read_bytes() == b"%PDF-1.4\n" + b"0" * 49991
+    assert pdf_server.counts["pdf_bytes"] == 49000
+
+
+def test_download_papers_reports_missing(tmp_path, pdf_server):
+    (result,) = download.download_papers(
+        ["http://arxiv.org/abs/9999.99999v1"], paper_dir=tmp_path, delay=0
+    )
+
+    assert result.status == "failed"
+    assert "404" in result.error
+    assert pdf_server.counts["pdf_calls"] == 1
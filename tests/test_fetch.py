@@ -0,0 +1,365 @@
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import feedparser
+import pytest
+from arxiv import Client
+from click.testing import CliRunner
+
+import arxivterminal.cli
+import arxivterminal.fetch
+from arxivterminal.db import ArxivDatabase
+from arxivterminal.fetch import (
+    RateLimitedClient,
+    RateLimiter,
+    build_query,
+    download_papers,
+    fetch_papers,
+    fetch_query,
+    save_fetched_papers,
+)
+from arxivterminal.ml import LsaDocumentSearch
+from arxivterminal.models import ArxivPaper
+from benchmarks.arxiv_server import ArxivStubServer
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def make_paper(entry_id, category, updated):
+    return ArxivPaper(
+        entry_id=entry_id,
+        updated=updated,
+        published=datetime(2023, 1, 1),
+        title=f"Paper {entry_id}",
+        summary="A test paper.",
+        authors=["Jane Doe"],
+        categories=[category],
+        viewed=False,
+    )
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(interval=0.05)
+
+    start = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    elapsed = time.monotonic() - start
+
+    # The first request is immediate and the following three wait one interval each
+    assert elapsed >= 0.15
+
+
+def test_fetch_papers_dedupes_cross_lists(monkeypatch):
+    now = datetime(2023, 1, 2)
+    results = {
+        "cs.AI": [make_paper("1", "cs.AI", now), make_paper("2", "cs.AI", now)],
+        "cs.LG": [make_paper("2", "cs.LG", now + timedelta(hours=1))],
+    }
+
+    def fake_download(categories, num_days, client=None, stop_before=None, offset=0):
+        assert client is not None
+        return [paper for category in categories for paper in results[category]]
+
+    monkeypatch.setattr(arxivterminal.fetch, "download_papers", fake_download)
+    batches = list(
+        fetch_papers(["cs.AI", "cs.LG"], num_days=1, combine_categories=False)
+    )
+    # Batches are saved in order, so the last version of each paper is the one kept
+    papers = {paper.entry_id: paper for batch in batches for paper in batch.papers}
+
+    assert sorted(papers) == ["1", "2"]
+    assert papers["2"].categories == ["cs.LG"]
+
+
+class FakeClient:
+    def __init__(self, results):
+        self.results_returned = 0
+        self._results = results
+
+    def results(self, search, offset=0):
+        for result in self._results[offset:]:
+            self.results_returned += 1
+            yield result
+
+
+def make_result(entry_id, published):
+    return SimpleNamespace(
+        entry_id=entry_id,
+        updated=published,
+        published=published,
+        title=f"Paper {entry_id}",
+        summary="A test paper.",
+        authors=[SimpleNamespace(name="Jane Doe")],
+        categories=["cs.AI"],
+    )
+
+
+def test_download_papers_stops_at_high_water_mark():
+    now = datetime.now(timezone.utc)
+    client = FakeClient(
+        [make_result(str(i), now - timedelta(hours=i)) for i in range(0, 48, 6)]
+    )
+
+    papers = list(
+        download_papers(
+            "cs.AI", num_days=7, client=client, stop_before=now - timedelta(hours=13)
+        )
+    )
+
+    assert [p.entry_id for p in papers] == ["0", "6", "12"]
+    assert client.results_returned == 4
+
+
+def test_save_fetched_papers_resumes_from_checkpoint(tmp_path, monkeypatch):
+    now = datetime(2023, 1, 2)
+    papers = [make_paper(str(i), "cs.AI", now) for i in range(5)]
+    offsets = []
+    query, _, _ = fetch_query(["cs.AI"], num_days=1)
+
+    def failing_download(category, num_days, client=None, stop_before=None, offset=0):
+        offsets.append(offset)
+        yield from papers[offset:3]
+        raise ConnectionError("connection reset")
+
+    def resumed_download(category, num_days, client=None, stop_before=None, offset=0):
+        offsets.append(offset)
+        yield from papers[offset:]
+
+    with ArxivDatabase(str(tmp_path / "test.db")) as db:
+        monkeypatch.setattr(arxivterminal.fetch, "download_papers", failing_download)
+        with pytest.raises(ConnectionError):
+            save_fetched_papers(db, ["cs.AI"], num_days=1, batch_size=2)
+
+        # Papers received before the failure are committed along with the offset
+        assert len(db.get_papers()) == 3
+        assert db.get_fetch_checkpoint(query).offset == 3
+        assert db.get_fetch_state("cs.AI") is None
+
+        monkeypatch.setattr(arxivterminal.fetch, "download_papers", resumed_download)
+        save_fetched_papers(db, ["cs.AI"], num_days=1, batch_size=2)
+
+        assert offsets == [0, 3]
+        assert len(db.get_papers()) == 5
+        assert db.get_fetch_checkpoint(query) is None
+        assert db.get_fetch_state("cs.AI").published == now.replace(day=1)
+
+
+def test_checkpoint_only_resumes_the_same_query(tmp_path, monkeypatch):
+    now = datetime(2023, 1, 2)
+    papers = [make_paper(str(i), "cs.AI", now) for i in range(5)]
+    offsets = {}
+
+    def failing_download(categories, num_days, client=None, stop_before=None, offset=0):
+        offsets[tuple(categories)] = offset
+        yield from papers[offset:3]
+        raise ConnectionError("connection reset")
+
+    with ArxivDatabase(str(tmp_path / "test.db")) as db:
+        monkeypatch.setattr(arxivterminal.fetch, "download_papers", failing_download)
+        with pytest.raises(ConnectionError):
+            save_fetched_papers(db, ["cs.LG", "cs.AI"], num_days=1)
+
+        # Listing the categories in another order repeats the same query
+        with pytest.raises(ConnectionError):
+            save_fetched_papers(db, ["cs.AI", "cs.LG"], num_days=1)
+        assert offsets == {("cs.AI", "cs.LG"): 3}
+
+        # The combined offset does not apply to the per-category queries
+        offsets.clear()
+        with pytest.raises(ConnectionError):
+            save_fetched_papers(
+                db, ["cs.AI", "cs.LG"], num_days=1, combine_categories=False
+            )
+        assert offsets == {("cs.AI",): 0, ("cs.LG",): 0}
+
+
+def test_save_fetched_papers_prunes_checkpoints_of_past_windows(tmp_path, monkeypatch):
+    now = datetime(2023, 1, 2)
+    papers = [make_paper(str(i), "cs.AI", now) for i in range(5)]
+
+    def failing_download(category, num_days, client=None, stop_before=None, offset=0):
+        yield from papers[offset:3]
+        raise ConnectionError("connection reset")
+
+    with ArxivDatabase(str(tmp_path / "test.db")) as db:
+        monkeypatch.setattr(arxivterminal.fetch, "download_papers", failing_download)
+        with pytest.raises(ConnectionError):
+            save_fetched_papers(db, ["cs.AI"], num_days=1)
+        (checkpoint,) = db.get_fetch_checkpoints()
+        assert checkpoint.window_end > datetime.now(timezone.utc)
+
+        # Windows end with the day they were made, so a fetch on a later day makes
+        # another query and the old checkpoint would never be resumed
+        db.save_fetch_checkpoints(
+            [
+                checkpoint.copy(
+                    update={"window_end": checkpoint.window_end - timedelta(days=1)}
+                )
+            ]
+        )
+        with pytest.raises(ConnectionError):
+            save_fetched_papers(db, ["cs.AI"], num_days=1)
+        assert db.get_fetch_checkpoints() == [checkpoint]
+
+
+def test_build_query_combines_categories_and_dates():
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2023, 1, 3, 23, 59, 59, tzinfo=timezone.utc)
+
+    assert build_query(["cs.AI"], start, end) == (
+        "cat:cs.AI AND submittedDate:[202301010000 TO 202301032359]"
+    )
+    assert build_query(["cs.AI", "cs.LG"], start, end) == (
+        "(cat:cs.AI OR cat:cs.LG) AND submittedDate:[202301010000 TO 202301032359]"
+    )
+
+
+def test_download_papers_replays_recorded_response(monkeypatch):
+    window = (
+        datetime(2023, 1, 1, tzinfo=timezone.utc),
+        datetime(2023, 1, 3, 23, 59, 59, tzinfo=timezone.utc),
+    )
+    monkeypatch.setattr(arxivterminal.fetch, "fetch_window", lambda num_days: window)
+
+    urls = []
+    parse = feedparser.parse
+
+    def replay(url, *args, **kwargs):
+        urls.append(url)
+        feed = parse((FIXTURES / "arxiv_query.xml").read_text())
+        feed["status"] = 200
+        return feed
+
+    monkeypatch.setattr(feedparser, "parse", replay)
+
+    client = Client(page_size=10, delay_seconds=0)
+    papers = list(download_papers(["cs.AI", "cs.LG"], num_days=3, client=client))
+
+    # One request covers both categories and only asks for the window
+    assert len(urls) == 1
+    params = parse_qs(urlparse(urls[0]).query)
+    assert params["search_query"] == [
+        "(cat:cs.AI OR cat:cs.LG) AND submittedDate:[202301010000 TO 202301032359]"
+    ]
+    assert params["max_results"] == ["10"]
+    assert params["sortBy"] == ["submittedDate"]
+
+    assert [p.entry_id for p in papers] == [
+        "http://arxiv.org/abs/2301.01003v1",
+        "http://arxiv.org/abs/2301.01002v2",
+        "http://arxiv.org/abs/2301.01001v1",
+    ]
+    assert papers[1].categories == ["cs.LG", "stat.ML"]
+    assert papers[1].updated > papers[1].published
+    assert papers[2].authors == ["Barbara Liskov"]
+
+
+def test_fetch_papers_combines_categories(monkeypatch):
+    now = datetime(2023, 1, 2, tzinfo=timezone.utc)
+    queries = []
+    query, _, _ = fetch_query(["cs.AI", "cs.LG"], 1, now - timedelta(days=1))
+
+    def fake_download(categories, num_days, client=None, stop_before=None, offset=0):
+        queries.append((categories, stop_before, offset))
+        yield make_paper("1", "cs.AI", now)
+        yield make_paper("2", "cs.LG", now + timedelta(hours=1))
+
+    monkeypatch.setattr(arxivterminal.fetch, "download_papers", fake_download)
+    batches = list(
+        fetch_papers(
+            ["cs.AI", "cs.LG"],
+            num_days=1,
+            stop_before={"cs.AI": now, "cs.LG": now - timedelta(days=1)},
+            offsets={query: 5},
+        )
+    )
+
+    assert queries == [(["cs.AI", "cs.LG"], now - timedelta(days=1), 5)]
+    assert sorted(batches[-1].completed) == ["cs.AI", "cs.LG"]
+    marks = {mark.category: mark for mark in batches[-1].high_water_marks}
+    assert marks["cs.AI"].updated == now
+    assert marks["cs.LG"].updated == now + timedelta(hours=1)
+
+
+def test_save_fetched_papers_from_stub_server(tmp_path, monkeypatch):
+    # Papers over the last day all fall within a two day fetch window
+    with ArxivStubServer(num_papers=100, num_days=1) as server:
+        monkeypatch.setattr(
+            RateLimitedClient, "query_url_format", f"{server.api_url}?{{}}"
+        )
+        with ArxivDatabase(str(tmp_path / "test.db")) as db:
+            save_fetched_papers(
+                db, ["cs.AI", "cs.LG"], num_days=2, page_size=10, delay=0
+            )
+            papers = db.get_papers()
+
+    # Every 5th paper is in each category and every 3rd is cross-listed to the next
+    assert len(papers) == 47
+    assert server.counts["pages"] == server.counts["api_calls"] == 5
+
+
+def test_fetch_papers_retries_rate_limited_requests(monkeypatch):
+    acquired = []
+    monkeypatch.setattr(RateLimiter, "acquire", lambda self: acquired.append(self))
+    with ArxivStubServer(num_papers=100, num_days=1, min_interval=60) as server:
+        monkeypatch.setattr(
+            RateLimitedClient, "query_url_format", f"{server.api_url}?{{}}"
+        )
+        batches = fetch_papers(["cs.AI"], num_days=2, page_size=10, delay=0)
+        with pytest.raises(Exception, match="503"):
+            list(batches)
+
+    # The first page is served, then the second is retried until the client gives up
+    assert server.counts["pages"] == 1
+    assert server.counts["throttled"] == 4
+
+    # Every retry waited for the shared limiter
+    assert len(acquired) == 5
+
+
+def test_fetch_command_writes_embeddings_once(tmp_path, monkeypatch):
+    now = datetime(2023, 1, 2)
+    batches = [
+        [make_paper("1", "cs.AI", now), make_paper("2", "cs.AI", now)],
+        [make_paper("3", "cs.LG", now)],
+    ]
+    calls = []
+    failure = []
+
+    def fake_fetch(db, categories, num_days, on_saved=None, **kwargs):
+        for batch in batches:
+            on_saved(batch)
+        if failure:
+            raise failure[0]
+
+    def update_embeddings(self, db, papers, refit_threshold, save):
+        calls.append(("update", [p.entry_id for p in papers], save))
+
+    monkeypatch.setattr(arxivterminal.cli, "DATABASE_PATH", tmp_path / "test.db")
+    monkeypatch.setattr(arxivterminal.cli, "MODEL_PATH", tmp_path / "model.joblib")
+    monkeypatch.setattr(arxivterminal.cli, "LOG_PATH", tmp_path / "arxiv.log")
+    monkeypatch.setattr(arxivterminal.fetch, "save_fetched_papers", fake_fetch)
+    monkeypatch.setattr(LsaDocumentSearch, "update_embeddings", update_embeddings)
+    monkeypatch.setattr(
+        LsaDocumentSearch, "flush_embeddings", lambda self, db: calls.append("flush")
+    )
+
+    # Batches are embedded in memory as they are saved and written once at the end
+    result = CliRunner().invoke(arxivterminal.cli.cli, ["fetch"])
+    assert result.exception is None
+    assert calls == [
+        ("update", ["1", "2"], False),
+        ("update", ["3"], False),
+        "flush",
+    ]
+
+    # A failed fetch raises its own error without writing or refitting anything
+    calls.clear()
+    failure.append(ConnectionError("connection reset"))
+    result = CliRunner().invoke(arxivterminal.cli.cli, ["fetch"])
+    assert isinstance(result.exception, ConnectionError)
+    assert "flush" not in calls
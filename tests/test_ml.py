@@ -1,10 +1,23 @@
+import tracemalloc
 from datetime import datetime
 
 import numpy as np
 import pytest
+from scipy.sparse import random as sparse_random
+from sklearn.feature_extraction.text import TfidfVectorizer
 
-from arxivterminal.ml import LsaDocumentSearch, cosine_sim
+from arxivterminal.db import ArxivDatabase
+from arxivterminal.ml import (
+    EmbeddingStore,
+    LsaDocumentSearch,
+    StreamingSVD,
+    iter_documents,
+    quantize,
+    streaming_vocabulary,
+    top_k,
+)
 from arxivterminal.models import ArxivPaper
+from benchmarks.corpus import generate_papers
 
 # You can use sample ArxivPaper objects for testing.
 sample_papers = [
@@ -67,16 +80,454 @@ def lsa_document_search(tmp_path):
     return LsaDocumentSearch(str(model_path))
 
 
-def test_cosine_sim():
-    a = np.array([1, 2, 3])
-    b = np.array([2, 3, 4])
+def test_fit(lsa_document_search):
+    lsa_document_search.fit(
+        sample_papers, force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+    assert lsa_document_search.is_trained
 
-    result = cosine_sim(a, b)
-    assert result == pytest.approx(0.992, rel=1e-3)
 
+def test_fit_saves_embeddings(lsa_document_search):
+    lsa_document_search.fit(
+        sample_papers, force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+    store = EmbeddingStore.load(lsa_document_search.embeddings_path)
 
-def test_fit(lsa_document_search):
+    assert store.model_version == lsa_document_search.model_version
+    assert store.entry_ids == [p.entry_id for p in sample_papers]
+    assert store.vectors.shape == (len(sample_papers), 2)
+
+
+def test_fit_streams_from_database(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers)
+    lsa_document_search.fit(
+        iter_documents(db), force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+    store = EmbeddingStore.load(lsa_document_search.embeddings_path)
+
+    assert store.entry_ids == [p.entry_id for p in sample_papers]
+
+
+def test_search_embeds_only_query(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers)
     lsa_document_search.fit(
         sample_papers, force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
     )
-    assert lsa_document_search.is_trained
+
+    # A fresh instance must reuse the persisted vectors rather than re-embedding
+    search = LsaDocumentSearch(lsa_document_search.model_path)
+    transformed = []
+    transform = search.model.transform
+    search.model.transform = lambda docs: transformed.append(docs) or transform(docs)
+
+    results = search.search(db, "Summary text", limit=3)
+
+    assert len(results) == 3
+    assert transformed == [["Summary text"]]
+
+
+def test_update_embeddings_appends_new_papers(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers[:4])
+    lsa_document_search.fit(
+        sample_papers[:4], force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+    version = lsa_document_search.model_version
+
+    saved = db.save_papers(sample_papers[4:])
+    lsa_document_search.update_embeddings(db, saved, refit_threshold=1.0)
+    store = EmbeddingStore.load(lsa_document_search.embeddings_path)
+
+    assert lsa_document_search.model_version == version
+    assert store.entry_ids == [p.entry_id for p in sample_papers]
+    assert store.vectors.shape == (len(sample_papers), 2)
+
+
+def test_update_embeddings_refits_on_drift(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers)
+    lsa_document_search.fit(
+        sample_papers, force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+    version = lsa_document_search.model_version
+
+    drifted = sample_papers[0].copy(update={"summary": "Quantum chromodynamics"})
+    lsa_document_search.update_embeddings(db, [drifted], refit_threshold=0.1)
+
+    assert lsa_document_search.model_version != version
+
+
+def test_update_embeddings_deferred_until_flush(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers[:3])
+    lsa_document_search.fit(
+        sample_papers[:3], force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+
+    # A fetch which failed saved a paper without embedding it
+    db.save_papers(sample_papers[3:4])
+
+    saved = db.save_papers(sample_papers[4:])
+    lsa_document_search.update_embeddings(db, saved, refit_threshold=1.0, save=False)
+    assert len(EmbeddingStore.load(lsa_document_search.embeddings_path)) == 3
+
+    lsa_document_search.flush_embeddings(db)
+    store = EmbeddingStore.load(lsa_document_search.embeddings_path)
+    assert sorted(store.entry_ids) == [p.entry_id for p in sample_papers]
+
+
+def test_deferred_drift_refits_on_flush(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers)
+    lsa_document_search.fit(
+        sample_papers, force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+    version = lsa_document_search.model_version
+
+    drifted = sample_papers[0].copy(update={"summary": "Quantum chromodynamics"})
+    lsa_document_search.update_embeddings(
+        db, [drifted], refit_threshold=0.1, save=False
+    )
+    assert lsa_document_search.model_version == version
+
+    lsa_document_search.flush_embeddings(db)
+    assert lsa_document_search.model_version != version
+
+
+def test_search_with_filters(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers)
+    lsa_document_search.fit(
+        sample_papers, force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+
+    results = lsa_document_search.search(db, "Summary", category="Category 3")
+    assert [p.entry_id for p in results] == ["3"]
+    assert lsa_document_search.search(db, "Summary", author="Nobody") == []
+
+
+def test_search_uses_ann_index(tmp_path, lsa_document_search, monkeypatch):
+    monkeypatch.setattr("arxivterminal.ml.ANN_MIN_DOCUMENTS", 4)
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers[:4])
+    lsa_document_search.fit(
+        sample_papers[:4], force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+    assert lsa_document_search.ann_path.exists()
+
+    saved = db.save_papers(sample_papers[4:])
+    lsa_document_search.update_embeddings(db, saved, refit_threshold=1.0)
+
+    search = LsaDocumentSearch(lsa_document_search.model_path)
+    index = search._load_ann()
+    assert len(index.assignments) == len(sample_papers)
+
+    # Probing every list finds every paper, through the index
+    searched = []
+    index_search = index.search
+    index.search = lambda *args, **kwargs: searched.append(args) or index_search(
+        *args, **kwargs
+    )
+    results = search.search(db, "Summary", limit=5, nprobe=len(index.centroids))
+    assert sorted(p.entry_id for p in results) == ["1", "2", "3", "4", "5"]
+    assert len(searched) == 1
+
+
+def test_top_k_matches_full_sort():
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(7, 4))
+    vectors = rng.normal(size=(50, 4))
+
+    # Small chunks exercise the merge of running top k across blocks
+    rows, scores = top_k(queries, vectors, 5, query_chunk_size=3, vector_chunk_size=8)
+
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+    assert rows.shape == scores.shape == (7, 5)
+    assert np.array_equal(rows, expected)
+    assert np.allclose(scores, np.take_along_axis(queries @ vectors.T, expected, 1))
+
+
+def test_search_many(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers)
+    lsa_document_search.fit(
+        sample_papers, force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+
+    results = lsa_document_search.search_many(db, ["Summary text", "Summary"], k=3)
+
+    assert len(results) == 2
+    for scored in results:
+        scores = [s.score for s in scored]
+        assert len({s.paper.entry_id for s in scored}) == 3
+        assert scores == sorted(scores, reverse=True)
+
+    filtered = lsa_document_search.search_many(db, ["Summary"], category="Category 3")
+    assert [[s.paper.entry_id for s in scored] for scored in filtered] == [["3"]]
+    assert lsa_document_search.search_many(db, []) == []
+
+
+def test_streaming_vocabulary_matches_tfidf_vectorizer():
+    abstracts = [p.summary for p in sample_papers] + ["Other text entirely"]
+    vectorizer = TfidfVectorizer(min_df=2, max_df=0.9, stop_words="english")
+    vectorizer.fit(abstracts)
+
+    vocabulary, idf = streaming_vocabulary(
+        [abstracts[:2], abstracts[2:]],
+        min_df=2,
+        max_df=0.9,
+        max_features=100,
+        stop_words="english",
+    )
+
+    assert vocabulary == sorted(vectorizer.vocabulary_)
+    assert np.allclose(
+        idf, vectorizer.idf_[[vectorizer.vocabulary_[t] for t in vocabulary]]
+    )
+
+
+def test_streaming_svd_matches_full_svd():
+    X = sparse_random(200, 30, density=0.2, random_state=0, format="csr")
+
+    svd = StreamingSVD(n_components=5).fit_chunks([X[:70], X[70:150], X[150:]])
+
+    _, singular_values, components = np.linalg.svd(X.toarray(), full_matrices=False)
+    assert np.allclose(svd.singular_values_, singular_values[:5])
+    # Singular vectors are only defined up to sign
+    assert np.allclose(np.abs(svd.components_), np.abs(components[:5]), atol=1e-6)
+
+
+def test_fit_out_of_core(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers)
+
+    lsa_document_search.fit_out_of_core(
+        db, min_df=2, max_df=5, embedding_dim=2, chunk_size=2
+    )
+
+    store = EmbeddingStore.load(lsa_document_search.embeddings_path)
+    assert store.vectors.shape == (len(sample_papers), 2)
+    assert np.allclose(np.linalg.norm(store.vectors, axis=1), 1)
+
+    # A reloaded model searches like one fit in memory and refits the same way
+    search = LsaDocumentSearch(lsa_document_search.model_path)
+    assert search.out_of_core
+    assert len(search.search(db, "Summary text", limit=3)) == 3
+
+    version = search.model_version
+    search.refit(db)
+    assert search.out_of_core
+    assert search.model_version != version
+
+
+def test_fit_out_of_core_limits_features(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    with pytest.raises(ValueError):
+        lsa_document_search.fit_out_of_core(db, max_features=None)
+
+
+def test_fit_out_of_core_peak_memory_below_fit(tmp_path):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(list(generate_papers(800)))
+    params = dict(max_features=500, embedding_dim=16)
+
+    def peak_memory(train):
+        tracemalloc.start()
+        try:
+            train()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    in_memory = peak_memory(
+        lambda: LsaDocumentSearch(str(tmp_path / "fit.joblib")).fit(
+            iter_documents(db), **params
+        )
+    )
+    out_of_core = peak_memory(
+        lambda: LsaDocumentSearch(str(tmp_path / "streamed.joblib")).fit_out_of_core(
+            db, chunk_size=400, **params
+        )
+    )
+
+    # Streaming two chunks already needs well under the memory of a single pass
+    assert out_of_core < in_memory / 2
+
+    # The vectors were written once, into the files published as the store
+    store = EmbeddingStore.load(tmp_path / "streamed.embeddings.json")
+    assert len(store) == 800
+    assert len(list(tmp_path.glob("streamed.*.vectors.npy"))) == 1
+
+
+def test_search_schedules_refit_on_corpus_drift(
+    tmp_path, lsa_document_search, monkeypatch
+):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers[:4])
+    lsa_document_search.fit(
+        sample_papers[:4],
+        force_overwrite=True,
+        min_df=2,
+        max_df=5,
+        embedding_dim=2,
+        fingerprint=db.get_corpus_fingerprint(),
+    )
+
+    scheduled = []
+    monkeypatch.setattr(
+        "arxivterminal.ml.schedule_refit", lambda *args: scheduled.append(args)
+    )
+    lsa_document_search.search(db, "Summary")
+    assert scheduled == []
+
+    # A 25% larger corpus is answered with the current model and refit later
+    version = lsa_document_search.model_version
+    db.save_papers(sample_papers[4:])
+    assert len(lsa_document_search.search(db, "Summary")) == 4
+    assert lsa_document_search.model_version == version
+    assert scheduled == [(db.database_path, lsa_document_search.model_path)]
+
+
+def test_search_caches_results(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers[:4])
+    lsa_document_search.fit(
+        sample_papers[:4], force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+    first = lsa_document_search.search(db, "Summary text", limit=5)
+    assert len(first) == 4
+
+    # A new process finds the query and its results in the disk cache
+    search = LsaDocumentSearch(lsa_document_search.model_path)
+    search.model.transform = None
+    search.get_embeddings = None
+    cached = search.search(db, "Summary text", limit=5)
+    assert [p.entry_id for p in cached] == [p.entry_id for p in first]
+
+    # Saving papers changes the corpus version, so the search runs again
+    saved = db.save_papers(sample_papers[4:])
+    lsa_document_search.update_embeddings(db, saved, refit_threshold=1.0)
+    assert len(lsa_document_search.search(db, "Summary text", limit=5)) == 5
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_embedding_store_memory_maps_quantized_vectors(tmp_path, dtype):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 8))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    entry_ids = [f"http://arxiv.org/abs/{i}" for i in range(50)]
+
+    EmbeddingStore("v1", entry_ids, vectors, dtype).save(tmp_path / "e.json")
+    store = EmbeddingStore.load(tmp_path / "e.json")
+
+    assert isinstance(store.vectors, np.memmap)
+    assert store.vectors.dtype == np.dtype(dtype)
+    assert store.entry_ids_at([3, 1]) == [entry_ids[3], entry_ids[1]]
+    np.testing.assert_allclose(store.decode(np.arange(50)), vectors, atol=0.01)
+
+    # Scoring the encoded vectors ranks like scoring the originals
+    rows, _ = top_k(vectors[:5], store.vectors, 3, scales=store.scales)
+    assert (rows[:, 0] == np.arange(5)).all()
+
+    # Upserts copy the mapped arrays and saving replaces the previous files
+    store.upsert([entry_ids[0], "new"], vectors[:2])
+    store.save(tmp_path / "e.json")
+    store = EmbeddingStore.load(tmp_path / "e.json")
+    assert store.entry_ids[-1] == "new"
+    assert len(list(tmp_path.glob("e.*.npy"))) == (3 if dtype == "int8" else 2)
+
+
+def test_quantize_int8_scales_rows():
+    vectors = np.array([[0.6, -0.8], [0.0, 0.0]])
+    encoded, scales = quantize(vectors, "int8")
+
+    assert encoded.dtype == np.int8
+    assert encoded[0].tolist() == [95, -127]
+    assert scales[1] == 1
+    with pytest.raises(ValueError):
+        quantize(vectors, "float64")
+
+
+def test_search_with_int8_embeddings(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers)
+    lsa_document_search.fit(
+        sample_papers,
+        force_overwrite=True,
+        min_df=2,
+        max_df=5,
+        embedding_dim=2,
+        embedding_dtype="int8",
+    )
+
+    store = EmbeddingStore.load(lsa_document_search.embeddings_path)
+    assert store.vectors.dtype == np.int8
+    results = lsa_document_search.search(db, "Summary", category="Category 3")
+    assert [p.entry_id for p in results] == ["3"]
+
+
+def test_similar_reads_stored_neighbors(tmp_path, lsa_document_search):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers[:4])
+    lsa_document_search.fit(
+        sample_papers[:4], force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+
+    similar = lsa_document_search.similar(db, sample_papers[0])
+    assert db.get_neighbor_version() == lsa_document_search.model_version
+    assert sorted(p.entry_id for p in similar) == ["2", "3", "4"]
+
+    # Once stored, the neighbours are read without the model
+    search = LsaDocumentSearch(lsa_document_search.model_path)
+    search.model.transform = None
+    assert [p.entry_id for p in search.similar(db, sample_papers[0], limit=2)] == [
+        p.entry_id for p in similar[:2]
+    ]
+
+
+def test_update_embeddings_maintains_neighbors(
+    tmp_path, lsa_document_search, monkeypatch
+):
+    monkeypatch.setattr("arxivterminal.ml.NEIGHBOR_COUNT", 2)
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(sample_papers[:4])
+    lsa_document_search.fit(
+        sample_papers[:4], force_overwrite=True, min_df=2, max_df=5, embedding_dim=2
+    )
+    lsa_document_search.index_neighbors(db)
+
+    saved = db.save_papers(sample_papers[4:])
+    lsa_document_search.update_embeddings(db, saved, refit_threshold=1.0)
+
+    # Every list matches an exact search over all papers, including the new one
+    store = lsa_document_search.get_embeddings(db)
+    vectors = store.decode(np.arange(len(store)))
+    scores = vectors @ vectors.T
+    np.fill_diagonal(scores, -np.inf)
+    lists = db.get_neighbor_lists(store.entry_ids)
+    for row, entry_id in enumerate(store.entry_ids):
+        expected = np.sort(scores[row])[::-1][:2]
+        stored = [score for _, score in lists[entry_id]]
+        np.testing.assert_allclose(stored, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_embedding_store_allocate(tmp_path, dtype):
+    path = tmp_path / "model.embeddings.json"
+    vectors = np.random.default_rng(0).normal(size=(5, 4)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    store = EmbeddingStore.allocate(path, "v1", 5, 4, dtype)
+    store.append(["a", "b"], vectors[:2])
+    store.append(["c", "d", "e"], vectors[2:])
+    store.save(path)
+
+    loaded = EmbeddingStore.load(path)
+    assert loaded.entry_ids == ["a", "b", "c", "d", "e"]
+    assert np.allclose(loaded.decode(np.arange(5)), vectors, atol=0.02)
+
+    # Updating a published store copies its arrays rather than writing the files
+    store.upsert(["a"], vectors[1:2])
+    assert np.allclose(EmbeddingStore.load(path).decode(0), vectors[0], atol=0.02)
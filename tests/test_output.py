@@ -1,7 +1,17 @@
+from datetime import datetime
+
 import pytest
 
-from arxivterminal.db import ArxivStats
-from arxivterminal.output import print_stats
+import arxivterminal.output
+from arxivterminal.db import ArxivDatabase, ArxivStats
+from arxivterminal.models import ArxivPaper
+from arxivterminal.output import (
+    ExitAppException,
+    ListPages,
+    PaperBrowser,
+    browse_papers,
+    print_stats,
+)
 
 
 @pytest.fixture
@@ -26,3 +36,76 @@ def test_print_stats(capsys, test_stats):
     assert output[4] == "2023-01-03 | 2"
     assert output[5] == "-------------------"
     assert output[6] == "Total count: 10"
+
+
+@pytest.fixture
+def test_db(tmp_path):
+    db = ArxivDatabase(str(tmp_path / "test.db"))
+    db.save_papers(
+        [
+            ArxivPaper(
+                entry_id=f"http://arxiv.org/abs/{i}",
+                title=f"Title {i}",
+                summary=f"Summary {i}",
+                updated=datetime(2023, 1, i),
+                published=datetime(2023, 1, i),
+                authors=[f"Author {i}"],
+                categories=["cs.AI"],
+                viewed=False,
+            )
+            for i in range(1, 6)
+        ]
+    )
+    yield db
+    db.close()
+
+
+def test_browse_papers_pages_and_buffers_views(capsys, monkeypatch, test_db):
+    inputs = iter(["n", "1", "2", "b", "n", "p", "q"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(inputs))
+    flushes = []
+    mark_papers_viewed = test_db.mark_papers_viewed
+    monkeypatch.setattr(
+        test_db,
+        "mark_papers_viewed",
+        lambda ids: flushes.append(list(ids)) or mark_papers_viewed(ids),
+    )
+
+    with pytest.raises(ExitAppException):
+        browse_papers(test_db, page_size=2)
+
+    output = capsys.readouterr().out
+    # Newest first, two titles per page, and the abstract of the selected paper only
+    assert output.index("Title 5") < output.index("Title 3") < output.index("Title 1")
+    assert "Summary 2" in output and "Summary 3" in output
+    assert "Summary 4" not in output
+
+    # Both views were written together when leaving the page
+    assert flushes == [
+        ["http://arxiv.org/abs/2", "http://arxiv.org/abs/3"],
+    ]
+    viewed = [p.entry_id for p in test_db.get_papers() if p.viewed]
+    assert viewed == ["http://arxiv.org/abs/2", "http://arxiv.org/abs/3"]
+
+
+def test_similar_ignores_neighbors_of_another_model(tmp_path, monkeypatch, test_db):
+    model_path = tmp_path / "model.joblib"
+    monkeypatch.setattr(arxivterminal.output, "MODEL_PATH", model_path)
+    paper, neighbor, searched = test_db.get_papers()[:3]
+    test_db.reset_neighbors("v1")
+    test_db.save_neighbors({paper.entry_id: [(neighbor.entry_id, 0.9)]})
+
+    class FakeLsa:
+        model_version = "v2"
+
+        def similar(self, db, paper):
+            return [searched]
+
+    # Stored lists of the current model are read without loading it
+    model_path.with_suffix(".embeddings.json").write_text('{"model_version": "v1"}')
+    browser = PaperBrowser(ListPages([paper]), test_db)
+    assert [p.entry_id for p in browser._similar(paper)] == [neighbor.entry_id]
+
+    # After a refit the model computes the neighbours again
+    browser = PaperBrowser(ListPages([paper]), test_db, lsa=FakeLsa())
+    assert [p.entry_id for p in browser._similar(paper)] == [searched.entry_id]
@@ -0,0 +1,150 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+import arxivterminal.ml
+from arxivterminal.db import ArxivDatabase
+from arxivterminal.ml import EmbeddingStore, LsaDocumentSearch
+from arxivterminal.models import ArxivPaper
+from arxivterminal.refit import acquire_lock, is_refit_running, refit, refit_lock_path
+
+papers = [
+    ArxivPaper(
+        entry_id=str(i),
+        title=f"Title {i}",
+        summary=f"Summary {i} and some text",
+        updated=datetime(2022, 1, i),
+        published=datetime(2022, 1, i),
+        authors=[f"Author {i}"],
+        categories=["cs.AI"],
+        viewed=False,
+    )
+    for i in range(1, 7)
+]
+
+
+def test_refit_swaps_in_new_model(tmp_path):
+    model_path = str(tmp_path / "model.joblib")
+    with ArxivDatabase(str(tmp_path / "test.db")) as db:
+        db.save_papers(papers[:4])
+        lsa = LsaDocumentSearch(model_path)
+        lsa.fit(papers[:4], min_df=2, max_df=1.0, embedding_dim=2)
+        db.save_papers(papers[4:])
+
+    refit(tmp_path / "test.db", model_path)
+
+    refitted = LsaDocumentSearch(model_path)
+    store = EmbeddingStore.load(refitted.embeddings_path)
+    assert refitted.model_version != lsa.model_version
+    assert refitted.fit_params == lsa.fit_params
+    assert refitted.fingerprint.papers == len(papers)
+    assert store.model_version == refitted.model_version
+    assert len(store.entry_ids) == len(papers)
+
+    # Only the model and the arrays of one store are left, without staging files
+    names = sorted(p.name for p in tmp_path.glob("model*"))
+    assert not [n for n in names if "refit" in n]
+    assert len(names) == 4
+    assert names[-2:] == ["model.embeddings.json", "model.joblib"]
+
+
+def test_reader_adopts_swapped_model(tmp_path):
+    model_path = str(tmp_path / "model.joblib")
+    with ArxivDatabase(str(tmp_path / "test.db")) as db:
+        db.save_papers(papers)
+        lsa = LsaDocumentSearch(model_path)
+        lsa.fit(papers, min_df=2, max_df=1.0, embedding_dim=2)
+        lsa.search(db, "Summary")
+
+        refit(tmp_path / "test.db", model_path)
+
+        # The running reader notices the swapped model and reloads it with its store
+        assert len(lsa.search(db, "Summary")) == len(papers)
+        assert lsa.model_version == LsaDocumentSearch(model_path).model_version
+
+
+def test_refit_lock(tmp_path):
+    model_path = tmp_path / "model.joblib"
+    assert not is_refit_running(model_path)
+
+    assert acquire_lock(model_path)
+    assert is_refit_running(model_path)
+    assert not acquire_lock(model_path)
+
+    # A refit started while another holds the lock leaves the model alone
+    refit(tmp_path / "test.db", model_path)
+    assert not model_path.exists()
+    refit_lock_path(model_path).unlink()
+
+
+def test_update_embeddings_leaves_papers_to_running_refit(tmp_path):
+    model_path = tmp_path / "model.joblib"
+    with ArxivDatabase(str(tmp_path / "test.db")) as db:
+        db.save_papers(papers[:4])
+        lsa = LsaDocumentSearch(str(model_path))
+        lsa.fit(papers[:4], min_df=2, max_df=1.0, embedding_dim=2)
+
+        assert acquire_lock(model_path)
+        lsa.update_embeddings(db, db.save_papers(papers[4:]), refit_threshold=1.0)
+        refit_lock_path(model_path).unlink()
+
+    # The store of the outgoing model is not written behind the refit's back
+    assert len(EmbeddingStore.load(lsa.embeddings_path)) == 4
+
+
+def test_update_embeddings_after_swap_uses_new_model(tmp_path):
+    model_path = str(tmp_path / "model.joblib")
+    with ArxivDatabase(str(tmp_path / "test.db")) as db:
+        db.save_papers(papers[:4])
+        lsa = LsaDocumentSearch(model_path)
+        lsa.fit(papers[:4], min_df=2, max_df=1.0, embedding_dim=2)
+
+        refit(tmp_path / "test.db", model_path)
+        lsa.update_embeddings(db, db.save_papers(papers[4:]), refit_threshold=1.0)
+
+    store = EmbeddingStore.load(lsa.embeddings_path)
+    assert store.model_version == LsaDocumentSearch(model_path).model_version
+    assert len(store) == len(papers)
+
+
+def test_refit_embeds_papers_saved_while_training(tmp_path, monkeypatch):
+    model_path = str(tmp_path / "model.joblib")
+    with ArxivDatabase(str(tmp_path / "test.db")) as db:
+        db.save_papers(papers[:4])
+        LsaDocumentSearch(model_path).fit(
+            papers[:4], min_df=2, max_df=1.0, embedding_dim=2
+        )
+
+    train = LsaDocumentSearch.refit
+
+    def train_then_save(self, db):
+        train(self, db)
+        db.save_papers(papers[4:])
+
+    monkeypatch.setattr(LsaDocumentSearch, "refit", train_then_save)
+    refit(tmp_path / "test.db", model_path)
+
+    store = EmbeddingStore.load(LsaDocumentSearch(model_path).embeddings_path)
+    assert sorted(store.entry_ids) == sorted(p.entry_id for p in papers)
+
+
+def test_foreground_refit_replaces_model_atomically(tmp_path, monkeypatch):
+    model_path = str(tmp_path / "model.joblib")
+    with ArxivDatabase(str(tmp_path / "test.db")) as db:
+        db.save_papers(papers)
+        lsa = LsaDocumentSearch(model_path)
+        lsa.fit(papers, min_df=2, max_df=1.0, embedding_dim=2)
+        version = lsa.model_version
+
+        def interrupted_dump(value, path):
+            Path(path).write_bytes(b"partial")
+            raise KeyboardInterrupt
+
+        # A refit interrupted while writing leaves the current model readable
+        monkeypatch.setattr(arxivterminal.ml, "dump", interrupted_dump)
+        with pytest.raises(KeyboardInterrupt):
+            lsa.refit(db)
+
+    assert LsaDocumentSearch(model_path).model_version == version
+    assert not list(tmp_path.glob("model.joblib.*"))
@@ -0,0 +1,52 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+# Cold start budget for the import of the CLI plus running a light command. Can be
+# raised on slow machines through the environment.
+STARTUP_BUDGET_MS = float(os.environ.get("ARXIVTERMINAL_STARTUP_BUDGET_MS", 250))
+
+HEAVY_MODULES = ["arxiv", "joblib", "numpy", "scipy", "sklearn"]
+
+
+def run_with_importtime(tmp_path, args, stdin=""):
+    env = dict(
+        os.environ,
+        XDG_DATA_HOME=str(tmp_path / "data"),
+        XDG_CACHE_HOME=str(tmp_path / "cache"),
+    )
+    code = f"from arxivterminal.cli import cli; cli({args!r})"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        input=stdin,
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+
+    # Each line reads "import time: self [us] | cumulative | package", in load order
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match:
+            imports.append((match.group(3), int(match.group(1)), len(match.group(2))))
+    return imports
+
+
+@pytest.mark.parametrize("args,stdin", [(["stats"], ""), (["show"], "q\n")])
+def test_cold_start_budget(tmp_path, args, stdin):
+    imports = run_with_importtime(tmp_path, args, stdin)
+    modules = [module for module, _, _ in imports]
+
+    assert not [m for m in HEAVY_MODULES if m in modules]
+
+    # Sum the top level imports which follow interpreter startup (ending with site)
+    startup_end = modules.index("site")
+    total_us = sum(
+        cumulative for _, cumulative, depth in imports[startup_end + 1 :] if depth == 0
+    )
+    assert total_us / 1000 < STARTUP_BUDGET_MS